@@ -0,0 +1,34 @@
+"""Gunicorn settings for production
+
+Every worker runs uvicorn on uvloop and httptools, DB pool of a worker is sized
+by database.db from the same worker count.
+
+Run from api/:
+    gunicorn -c gunicorn_conf.py asgi:app
+"""
+
+import sys
+from pathlib import Path
+
+from uvicorn.workers import UvicornWorker
+
+sys.path.append(str(Path(__file__).resolve().parent / "src"))
+
+from config import settings  # noqa: E402
+
+
+class UvloopWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        # leaves a moment to close connections before gunicorn kills the worker
+        "timeout_graceful_shutdown": max(settings.GRACEFUL_TIMEOUT_SECONDS - 5, 1),
+    }
+
+
+bind = settings.BIND
+workers = settings.WORKERS
+worker_class = UvloopWorker
+timeout = settings.WORKER_TIMEOUT_SECONDS
+graceful_timeout = settings.GRACEFUL_TIMEOUT_SECONDS
+keepalive = settings.KEEPALIVE_SECONDS
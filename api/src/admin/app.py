@@ -0,0 +1,56 @@
+from pathlib import Path
+from starlette.applications import Starlette
+from starlette.routing import BaseRoute
+from starlette.types import Receive, Scope, Send
+
+from config import settings
+from database.db import engine
+
+
+def create_admin_app() -> Starlette:
+    """Builds sqladmin application with all admin views"""
+    from sqladmin import Admin
+    from admin import views
+
+    admin = Admin(
+        Starlette(),  # sqladmin mounts itself here, the app mounts LazyAdminApp
+        engine,
+        title="MiningVit Admin Panel",
+        base_url="/" + settings.ADMIN_URL,
+        templates_dir=str(Path(__file__).parent.parent / "templates" / "admin"),
+    )
+    admin.add_view(views.UserAdmin)
+    admin.add_view(views.MasterReferralAdmin)
+    admin.add_view(views.FinanceAdmin)
+    admin.add_view(views.MachineAdmin)
+    admin.add_view(views.PurchasedMachineAdmin)
+    admin.add_view(views.DepositAdmin)
+    admin.add_view(views.WithdrawalAdmin)
+    admin.add_view(views.IncomeAdmin)
+    admin.add_view(views.AdvertAdmin)
+    admin.add_base_view(views.DashboardAdmin)
+    admin.add_base_view(views.ExportAdmin)
+    admin.add_base_view(views.PendingWithdrawalAdmin)
+    return admin.admin
+
+
+class LazyAdminApp:
+    """ASGI app that builds admin on first request, so processes that never
+    serve admin pages do not import sqladmin, wtforms and jinja"""
+
+    def __init__(self) -> None:
+        self._app: Starlette | None = None
+
+    @property
+    def app(self) -> Starlette:
+        if self._app is None:
+            self._app = create_admin_app()
+        return self._app
+
+    @property
+    def routes(self) -> list[BaseRoute]:
+        # used by url_for("admin:...") through the mount
+        return self.app.routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
@@ -0,0 +1,253 @@
+import asyncio
+import csv
+import fcntl
+import io
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from sqlalchemy import func, select, Select
+
+from config import settings
+from database.db import engine
+from database.models import Base, Deposit, Finance, Income, User, Withdrawal
+from schemas.finance import PayoutSchema
+from utils.enums import TransactionStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    model: type[Base]
+    columns: tuple[Any, ...]
+    join_finance: bool = True
+
+    @property
+    def header(self) -> list[str]:
+        return [column.key for column in self.columns]
+
+    def query(
+        self,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        status: TransactionStatus | None = None,
+    ) -> Select:
+        """Export rows of :model created in [:date_from, :date_to] ordered by id"""
+        stmt = select(*self.columns)
+        if self.join_finance:
+            stmt = stmt.join(Finance)
+        if date_from is not None:
+            stmt = stmt.where(
+                self.model.created_at >= datetime.combine(date_from, time.min)
+            )
+        if date_to is not None:
+            stmt = stmt.where(
+                self.model.created_at
+                < datetime.combine(date_to + timedelta(days=1), time.min)
+            )
+        if status is not None and hasattr(self.model, "status"):
+            stmt = stmt.where(self.model.status == status)
+        return stmt.order_by(self.model.id)
+
+
+EXPORT_SOURCES: dict[str, ExportSource] = {
+    "withdrawals": ExportSource(
+        Withdrawal,
+        (
+            Withdrawal.id,
+            Finance.user_id,
+            Withdrawal.amount,
+            Withdrawal.status,
+            Withdrawal.wallet,
+            Withdrawal.created_at,
+        ),
+    ),
+    "deposits": ExportSource(
+        Deposit,
+        (
+            Deposit.id,
+            Finance.user_id,
+            Deposit.amount,
+            Deposit.status,
+            Deposit.platform,
+            Deposit.created_at,
+        ),
+    ),
+    "incomes": ExportSource(
+        Income,
+        (
+            Income.id,
+            Finance.user_id,
+            Income.type,
+            Income.amount,
+            Income.status,
+            Income.created_at,
+        ),
+    ),
+    "users": ExportSource(
+        User,
+        (
+            User.id,
+            User.username,
+            User.email,
+            User.telegram,
+            User.is_active,
+            User.created_at,
+        ),
+        join_finance=False,
+    ),
+}
+
+
+async def count_rows(stmt: Select) -> int:
+    async with engine.connect() as connection:
+        count = await connection.scalar(
+            select(func.count()).select_from(stmt.order_by(None).subquery())
+        )
+    return count or 0
+
+
+async def iter_csv(
+    source: ExportSource, stmt: Select, compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Yields CSV (or gzip) chunks of :stmt rows, read in batches
+    through a server-side cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def flush() -> bytes:
+        chunk = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(chunk) if compressor else chunk
+
+    writer.writerow(source.header)
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            writer.writerows(rows)
+            yield flush()
+    yield flush()
+    if compressor:
+        yield compressor.flush()
+
+
+async def write_export(
+    path: Path, source: ExportSource, stmt: Select, compress: bool = False
+) -> None:
+    """Writes export to :path, it is visible under .part suffix until finished.
+    The .part file stays locked while it is written, the OS drops the lock
+    when the worker dies, so an unlocked .part file is a failed export"""
+    part_path = path.with_name(f"{path.name}.part")
+    # locked under a hidden name first, so .part file is never seen unlocked
+    locked_path = path.with_name(f".{part_path.name}")
+    try:
+        with locked_path.open("wb") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            locked_path.rename(part_path)
+            async for chunk in iter_csv(source, stmt, compress):
+                file.write(chunk)
+            part_path.rename(path)
+    except Exception:
+        logger.exception("Export %s failed", path.name)
+        locked_path.unlink(missing_ok=True)
+        part_path.unlink(missing_ok=True)
+        raise
+
+
+_export_tasks: set[asyncio.Task] = set()
+
+
+def export_filename(source_name: str, compress: bool = False) -> str:
+    filename = f"{source_name}_{datetime.now():%Y-%m-%d_%H-%M-%S}.csv"
+    return f"{filename}.gz" if compress else filename
+
+
+def start_export(source_name: str, stmt: Select, compress: bool = False) -> str:
+    """Runs export in background task
+
+    Returns:
+        str: name of export file in EXPORT_DIR
+    """
+    export_dir = Path(settings.EXPORT_DIR)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    filename = export_filename(source_name, compress)
+    task = asyncio.create_task(
+        write_export(export_dir / filename, EXPORT_SOURCES[source_name], stmt, compress)
+    )
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
+    return filename
+
+
+def get_export_path(filename: str) -> Path | None:
+    """Path of finished export file, None if it does not exist (yet)"""
+    export_dir = Path(settings.EXPORT_DIR).resolve()
+    path = (export_dir / filename).resolve()
+    if path.parent != export_dir or not path.is_file():
+        return None
+    if path.suffix not in (".csv", ".gz"):
+        return None
+    return path
+
+
+def export_state(filename: str) -> str | None:
+    """Returns "running" while export :filename is written, "failed" if the
+    worker writing it died and left its .part file, which is then removed,
+    None if there is no such export"""
+    export_dir = Path(settings.EXPORT_DIR).resolve()
+    part_path = (export_dir / f"{filename}.part").resolve()
+    if part_path.parent != export_dir:
+        return None
+    try:
+        with part_path.open("rb") as file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return "running"
+            if not part_path.exists():
+                # finished between open and flock
+                return None
+            part_path.unlink()
+    except FileNotFoundError:
+        return None
+    logger.warning("Export %s was left unfinished", filename)
+    return "failed"
+
+
+def list_exports() -> list[str]:
+    export_dir = Path(settings.EXPORT_DIR)
+    if not export_dir.is_dir():
+        return []
+    files = [
+        path
+        for path in export_dir.iterdir()
+        if path.is_file() and path.suffix in (".csv", ".gz")
+    ]
+    files.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    return [path.name for path in files]
+
+
+def write_payout_file(payouts: list[PayoutSchema]) -> str:
+    """Writes batch payout CSV of approved withdrawals to EXPORT_DIR
+
+    Returns:
+        str: name of payout file
+    """
+    export_dir = Path(settings.EXPORT_DIR)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    filename = export_filename("payouts")
+    with (export_dir / filename).open("w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(PayoutSchema.model_fields)
+        for payout in payouts:
+            writer.writerow(payout.model_dump().values())
+    return filename
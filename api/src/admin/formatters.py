@@ -15,6 +15,10 @@ from database.models import (
 )
 
 
+# collections longer than this are cut in list and details pages
+MAX_FORMATTED_ITEMS = 20
+
+
 class NotImplementedFormatterError(Exception):
     pass
 
@@ -25,7 +29,7 @@ def to_dollars(val: int) -> float:
 
 def instrumented_list_formatter(values: InstrumentedList) -> list[str]:
     result = []
-    for value in values:
+    for value in values[:MAX_FORMATTED_ITEMS]:
         try:
             value_formatter = FORMATTERS[type(value)]
         except KeyError:
@@ -33,6 +37,8 @@ def instrumented_list_formatter(values: InstrumentedList) -> list[str]:
                 f"FORMATTERS don't have formatter for this type {type(value)}"
             )
         result.append(value_formatter(value))
+    if len(values) > MAX_FORMATTED_ITEMS:
+        result.append(f"... and {len(values) - MAX_FORMATTED_ITEMS} more")
     return result
 
 
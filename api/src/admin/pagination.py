@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqladmin.pagination import Pagination
+from starlette.datastructures import URL
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    return f"{created_at.isoformat()}_{id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Parses (created_at, id) keyset cursor
+
+    Raises:
+        ValueError: raises if :cursor is malformed
+    """
+    created_at, id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(created_at), int(id)
+
+
+@dataclass
+class KeysetPagination(Pagination):
+    """Pagination over (created_at, id) keyset, only neighbour pages are linked"""
+
+    previous_cursor: str | None = None
+    next_cursor: str | None = None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.page > 1 and self.previous_cursor is not None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def add_pagination_urls(self, base_url: URL) -> None:
+        url = base_url.remove_query_params(["after", "before"])
+        if self.has_previous:
+            self._add_page_control(
+                url.include_query_params(before=self.previous_cursor), self.page - 1
+            )
+        self._add_page_control(base_url, self.page)
+        if self.has_next:
+            self._add_page_control(
+                url.include_query_params(after=self.next_cursor), self.page + 1
+            )
@@ -0,0 +1,87 @@
+from typing import TYPE_CHECKING, Any, List
+
+from sqladmin.ajax import DEFAULT_PAGE_SIZE, QueryAjaxModelLoader
+from sqlalchemy import inspect, or_, select, Column, ColumnElement, Enum, Integer
+from sqlalchemy import Select
+
+from config import settings
+
+if TYPE_CHECKING:
+    from sqladmin.models import ModelView
+
+
+def is_indexed(field: Any) -> bool:
+    column: Column = field.property.columns[0]
+    return bool(
+        column.primary_key or column.index or column.unique or column.foreign_keys
+    )
+
+
+def indexed_match(field: Any, term: str) -> ColumnElement[bool] | None:
+    """Exact or prefix match of :term on indexed column, None if it can not match"""
+    if not is_indexed(field):
+        return None
+
+    column: Column = field.property.columns[0]
+    if isinstance(column.type, Enum) and column.type.enum_class is not None:
+        members = [
+            member
+            for member in column.type.enum_class
+            if term.lower() in (member.name.lower(), str(member.value).lower())
+        ]
+        return field.in_(members) if members else None
+    if isinstance(column.type, Integer):
+        return field == int(term) if term.isdigit() else None
+    # literal pattern, so the optimizer can turn it into an index range scan
+    escaped = term.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return field.like(f"{escaped}%", escape="/")
+
+
+def exact_match(field: Any, term: str) -> ColumnElement[bool] | None:
+    """Equality of :term and column, None if :term can not be its value"""
+    column: Column = field.property.columns[0]
+    if isinstance(column.type, Integer):
+        return field == int(term) if term.isdigit() else None
+    return field == term
+
+
+def with_timeout(stmt: Select) -> Select:
+    """Aborts :stmt on the server after ADMIN_SEARCH_TIMEOUT_MS"""
+    return stmt.prefix_with(
+        f"/*+ MAX_EXECUTION_TIME({settings.ADMIN_SEARCH_TIMEOUT_MS}) */",
+        dialect="mysql",
+    )
+
+
+class IndexedAjaxModelLoader(QueryAjaxModelLoader):
+    """Ajax loader that looks primary key up first and falls back to
+    indexed prefix matches instead of LIKE '%term%' over every field"""
+
+    async def get_list(self, term: str, limit: int = DEFAULT_PAGE_SIZE) -> List[Any]:
+        term = term.strip()
+        if self.pk is not None and term.isdigit():
+            rows = await self.model_admin._run_query(
+                select(self.model).where(self.pk == int(term))
+            )
+            if rows:
+                return rows
+
+        expressions = [
+            expression
+            for field in self._cached_fields
+            if (expression := indexed_match(field, term)) is not None
+        ]
+        if not expressions:
+            return []
+
+        stmt = select(self.model).filter(or_(*expressions))
+        if self.order_by:
+            stmt = stmt.order_by(self.order_by)
+        return await self.model_admin._run_query(with_timeout(stmt.limit(limit)))
+
+
+def create_indexed_ajax_loader(
+    *, model_admin: "ModelView", name: str, options: dict
+) -> IndexedAjaxModelLoader:
+    relation = inspect(model_admin.model).relationships[name]
+    return IndexedAjaxModelLoader(name, relation.mapper.class_, model_admin, **options)
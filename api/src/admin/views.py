@@ -1,4 +1,12 @@
-from sqladmin import ModelView
+from datetime import date
+from typing import Any, ClassVar, Sequence
+from sqladmin import BaseView, ModelView, expose
+from sqladmin.pagination import Pagination
+from sqlalchemy import and_, or_, false, func, select, text, Select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
 from wtforms.validators import optional, length
 
 from database.models import (
@@ -12,14 +20,231 @@ from database.models import (
     Machine,
     Advert,
 )
+from .export import (
+    EXPORT_SOURCES,
+    count_rows,
+    export_filename,
+    export_state,
+    get_export_path,
+    iter_csv,
+    list_exports,
+    start_export,
+    write_payout_file,
+)
 from .formatters import FORMATTERS
+from .pagination import KeysetPagination, decode_cursor, encode_cursor
+from .search import (
+    create_indexed_ajax_loader,
+    exact_match,
+    indexed_match,
+    with_timeout,
+)
 from utils.security import SecurityHasher
+from utils.enums import DailyStat, MachineCoin, TransactionStatus, UserEvent
+from config import settings
+from database.db import async_session_maker, DB
+from services.redis_service import RedisService
+from services.finance_service import FinanceService
+from services.user_service import UserService
+from repositories.machine_repository import MachineRepository
+
+
+def _transaction_status(value: Any) -> Any:
+    """sqladmin enum select fields hold member names, not values"""
+    if isinstance(value, str) and not isinstance(value, TransactionStatus):
+        return TransactionStatus[value]
+    return value
 
 
 class ModelView(ModelView):
     column_type_formatters = FORMATTERS
     can_export = False
 
+    def __init__(self) -> None:
+        super().__init__()
+        self._form_ajax_refs = {
+            name: create_indexed_ajax_loader(
+                model_admin=self, name=name, options=options
+            )
+            for name, options in self.form_ajax_refs.items()
+        }
+
+    # eager load plans for every relationship rendered on list and details pages,
+    # otherwise sqladmin lazy loads them row by row in separate sessions
+    list_load_options: ClassVar[Sequence[LoaderOption]] = []
+    details_load_options: ClassVar[Sequence[LoaderOption]] = []
+
+    def list_query(self, request: Request) -> Select:
+        return super().list_query(request).options(*self.list_load_options)
+
+    async def get_object_for_details(self, value: Any) -> Any:
+        # details_load_options replace sqladmin's joinedload of the same
+        # relation, other shown relations are joined as sqladmin does
+        planned = {option.path[1].key for option in self.details_load_options}
+        stmt = self._stmt_by_identifier(value).options(
+            *(
+                joinedload(relation)
+                for relation in self._details_relations
+                if relation.key not in planned
+            ),
+            *self.details_load_options,
+        )
+        return await self._get_object_by_pk(stmt)
+
+    # opt-in search on indexed columns only: exact or prefix matches, capped
+    # at ADMIN_SEARCH_LIMIT rows and aborted after ADMIN_SEARCH_TIMEOUT_MS.
+    # Terms that exactly match one of search_exact_fields skip the search
+    indexed_search: ClassVar[bool] = False
+    search_exact_fields: ClassVar[Sequence[Any]] = []
+
+    # opt-in for tables that grow without bound: approximate count from table
+    # stats, keyset pagination on (created_at, id) and indexed search
+    large_table: ClassVar[bool] = False
+
+    @property
+    def _is_indexed_search(self) -> bool:
+        return self.indexed_search or self.large_table
+
+    async def count(self, request: Request, stmt: Select | None = None) -> int:
+        if stmt is not None and self._is_indexed_search:
+            return await super().count(request, with_timeout(stmt))
+        if not self.large_table or stmt is not None:
+            return await super().count(request, stmt)
+
+        async with self.session_maker() as session:
+            count = await session.scalar(
+                text(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+                ),
+                {"table": self.model.__tablename__},
+            )
+        return count or 0
+
+    async def list(self, request: Request) -> Pagination:
+        search = request.query_params.get("search", None)
+        if search and self.search_exact_fields:
+            rows = await self._exact_search(request, search.strip())
+            if rows:
+                return Pagination(
+                    rows=rows, page=1, page_size=self.page_size, count=len(rows)
+                )
+
+        sort_by = request.query_params.get("sortBy", "created_at")
+        if not self.large_table or sort_by != "created_at":
+            return await super().list(request)
+
+        page = int(request.query_params.get("page", 1))
+        page_size = int(request.query_params.get("pageSize", 0))
+        page_size = min(page_size or self.page_size, max(self.page_size_options))
+        after = request.query_params.get("after", None)
+        before = request.query_params.get("before", None)
+        if "sortBy" in request.query_params:
+            descending = request.query_params.get("sort", "asc") == "desc"
+        else:
+            descending = True
+
+        stmt = self.list_query(request)
+        for relation in self._list_relations:
+            stmt = stmt.options(joinedload(relation))
+
+        if search:
+            stmt = self.search_query(stmt=stmt, term=search)
+            count = await self.count(
+                request, select(func.count()).select_from(stmt.subquery())
+            )
+        else:
+            count = await self.count(request)
+
+        created_at, id = self.model.created_at, self.model.id
+        cursor = before or after
+        forward = before is None
+        if cursor is not None:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                cursor, forward, page = None, True, 1
+        if cursor is not None:
+            if descending == forward:
+                stmt = stmt.where(
+                    or_(
+                        created_at < cursor_created_at,
+                        and_(created_at == cursor_created_at, id < cursor_id),
+                    )
+                )
+            else:
+                stmt = stmt.where(
+                    or_(
+                        created_at > cursor_created_at,
+                        and_(created_at == cursor_created_at, id > cursor_id),
+                    )
+                )
+        if descending == forward:
+            stmt = stmt.order_by(created_at.desc(), id.desc())
+        else:
+            stmt = stmt.order_by(created_at.asc(), id.asc())
+
+        rows = list(await self._run_query(stmt.limit(page_size + 1)))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        return KeysetPagination(
+            rows=rows,
+            page=page,
+            page_size=page_size,
+            count=count,
+            previous_cursor=(
+                encode_cursor(rows[0].created_at, rows[0].id) if rows else None
+            ),
+            next_cursor=(
+                encode_cursor(rows[-1].created_at, rows[-1].id)
+                if rows and has_next
+                else None
+            ),
+        )
+
+    async def _exact_search(self, request: Request, term: str) -> Sequence[Any]:
+        expressions = [
+            expression
+            for field in self.search_exact_fields
+            if (expression := exact_match(field, term)) is not None
+        ]
+        if not expressions:
+            return []
+        stmt = self.list_query(request).filter(or_(*expressions))
+        for relation in self._list_relations:
+            stmt = stmt.options(joinedload(relation))
+        return await self._run_query(with_timeout(stmt.limit(self.page_size)))
+
+    def search_query(self, stmt: Select, term: str) -> Select:
+        if not self._is_indexed_search:
+            return super().search_query(stmt, term)
+
+        matched = select(self.model.id)
+        expressions = []
+        for field in self._search_fields:
+            model = self.model
+            parts = field.split(".")
+            for part in parts[:-1]:
+                model = getattr(model, part).mapper.class_
+                matched = matched.join(model)
+
+            expression = indexed_match(getattr(model, parts[-1]), term.strip())
+            if expression is not None:
+                expressions.append(expression)
+
+        # both count and list pages select from the capped matches, joined as
+        # a derived table since MySQL does not allow LIMIT in IN subqueries
+        matched = (
+            matched.filter(or_(false(), *expressions))
+            .limit(settings.ADMIN_SEARCH_LIMIT)
+            .subquery()
+        )
+        return with_timeout(stmt.join(matched, matched.c.id == self.model.id))
+
 
 class UserAdmin(ModelView, model=User):
     category = "User category"
@@ -30,6 +255,8 @@ class UserAdmin(ModelView, model=User):
     can_edit = True
     can_delete = False
     can_view_details = True
+    indexed_search = True
+    search_exact_fields = [User.id, User.affiliate_code]
 
     column_list = [
         User.id,
@@ -54,6 +281,12 @@ class UserAdmin(ModelView, model=User):
         "created_at",
     ]
 
+    # DETAILS
+    details_load_options = [
+        joinedload(User.finance),
+        selectinload(User.machines),
+    ]
+
     # EDIT
     form_excluded_columns = [
         "last_online",
@@ -101,6 +334,21 @@ class MasterReferralAdmin(ModelView, model=MasterReferral):
 
     form_include_pk = True
 
+    async def on_model_change(
+        self, data: dict, model: MasterReferral, is_created: bool, request
+    ) -> None:
+        """Remembers referral whose master chain is changed"""
+        request.state.old_referral_id = None if is_created else model.referral_id
+
+    async def after_model_change(
+        self, data: dict, model: MasterReferral, is_created: bool, request
+    ) -> None:
+        """Drops cached uplines going through changed association"""
+        referral_ids = {model.referral_id, request.state.old_referral_id}
+        async with DB() as db:
+            for referral_id in referral_ids - {None}:
+                await UserService(db).invalidate_upline(referral_id)
+
 
 class FinanceAdmin(ModelView, model=Finance):
     category = "Finance category"
@@ -120,12 +368,22 @@ class FinanceAdmin(ModelView, model=Finance):
         Finance.affiliate_income,
         Finance.wallet,
     ]
+    list_load_options = [joinedload(Finance.user)]
+
+    # DETAILS
+    details_load_options = [
+        joinedload(Finance.user),
+        selectinload(Finance.deposits),
+        selectinload(Finance.withdrawals),
+        selectinload(Finance.incomes),
+    ]
 
     # EDIT
     form_excluded_columns = [
         "deposits",
         "withdrawals",
         "incomes",
+        "version",
     ]
     form_args = {
         "wallet": {
@@ -158,6 +416,7 @@ class DepositAdmin(ModelView, model=Deposit):
     can_edit = True
     can_delete = True
     can_view_details = True
+    large_table = True
 
     column_list = [
         "finance.user",
@@ -166,14 +425,13 @@ class DepositAdmin(ModelView, model=Deposit):
         Deposit.platform,
         Deposit.created_at,
     ]
+    list_load_options = [joinedload(Deposit.finance).joinedload(Finance.user)]
     column_labels = {
         "finance.user": "User",
         "finance.user_id": "User_id",
     }
     column_searchable_list = [
         "finance.user_id",
-        Deposit.status,
-        Deposit.platform,
     ]
     column_sortable_list = [
         "created_at",
@@ -182,12 +440,24 @@ class DepositAdmin(ModelView, model=Deposit):
         ("created_at", True),
     ]
 
+    # DETAILS
+    details_load_options = [joinedload(Deposit.finance)]
+
     # EDIT
     form_args = {
         "created_at": {"validators": [optional()]},
         "updated_at": {"validators": [optional()]},
     }
 
+    async def after_model_change(
+        self, data: dict, model: Deposit, is_created: bool, request
+    ) -> None:
+        """Counts created deposits on dashboard"""
+        if is_created:
+            await RedisService.increment_daily_stats(
+                {DailyStat.DEPOSITS: 1, DailyStat.DEPOSITS_AMOUNT: model.amount}
+            )
+
 
 class WithdrawalAdmin(ModelView, model=Withdrawal):
     category = "Finance category"
@@ -206,6 +476,7 @@ class WithdrawalAdmin(ModelView, model=Withdrawal):
         Withdrawal.wallet,
         Withdrawal.created_at,
     ]
+    list_load_options = [joinedload(Withdrawal.finance).joinedload(Finance.user)]
     column_labels = {
         "finance.user": "User",
         "finance.user_id": "User_id",
@@ -221,12 +492,55 @@ class WithdrawalAdmin(ModelView, model=Withdrawal):
         ("created_at", True),
     ]
 
+    # DETAILS
+    details_load_options = [joinedload(Withdrawal.finance)]
+
     # EDIT
     form_args = {
         "created_at": {"validators": [optional()]},
         "updated_at": {"validators": [optional()]},
     }
 
+    async def on_model_change(
+        self, data: dict, model: Withdrawal, is_created: bool, request
+    ) -> None:
+        """Withdrawal completed by the form is saved as pending and approved
+        after commit by FinanceService.approve_withdrawals, which also deducts
+        its amount from balance, same as the approval queue"""
+        status = _transaction_status(data.get("status"))
+        request.state.withdrawal_approved = (
+            is_created
+            or _transaction_status(model.status) != TransactionStatus.COMPLETED
+        ) and status == TransactionStatus.COMPLETED
+        if request.state.withdrawal_approved:
+            data["status"] = TransactionStatus.PENDING.name
+
+    async def after_model_change(
+        self, data: dict, model: Withdrawal, is_created: bool, request
+    ) -> None:
+        """Approves withdrawal completed by the form or notifies withdrawal
+        owner about withdrawal status"""
+        if request.state.withdrawal_approved:
+            # withdrawal exceeding the balance is skipped and stays pending
+            async with DB() as db:
+                await db.run_transaction(
+                    FinanceService(db).approve_withdrawals, [model.id]
+                )
+            return
+        async with async_session_maker() as session:
+            user_id = await session.scalar(
+                select(Finance.user_id).filter_by(id=model.finance_id)
+            )
+        if user_id is not None:
+            await RedisService.publish_user_event(
+                user_id,
+                UserEvent.WITHDRAWAL,
+                {
+                    "status": _transaction_status(model.status).value,
+                    "amount": model.amount,
+                },
+            )
+
 
 class IncomeAdmin(ModelView, model=Income):
     category = "Finance category"
@@ -237,6 +551,7 @@ class IncomeAdmin(ModelView, model=Income):
     can_edit = True
     can_delete = True
     can_view_details = True
+    large_table = True
 
     column_list = [
         "finance.user",
@@ -245,14 +560,13 @@ class IncomeAdmin(ModelView, model=Income):
         Income.status,
         Income.created_at,
     ]
+    list_load_options = [joinedload(Income.finance).joinedload(Finance.user)]
     column_labels = {
         "finance.user": "User",
         "finance.user_id": "User_id",
     }
     column_searchable_list = [
         "finance.user_id",
-        Income.type,
-        Income.status,
     ]
     column_sortable_list = [
         "created_at",
@@ -261,6 +575,9 @@ class IncomeAdmin(ModelView, model=Income):
         ("created_at", True),
     ]
 
+    # DETAILS
+    details_load_options = [joinedload(Income.finance)]
+
     # EDIT
     form_args = {
         "created_at": {"validators": [optional()]},
@@ -287,11 +604,20 @@ class MachineAdmin(ModelView, model=Machine):
         Machine.price,
     ]
 
+    # DETAILS
+    details_load_options = [selectinload(Machine.purchased)]
+
     # EDIT
     form_excluded_columns = [
         "purchased",
     ]
 
+    async def after_model_change(
+        self, data: dict, model: Machine, is_created: bool, request
+    ) -> None:
+        """Drops cached machine row, admin writes bypass repositories"""
+        await MachineRepository.cache.delete(model.id)
+
 
 class PurchasedMachineAdmin(ModelView, model=PurchasedMachine):
     category = "Machine category"
@@ -309,8 +635,13 @@ class PurchasedMachineAdmin(ModelView, model=PurchasedMachine):
         PurchasedMachine.created_at,
         PurchasedMachine.activated_time,
     ]
+    list_load_options = [joinedload(PurchasedMachine.user)]
 
     # DETAILS
+    details_load_options = [
+        joinedload(PurchasedMachine.user),
+        joinedload(PurchasedMachine.machine),
+    ]
     column_details_exclude_list = [
         PurchasedMachine.user_id,
         PurchasedMachine.machine_id,
@@ -318,7 +649,7 @@ class PurchasedMachineAdmin(ModelView, model=PurchasedMachine):
     ]
 
     # EDIT
-    form_excluded_columns = ["created_at", "updated_at", "activated_time"]
+    form_excluded_columns = ["created_at", "updated_at", "activated_time", "version"]
     form_ajax_refs = {
         "user": {
             "fields": ["username", "email", "telegram"],
@@ -345,3 +676,151 @@ class AdvertAdmin(ModelView, model=Advert):
     column_formatters = {
         Advert.body: lambda m, _: m.body[:70] + "..." if len(m.body) > 70 else m.body
     }
+
+
+class ExportAdmin(BaseView):
+    category = "Finance category"
+    name = "Export"
+    icon = "fa-solid fa-file-export"
+
+    # menu links to the identity of the alphabetically first exposed method
+    @expose("/exports", methods=["GET", "POST"], identity="exports")
+    async def create_export(self, request: Request) -> Response:
+        """Streams small exports right away, large ones are written
+        to EXPORT_DIR in background and linked on the page"""
+        context: dict[str, Any] = {
+            "sources": list(EXPORT_SOURCES),
+            "statuses": [str(status) for status in TransactionStatus],
+        }
+        if request.method == "POST":
+            form = await request.form()
+            source_name = str(form.get("source", ""))
+            try:
+                source = EXPORT_SOURCES[source_name]
+                date_from = _parse_date(form.get("date_from"))
+                date_to = _parse_date(form.get("date_to"))
+                status = form.get("status")
+                stmt = source.query(
+                    date_from, date_to, TransactionStatus(status) if status else None
+                )
+            except (KeyError, ValueError):
+                context["error"] = "Invalid export parameters"
+            else:
+                compress = form.get("format") == "gzip"
+                if await count_rows(stmt) > settings.EXPORT_STREAM_MAX_ROWS:
+                    context["started"] = start_export(source_name, stmt, compress)
+                else:
+                    filename = export_filename(source_name, compress)
+                    return StreamingResponse(
+                        iter_csv(source, stmt, compress),
+                        media_type="application/gzip" if compress else "text/csv",
+                        headers={
+                            "Content-Disposition": f"attachment; filename={filename}"
+                        },
+                    )
+
+        context["exports"] = list_exports()
+        return await self.templates.TemplateResponse(request, "exports.html", context)
+
+    @expose("/exports/{filename}", identity="exports_download")
+    async def download_export(self, request: Request) -> Response:
+        filename = request.path_params["filename"]
+        path = get_export_path(filename)
+        if path is not None:
+            return FileResponse(path, filename=filename)
+
+        context: dict[str, Any] = {
+            "sources": list(EXPORT_SOURCES),
+            "statuses": [str(status) for status in TransactionStatus],
+            "exports": list_exports(),
+        }
+        state = export_state(filename)
+        if state == "running":
+            context["error"] = f"Export {filename} is still running, retry later"
+            status_code = 202
+        elif state == "failed":
+            context["error"] = f"Export {filename} failed, start it again"
+            status_code = 404
+        else:
+            context["error"] = f"Export {filename} not found"
+            status_code = 404
+        return await self.templates.TemplateResponse(
+            request, "exports.html", context, status_code=status_code
+        )
+
+
+class PendingWithdrawalAdmin(BaseView):
+    category = "Finance category"
+    name = "Pending Withdrawals"
+    icon = "fa-solid fa-list-check"
+
+    @expose("/withdrawals/pending", methods=["GET", "POST"])
+    async def pending_withdrawals(self, request: Request) -> Response:
+        """Approval queue, pending withdrawals are paged by id and approved
+        in one batch that produces a payout file"""
+        context: dict[str, Any] = {}
+        if request.method == "POST":
+            form = await request.form()
+            ids = [int(id) for id in form.getlist("ids") if str(id).isdigit()]
+            async with DB() as db:
+                payouts = await db.run_transaction(
+                    FinanceService(db).approve_withdrawals, ids
+                )
+            context["approved"] = len(payouts)
+            context["skipped"] = len(ids) - len(payouts)
+            if payouts:
+                context["payout_file"] = write_payout_file(payouts)
+
+        after = request.query_params.get("after", "")
+        async with DB() as db:
+            withdrawals = await db.finance.list_pending_withdrawals(
+                after_id=int(after) if after.isdigit() else None,
+                limit=settings.WITHDRAWAL_QUEUE_PAGE_SIZE,
+            )
+        context["withdrawals"] = withdrawals
+        if len(withdrawals) == settings.WITHDRAWAL_QUEUE_PAGE_SIZE:
+            context["next_after"] = withdrawals[-1].id
+        return await self.templates.TemplateResponse(
+            request, "pending_withdrawals.html", context
+        )
+
+
+class DashboardAdmin(BaseView):
+    name = "Dashboard"
+    icon = "fa-solid fa-chart-line"
+
+    @expose("/dashboard")
+    async def dashboard(self, request: Request) -> Response:
+        """Platform KPIs, read from redis counters and gauges only"""
+        daily_stats = await RedisService.get_daily_stats(days=7)
+        gauges = await RedisService.get_stats_gauges()
+        cache_stats = await RedisService.get_cache_stats()
+        transaction_stats = await RedisService.get_transaction_stats()
+        today = next(iter(daily_stats.values()))
+        week = {
+            stat.value: sum(day.get(stat.value, 0) for day in daily_stats.values())
+            for stat in DailyStat
+        }
+        machines = [
+            {
+                "coin": str(coin),
+                "purchased": int(gauges.get(f"purchased_machines:{coin}", 0)),
+                "active": int(gauges.get(f"active_machines:{coin}", 0)),
+            }
+            for coin in MachineCoin
+        ]
+        context = {
+            "stats": list(DailyStat),
+            "today": today,
+            "week": week,
+            "daily_stats": daily_stats,
+            "machines": machines,
+            "gauges": gauges,
+            "cache_stats": cache_stats,
+            "transaction_stats": transaction_stats,
+        }
+        return await self.templates.TemplateResponse(request, "dashboard.html", context)
+
+
+def _parse_date(value: Any) -> date | None:
+    return date.fromisoformat(value) if value else None
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+import os
 
 
 class Settings(BaseSettings):
@@ -23,6 +24,37 @@ class Settings(BaseSettings):
     MYSQL_USER: str = "root"
     MYSQL_PASSWORD: str = "password"
     MYSQL_DATABASE: str = "example"
+    MYSQL_MAX_CONNECTIONS: int = 151
+    MYSQL_RESERVED_CONNECTIONS: int = 20
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # rows per multi-row INSERT of repository add_many/upsert_many
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    # transactions failed by deadlock or lock wait timeout are run again
+    DB_TRANSACTION_RETRIES: int = 3
+    # short balance and machine updates check row version instead of holding
+    # SELECT ... FOR UPDATE locks, conflicts are retried as above
+    OPTIMISTIC_LOCKING: bool = False
+    DB_RETRY_BASE_SECONDS: float = 0.05
+    DB_RETRY_MAX_SECONDS: float = 1.0
+    # read replica, reads go to primary while MYSQL_REPLICA_HOST is empty
+    MYSQL_REPLICA_HOST: str = ""
+    MYSQL_REPLICA_TCP_PORT: str = "3306"
+    # replica pool is sized against the replica server's own connection limit
+    MYSQL_REPLICA_MAX_CONNECTIONS: int = 151
+    DB_REPLICA_POOL_SIZE: int = 10
+    DB_REPLICA_MAX_OVERFLOW: int = 10
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # SERVER
+    BIND: str = "0.0.0.0:8000"
+    WEB_CONCURRENCY: int = 0
+    MAX_WORKERS: int = 8
+    WORKER_TIMEOUT_SECONDS: int = 60
+    GRACEFUL_TIMEOUT_SECONDS: int = 30
+    KEEPALIVE_SECONDS: int = 5
 
     # REDIS
     REDIS_HOST: str = "redis"
@@ -31,6 +63,11 @@ class Settings(BaseSettings):
     EMAIL_LOCK_EXPIRE_MINUTES: int = 3
     RESET_PASSWORD_TOKEN_EXPIRE_HOURS: int = 1
     WITHDRAWAL_LOCK_EXPIRE_HOURS: int = 24
+    IDEMPOTENCY_KEY_EXPIRE_MINUTES: int = 10
+    IDEMPOTENCY_WAIT_SECONDS: int = 5
+    EVENTS_KEEPALIVE_SECONDS: int = 15
+    EVENTS_QUEUE_SIZE: int = 100
+    MACHINE_READY_NOTIFY_INTERVAL_SECONDS: int = 10
 
     # SECRET KEY AND ALGORITHM
     SECRET_KEY: str = "secret"
@@ -43,7 +80,25 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: str = "admin@admin.com"
     ADMIN_PASSWORD: str = "admin"
     ADMIN_AFFILIATE_CODE: str = "0000000000"
+    SEED_ON_STARTUP: bool = True
+    SEED_LOCK_TIMEOUT_SECONDS: int = 10
     COMMISSION_HOURS_DELTA: int = 24
+    LAZY_COMMISSION_ACCRUAL: bool = False
+    SETTLEMENT_BATCH_SIZE: int = 500
+    SETTLEMENT_INTERVAL_SECONDS: int = 60
+    EXPORT_DIR: str = "/tmp/miningvit_exports"
+    EXPORT_STREAM_MAX_ROWS: int = 50_000
+    EXPORT_BATCH_SIZE: int = 1000
+    WITHDRAWAL_QUEUE_PAGE_SIZE: int = 500
+    ADMIN_SEARCH_LIMIT: int = 1000
+    ADMIN_SEARCH_TIMEOUT_MS: int = 2000
+    STATS_DAYS_KEPT: int = 35
+    STATS_REFRESH_INTERVAL_SECONDS: int = 300
+    # repository cache
+    REPO_CACHE_TTL_SECONDS: int = 600
+    REPO_CACHE_LOCAL_TTL_SECONDS: int = 10
+    REPO_CACHE_LOCAL_MAX_SIZE: int = 1024
+    REPO_CACHE_STATS_FLUSH_SECONDS: int = 30
     MACHINES_INFO: list[dict[str, str | int]] = [
         {
             "title": "Bitmain Antminer L7",
@@ -100,11 +155,29 @@ class Settings(BaseSettings):
             "price": 1200,
         },
     ]
-    REFERRAL_SYSTEM: tuple = (0.15, 0, 1, 0.05, 0.03, 0.01)
+    # reward share of machine price by level, direct master first
+    REFERRAL_SYSTEM: tuple = (0.15, 0.1, 0.05, 0.03, 0.01)
+    UPLINE_EXPIRE_DAYS: int = 30
+    UPLINE_DELETE_BATCH_SIZE: int = 1000
+    FINANCE_DELTA_MERGE_INTERVAL_SECONDS: int = 10
+    FINANCE_DELTA_MERGE_BATCH_SIZE: int = 5000
+
+    @property
+    def WORKERS(self) -> int:
+        """WEB_CONCURRENCY or 2 * cpu + 1 capped by MAX_WORKERS"""
+        if self.WEB_CONCURRENCY:
+            return self.WEB_CONCURRENCY
+        return min(2 * (os.cpu_count() or 1) + 1, self.MAX_WORKERS)
 
     @property
     def DB_URL(self) -> str:
         return f"mysql+aiomysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_HOST}:{settings.MYSQL_TCP_PORT}/{settings.MYSQL_DATABASE}"
 
+    @property
+    def REPLICA_DB_URL(self) -> str | None:
+        if not settings.MYSQL_REPLICA_HOST:
+            return None
+        return f"mysql+aiomysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}@{settings.MYSQL_REPLICA_HOST}:{settings.MYSQL_REPLICA_TCP_PORT}/{settings.MYSQL_DATABASE}"
+
 
 settings = Settings()
@@ -1,3 +1,9 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Sequence, TypeVar
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncEngine,
@@ -5,13 +11,51 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from config import settings
+from database.models import Finance
 from repositories.UserRepository import UserRepository
 from repositories.MasterReferralRepository import MasterReferralRepository
 from repositories.finance_repository import FinanceRepository
 from repositories.machine_repository import MachineRepository
+from repositories.cache import commit_invalidations, discard_invalidations
+from repositories.redis_repository import redis_repo
+from utils.db_pool import per_worker_pool
+from utils.db_retry import (
+    TRANSACTION_STATS_KEY,
+    StaleVersionError,
+    backoff_delay,
+    retry_reason,
+)
+
+
+logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
 
-engine: AsyncEngine = create_async_engine(settings.DB_URL)
+
+_pool_size, _max_overflow = per_worker_pool(
+    max_connections=settings.MYSQL_MAX_CONNECTIONS,
+    reserved_connections=settings.MYSQL_RESERVED_CONNECTIONS,
+    workers=settings.WORKERS,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+_replica_pool_size, _replica_max_overflow = per_worker_pool(
+    max_connections=settings.MYSQL_REPLICA_MAX_CONNECTIONS,
+    reserved_connections=settings.MYSQL_RESERVED_CONNECTIONS,
+    workers=settings.WORKERS,
+    pool_size=settings.DB_REPLICA_POOL_SIZE,
+    max_overflow=settings.DB_REPLICA_MAX_OVERFLOW,
+)
+_engine_options: dict[str, Any] = {
+    "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+engine: AsyncEngine = create_async_engine(
+    settings.DB_URL,
+    pool_size=_pool_size,
+    max_overflow=_max_overflow,
+    **_engine_options,
+)
 async_session_maker = async_sessionmaker(
     bind=engine,
     expire_on_commit=False,
@@ -19,30 +63,202 @@ async_session_maker = async_sessionmaker(
     autocommit=False,
 )
 
+# without configured replica all reads go to primary
+replica_engine: AsyncEngine = (
+    create_async_engine(
+        settings.REPLICA_DB_URL,
+        pool_size=_replica_pool_size,
+        max_overflow=_replica_max_overflow,
+        **_engine_options,
+    )
+    if settings.REPLICA_DB_URL
+    else engine
+)
+replica_session_maker = (
+    async_sessionmaker(
+        bind=replica_engine,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False,
+    )
+    if replica_engine is not engine
+    else async_session_maker
+)
+
 
 class DB:
-    def __init__(self) -> None:
-        self._session_factory = async_session_maker
+    """Unit of work over primary session, or over replica session if :replica.
+    Replica unit of work is read only and must not be committed"""
+
+    def __init__(
+        self, replica: bool = False, isolation_level: str | None = None
+    ) -> None:
+        self.is_replica = replica
+        self._session_factory = (
+            replica_session_maker if replica else async_session_maker
+        )
+        self._isolation_level = isolation_level
+        self._replica: DB | None = None
 
     async def __aenter__(self):
-        self._session = self._session_factory()
-        self.users = UserRepository(self._session)
-        self.master_referrals = MasterReferralRepository(self._session)
-        self.finance = FinanceRepository(self._session)
-        self.machines = MachineRepository(self._session)
+        self._open()
         return self
 
     async def __aexit__(self, *args) -> None:
+        if self._replica is not None:
+            await self._replica.__aexit__(*args)
+            self._replica = None
         await self.rollback()
         await self._session.close()
 
+    def _open(self) -> None:
+        if self._isolation_level is not None:
+            # connection gets default isolation level back when returned to pool
+            bind = (replica_engine if self.is_replica else engine).execution_options(
+                isolation_level=self._isolation_level
+            )
+            self._session = self._session_factory(bind=bind)
+        else:
+            self._session = self._session_factory()
+        self._on_commit: list[tuple[Callable[..., Awaitable], tuple]] = []
+        self.users = UserRepository(self._session)
+        self.master_referrals = MasterReferralRepository(self._session)
+        self.finance = FinanceRepository(self._session)
+        self.machines = MachineRepository(self._session)
+
+    @property
+    def replica(self) -> "DB":
+        """Unit of work on replica for single repository calls that tolerate
+        replication lag. Opened on first access, closed with this unit of work"""
+        if self.is_replica or replica_engine is engine:
+            return self
+        if self._replica is None:
+            self._replica = DB(replica=True)
+            self._replica._open()
+        return self._replica
+
     async def rollback(self) -> None:
         await self._session.rollback()
+        discard_invalidations(self._session)
+        self._on_commit.clear()
 
     async def commit(self) -> None:
         await self._session.commit()
+        await commit_invalidations(self._session)
+        callbacks, self._on_commit = self._on_commit, []
+        for callback, args in callbacks:
+            # transaction is committed, failed side effect must not fail request
+            try:
+                await callback(*args)
+            except (RedisError, ConnectionError):
+                logger.warning("Post-commit callback %s failed", callback.__qualname__)
+
+    async def merge_finance_deltas(self, finance_ids: Sequence[int]) -> int:
+        """Merges pending deltas of :finance_ids in a separate READ COMMITTED
+        transaction, as jobs.finance_deltas does, so its locking read of
+        finance_delta takes no gap locks that would block reward inserts.
+        Must be called before this unit of work locks any of these finance rows
+
+        Returns:
+            int: number of merged deltas
+        """
+        if not finance_ids:
+            return 0
+        async with DB(isolation_level="READ COMMITTED") as db:
+            return await db.run_transaction(db.finance.merge_deltas, finance_ids)
+
+    async def merge_user_deltas(self, user_id: int) -> Finance | None:
+        """Merges pending deltas of :user_id finance row like merge_finance_deltas.
+        The row is returned as committed by the merge, fresher than what a
+        REPEATABLE READ snapshot of this unit of work can show
+
+        Returns:
+            Finance | None: merged finance row, None if user has none
+        """
+        async with DB(isolation_level="READ COMMITTED") as db:
+            return await db.run_transaction(db.finance.merge_user_deltas, user_id)
+
+    def on_commit(self, callback: Callable[..., Awaitable], *args: Any) -> None:
+        """Schedules :callback(*args) to be awaited after successful commit.
+        Redis errors of :callback are logged, not raised"""
+        self._on_commit.append((callback, args))
+
+    async def run_transaction(
+        self, operation: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+    ) -> T:
+        """Awaits :operation(*args, **kwargs) and commits. Transaction rolled
+        back by deadlock, lock wait timeout or stale row version (optimistic
+        locking) is run again from the start, up to
+        DB_TRANSACTION_RETRIES times with jittered backoff. :operation must do
+        all its reads inside, state read before the first attempt may be stale
+
+        Returns:
+            T: result of :operation
+        """
+        # callbacks scheduled before the transaction, e.g. by dependencies
+        scheduled = list(self._on_commit)
+        attempt = 0
+        while True:
+            try:
+                result = await operation(*args, **kwargs)
+                await self.commit()
+                return result
+            except (DBAPIError, StaleVersionError) as error:
+                reason = retry_reason(error)
+                if reason is None:
+                    raise
+                await self.rollback()
+                if attempt == settings.DB_TRANSACTION_RETRIES:
+                    await _count_transaction_stats({reason: 1, "failures": 1})
+                    raise
+                await _count_transaction_stats({reason: 1, "retries": 1})
+                logger.info("Transaction failed by %s, retrying", reason)
+
+            self._on_commit = list(scheduled)
+            await asyncio.sleep(
+                backoff_delay(
+                    attempt,
+                    settings.DB_RETRY_BASE_SECONDS,
+                    settings.DB_RETRY_MAX_SECONDS,
+                )
+            )
+            attempt += 1
+
+
+async def _count_transaction_stats(values: dict[str, int]) -> None:
+    try:
+        await redis_repo.hincrby_many(TRANSACTION_STATS_KEY, values)
+    except (RedisError, ConnectionError):
+        logger.warning("Could not count transaction stats %s", values)
+
+
+async def warm_up_pool() -> None:
+    """Opens pool_size connections, so first requests do not pay for connecting"""
+
+    async def ping() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def ping_replica() -> None:
+        async with replica_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(_pool_size)))
+    if replica_engine is not engine:
+        await asyncio.gather(*(ping_replica() for _ in range(_replica_pool_size)))
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if replica_engine is not engine:
+        await replica_engine.dispose()
 
 
 async def get_db():
     async with DB() as db:
         yield db
+
+
+async def get_replica_db():
+    async with DB(replica=True) as db:
+        yield db
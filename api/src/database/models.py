@@ -5,7 +5,7 @@ from sqlalchemy.orm import (
     declared_attr,
     relationship,
 )
-from sqlalchemy import String, ForeignKey, DateTime, DefaultClause
+from sqlalchemy import String, ForeignKey, DateTime, DefaultClause, Index, event
 from sqlalchemy.dialects.mysql import BIGINT
 from sqlalchemy.sql import func, text, false, true
 from datetime import datetime
@@ -35,6 +35,20 @@ class TimeMixin:
     )
 
 
+class VersionMixin:
+    """Row version for optimistic locking, incremented by every update.
+    Repositories increment it in their UPDATE statements, ORM flushes
+    (admin edits) through the before_update listener below"""
+
+    __abstract__: bool = True
+    version: Mapped[int] = mapped_column(server_default=text("0"))
+
+
+@event.listens_for(VersionMixin, "before_update", propagate=True)
+def _increment_version(mapper, connection, target: VersionMixin) -> None:
+    target.version = type(target).version + 1
+
+
 class MasterReferral(Base):
     __tablename__: declared_attr | str = "master_referral"
     __repr_attrs__ = ["master_id", "referral_id"]
@@ -78,7 +92,7 @@ class User(TimeMixin, Base):
 
 
 # ADDITIONAL TABLES
-class Finance(Base):
+class Finance(VersionMixin, Base):
     __repr_attrs__ = ["id", "user_id", "balance", "income", "wallet"]
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -110,6 +124,22 @@ class Finance(Base):
     )
 
 
+class FinanceDelta(Base):
+    """Pending balance change of finance row, merged by jobs.finance_deltas"""
+
+    __tablename__: declared_attr | str = "finance_delta"
+    __repr_attrs__ = ["id", "finance_id", "balance", "affiliate_income"]
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # no foreign key, so inserts do not take shared locks on hot finance rows
+    finance_id: Mapped[int] = mapped_column(index=True)
+    balance: Mapped[int] = mapped_column(BIGINT, server_default=text("0"))
+    affiliate_income: Mapped[int] = mapped_column(BIGINT, server_default=text("0"))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.current_timestamp()
+    )
+
+
 class Machine(Base):
     __repr_attrs__ = ["id", "title", "coin", "income", "price"]
 
@@ -126,14 +156,17 @@ class Machine(Base):
     )
 
 
-class PurchasedMachine(TimeMixin, Base):
+class PurchasedMachine(VersionMixin, TimeMixin, Base):
     __tablename__: declared_attr | str = "purchased_machine"
-    __repr_attrs__ = ["id", "user_id", "machine_id", "activated_time"]
+    __repr_attrs__ = ["id", "user_id", "machine_id", "activated_time", "settled_time"]
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"))
     machine_id: Mapped[int] = mapped_column(ForeignKey("machine.id"))
     activated_time: Mapped[datetime | None] = mapped_column(DateTime)
+    # used only with LAZY_COMMISSION_ACCRUAL, commissions accrue since this time,
+    # set by seeding for machines bought before (utils.initiate_data)
+    settled_time: Mapped[datetime | None] = mapped_column(DateTime)
 
     machine: Mapped["Machine"] = relationship(back_populates="purchased")
     user: Mapped["User"] = relationship(back_populates="machines")
@@ -142,6 +175,11 @@ class PurchasedMachine(TimeMixin, Base):
 class Transaction:
     __abstract__: bool = True
 
+    @declared_attr.directive
+    def __table_args__(cls) -> tuple:
+        # keyset pagination of admin lists runs over (created_at, id)
+        return (Index(f"ix_{cls.__tablename__}_created_at_id", "created_at", "id"),)
+
     id: Mapped[int] = mapped_column(primary_key=True)
     finance_id: Mapped[int] = mapped_column(ForeignKey("finance.id"))
     status: Mapped[TransactionStatus] = mapped_column(default=TransactionStatus.NEW)
@@ -169,6 +207,10 @@ class Withdrawal(Transaction, TimeMixin, Base):
     __repr_attrs__ = ["id", "finance_id", "wallet", "amount", "status"]
 
     wallet: Mapped[str] = mapped_column(String(512))
+    # approval queue pages pending withdrawals over (status, id)
+    status: Mapped[TransactionStatus] = mapped_column(
+        default=TransactionStatus.NEW, index=True
+    )
 
     finance: Mapped["Finance"] = relationship(back_populates="withdrawals")
 
@@ -7,18 +7,15 @@ from services.user_service import UserService
 import schemas.user as user_schema
 from utils.security import JWTAuthController
 from utils.validation_errors import AppError
-from database.db import DB, get_db
+from database.db import DB, get_db, get_replica_db
 from services.redis_service import RedisService
+from config import settings
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
-async def get_current_user(
-    request: Request,
-    db: Annotated[DB, Depends(get_db)],
-    token: Annotated[str, Depends(oauth2_scheme)],
-) -> user_schema.UserSchema:
+async def _get_session_username(token: str) -> str:
     try:
         payload = JWTAuthController.decode(token)
         username: str | None = payload.get("username")
@@ -30,11 +27,38 @@ async def get_current_user(
     token_in_redis = await RedisService.get_active_session(username)
     if token_in_redis != token:
         raise AppError.INVALID_CREDENTIALS
+    return username
+
 
+async def get_current_user(
+    request: Request,
+    db: Annotated[DB, Depends(get_db)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> user_schema.UserSchema:
+    username = await _get_session_username(token)
     user = await UserService(db).get_user_by_name(username=username)
     if user is None:
         raise AppError.INVALID_CREDENTIALS
     user = await UserService(db).update_online_and_ip(user, request)
+    if settings.REPLICA_DB_URL:
+        db.on_commit(RedisService.save_recent_write, user.id)
+    return user
+
+
+async def get_current_reader(
+    db: Annotated[DB, Depends(get_replica_db)],
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> user_schema.UserSchema:
+    """Current user of read only endpoints, read from replica without
+    updating online time and ip, so no primary connection is taken"""
+    username = await _get_session_username(token)
+    user = await UserService(db).get_user_by_name(username=username)
+    if user is None:
+        # user registered within replication lag
+        async with DB() as primary_db:
+            user = await UserService(primary_db).get_user_by_name(username=username)
+    if user is None:
+        raise AppError.INVALID_CREDENTIALS
     return user
 
 
@@ -44,3 +68,11 @@ async def get_current_active_user(
     if not current_user.is_active:
         raise AppError.INACTIVE_USER
     return current_user
+
+
+async def get_current_active_reader(
+    current_user: Annotated[user_schema.UserSchema, Depends(get_current_reader)]
+) -> user_schema.UserSchema:
+    if not current_user.is_active:
+        raise AppError.INACTIVE_USER
+    return current_user
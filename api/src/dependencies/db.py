@@ -0,0 +1,24 @@
+from typing import Annotated, AsyncIterator
+from fastapi import Depends
+
+from config import settings
+import schemas.user as user_schema
+from database.db import DB, get_replica_db
+from dependencies.auth import get_current_reader
+from services.redis_service import RedisService
+
+
+async def get_read_db(
+    current_user: Annotated[user_schema.UserSchema, Depends(get_current_reader)],
+    replica_db: Annotated[DB, Depends(get_replica_db)],
+) -> AsyncIterator[DB]:
+    """Router dependency for read only endpoints. Yields unit of work bound to
+    replica, the one :current_user was read with, unless :current_user
+    committed writes within READ_YOUR_WRITES_SECONDS"""
+    if not settings.REPLICA_DB_URL or not (
+        await RedisService.recent_write_exists(current_user.id)
+    ):
+        yield replica_db
+        return
+    async with DB() as db:
+        yield db
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+from typing import Annotated, Any, Awaitable, Callable
+from fastapi import Depends, Header, Request, Response
+
+from config import settings
+import schemas.user as user_schema
+from dependencies.auth import get_current_active_user
+from services.redis_service import RedisService
+from utils.validation_errors import AppError
+
+
+class IdempotentReplay(Exception):
+    """Raised to answer a repeated request with the stored response"""
+
+    def __init__(self, stored_response: dict[str, Any]) -> None:
+        self.status_code: int = stored_response["status_code"]
+        self.body: str = stored_response["body"]
+
+
+async def idempotent(
+    request: Request,
+    current_user: Annotated[user_schema.UserSchema, Depends(get_current_active_user)],
+    idempotency_key: Annotated[str | None, Header(max_length=128)] = None,
+) -> None:
+    """Router dependency for money-moving endpoints.
+    The first request with Idempotency-Key header runs the endpoint, its response
+    is stored by store_idempotent_response middleware. Repeated requests wait for
+    the first one and replay the stored response. Key is bound to query string
+    and body of the first request, a repeat with other ones is rejected
+
+    Raises:
+        IdempotentReplay: raises if response for the key is already stored
+        AppError.IDEMPOTENCY_KEY_REUSED: raises if the key was used with
+            another query string or body
+        AppError.IDEMPOTENCY_KEY_IN_PROGRESS: raises if the first request did not
+            finish in IDEMPOTENCY_WAIT_SECONDS
+    """
+    if idempotency_key is None:
+        return
+
+    key = f"{current_user.id}:{request.method}:{request.url.path}:{idempotency_key}"
+    fingerprint = request_fingerprint(request.url.query, await request.body())
+    if await RedisService.claim_idempotency_key(key, fingerprint):
+        request.state.idempotency_key = key
+        request.state.idempotency_fingerprint = fingerprint
+        return
+
+    for _ in range(settings.IDEMPOTENCY_WAIT_SECONDS * 10):
+        record = await RedisService.get_idempotency_record(key)
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                raise AppError.IDEMPOTENCY_KEY_REUSED
+            if "status_code" in record:
+                raise IdempotentReplay(record)
+        await asyncio.sleep(0.1)
+    raise AppError.IDEMPOTENCY_KEY_IN_PROGRESS
+
+
+def request_fingerprint(query: str, body: bytes) -> str:
+    """Returns sha256 of request :query and :body"""
+    digest = hashlib.sha256(query.encode())
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def store_idempotent_response(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """HTTP middleware that stores responses of requests claimed by :idempotent"""
+    try:
+        response = await call_next(request)
+    except Exception:
+        key = getattr(request.state, "idempotency_key", None)
+        if key is not None:
+            await RedisService.release_idempotency_key(key)
+        raise
+
+    key = getattr(request.state, "idempotency_key", None)
+    if key is None:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])  # type: ignore
+    if response.status_code >= 500:
+        # server errors are not final, let the client retry with the same key
+        await RedisService.release_idempotency_key(key)
+    else:
+        await RedisService.save_idempotent_response(
+            key,
+            request.state.idempotency_fingerprint,
+            response.status_code,
+            body.decode(),
+        )
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=dict(response.headers),
+        media_type=response.media_type,
+    )
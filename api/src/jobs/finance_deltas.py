@@ -0,0 +1,59 @@
+"""Merge of buffered finance deltas
+
+Affiliate rewards are inserted as finance_delta rows instead of updating
+masters' finance rows, so purchases in different downlines do not wait for
+each other on the same finance row. This job adds pending deltas to finance
+rows in batches. Until then, balance reads add pending deltas themselves.
+
+Run from api/src:
+    python -m jobs.finance_deltas
+"""
+
+import asyncio
+import logging
+
+from config import settings
+from database.db import DB
+from services.redis_service import RedisService
+
+
+logger = logging.getLogger(__name__)
+
+
+async def merge_finance_deltas(
+    batch_size: int = settings.FINANCE_DELTA_MERGE_BATCH_SIZE,
+) -> int:
+    """Merges all pending deltas, one transaction for each batch
+
+    Returns:
+        int: number of merged deltas
+    """
+    merged = 0
+    while True:
+        # no gap locks, so reward inserts are not blocked by the merge
+        async with DB(isolation_level="READ COMMITTED") as db:
+            count = await db.run_transaction(db.finance.merge_deltas, limit=batch_size)
+        merged += count
+        if count < batch_size:
+            return merged
+
+
+async def main() -> None:
+    # redis keeps transaction retry counters
+    await RedisService.init()
+    try:
+        while True:
+            try:
+                merged = await merge_finance_deltas()
+                if merged:
+                    logger.info("Merged %s finance deltas", merged)
+            except Exception:
+                logger.exception("Finance deltas merge failed")
+            await asyncio.sleep(settings.FINANCE_DELTA_MERGE_INTERVAL_SECONDS)
+    finally:
+        await RedisService.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
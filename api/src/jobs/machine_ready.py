@@ -0,0 +1,54 @@
+"""Machine ready notifications
+
+Publishes machine_ready user events for machines that became collectable
+since the previous run, using the readiness index in redis.
+
+Run from api/src:
+    python -m jobs.machine_ready
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from config import settings
+from database.db import DB
+from services.redis_service import RedisService
+from utils.enums import UserEvent
+
+
+async def notify_ready_machines() -> int:
+    """Publishes machine_ready events for machines ready since last notification
+
+    Returns:
+        int: number of notified machines
+    """
+    now = datetime.now()
+    notified_time = await RedisService.get_machine_ready_notified_time() or now
+    ready_ids = await RedisService.get_ready_machines_between(notified_time, now)
+    if ready_ids:
+        async with DB() as db:
+            owners = await db.machines.purchased.get_owner_ids(ready_ids)
+        for purchased_machine_id, user_id in owners.items():
+            await RedisService.publish_user_event(
+                user_id,
+                UserEvent.MACHINE_READY,
+                {"purchased_machine_id": purchased_machine_id},
+            )
+    await RedisService.save_machine_ready_notified_time(now)
+    return len(ready_ids)
+
+
+async def main() -> None:
+    await RedisService.init()
+    try:
+        while True:
+            await notify_ready_machines()
+            await asyncio.sleep(settings.MACHINE_READY_NOTIFY_INTERVAL_SECONDS)
+    finally:
+        await RedisService.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Batch settlement of purchased machines with ready commissions
+
+Due machines are pulled from the readiness index in redis (ZRANGEBYSCORE),
+commissions are collected per owner, one transaction for each owner.
+
+Run from api/src:
+    python -m jobs.settlement
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from config import settings
+from database.db import DB
+from schemas.user import UserSchema
+from services.machine_service import MachineService
+from services.redis_service import RedisService
+from utils.enums import MachineBatchResult
+
+
+logger = logging.getLogger(__name__)
+
+
+async def settle_ready_machines(limit: int = settings.SETTLEMENT_BATCH_SIZE) -> int:
+    """Collects commissions for owners of machines that are ready now
+
+    Args:
+        limit (int): max number of ready machines to process
+
+    Returns:
+        int: number of processed ready machines
+    """
+    ready_ids = await RedisService.get_ready_machines(datetime.now(), limit)
+    if not ready_ids:
+        return 0
+
+    async with DB() as db:
+        owners = await db.machines.purchased.get_owner_ids(ready_ids)
+
+    collected_ids: set[int] = set()
+    failed_user_ids: set[int] = set()
+    for user_id in sorted(set(owners.values())):
+        try:
+            async with DB() as db:
+                db_user = await db.users.get_by_id(user_id)
+                if db_user is None:
+                    continue
+                user = UserSchema.model_validate(db_user)
+                results = await db.run_transaction(
+                    MachineService(db).receive_all_commissions, user
+                )
+        except Exception:
+            logger.exception("failed to settle commissions of user %s", user_id)
+            failed_user_ids.add(user_id)
+            continue
+        collected_ids.update(
+            result.purchased_machine_id
+            for result in results
+            if result.result == MachineBatchResult.COLLECTED
+        )
+
+    # collected machines are already removed from the index (or indexed for the
+    # next period with lazy accrual), the rest would be pulled again forever.
+    # Machines of owners that failed stay indexed and are retried next batch
+    await RedisService.delete_machines_ready_time(
+        purchased_machine_id
+        for purchased_machine_id in ready_ids
+        if purchased_machine_id not in collected_ids
+        and owners.get(purchased_machine_id) not in failed_user_ids
+    )
+    return len(ready_ids)
+
+
+async def main() -> None:
+    await RedisService.init()
+    try:
+        while True:
+            processed = await settle_ready_machines()
+            if processed < settings.SETTLEMENT_BATCH_SIZE:
+                await asyncio.sleep(settings.SETTLEMENT_INTERVAL_SECONDS)
+    finally:
+        await RedisService.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
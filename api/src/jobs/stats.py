@@ -0,0 +1,55 @@
+"""Dashboard gauges refresh
+
+Recomputes the admin dashboard gauges (machines per coin, pending withdrawals)
+and stores them in redis, the dashboard itself only reads redis. Daily counters
+are incremented by services when changes are committed.
+
+Run from api/src:
+    python -m jobs.stats
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from config import settings
+from database.db import DB
+from services.redis_service import RedisService
+
+
+async def refresh_stats_gauges() -> dict[str, int | str]:
+    """Recomputes dashboard gauges, reads only purchased_machine, machine
+    and pending withdrawals
+
+    Returns:
+        dict[str, int | str]: saved gauges
+    """
+    async with DB() as db:
+        machines = await db.machines.purchased.count_by_coin()
+        pending_withdrawals = await db.finance.get_pending_withdrawals_total()
+
+    gauges: dict[str, int | str] = {
+        "pending_withdrawals": pending_withdrawals.count,
+        "pending_withdrawals_amount": int(pending_withdrawals.amount),
+        "refreshed_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    for coin, purchased, active in machines:
+        gauges[f"purchased_machines:{coin}"] = purchased
+        gauges[f"active_machines:{coin}"] = int(active or 0)
+    await RedisService.save_stats_gauges(gauges)
+    return gauges
+
+
+async def main() -> None:
+    await RedisService.init()
+    try:
+        while True:
+            await refresh_stats_gauges()
+            await asyncio.sleep(settings.STATS_REFRESH_INTERVAL_SECONDS)
+    finally:
+        await RedisService.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,8 +1,9 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
-from sqladmin import Admin
 
 # TODO: fix import problems ---------------------------------
 import sys
@@ -15,53 +16,60 @@ from routers.auth import router as auth_router
 from routers.user import router as user_router
 from routers.finance import router as finance_router
 from routers.machine import router as machine_router
+from routers.events import router as events_router
 from schemas.errors import ValidationErrorResponse
-from utils.error_handlers import validation_exception_handler
+from utils.error_handlers import (
+    validation_exception_handler,
+    idempotent_replay_handler,
+)
+from dependencies.idempotency import IdempotentReplay, store_idempotent_response
 from services.redis_service import RedisService
+from services.event_service import event_broker
 from utils import initiate_data
 from config import settings
-from database.db import engine
-from admin import views
+from database.db import dispose_engines, warm_up_pool
+from admin.app import LazyAdminApp
 
 
 # REDIS INIT
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await initiate_data.initiate_machines()
-    await initiate_data.initiate_admin()
+    if settings.SEED_ON_STARTUP:
+        await initiate_data.seed()
     await RedisService.init()
+    # open connections before the worker starts accepting requests
+    await asyncio.gather(warm_up_pool(), RedisService.ping())
+    await event_broker.start()
     yield
+    await event_broker.stop()
     await RedisService.close()
+    await dispose_engines()
 
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="MiningVit App",
         lifespan=lifespan,
-        exception_handlers={RequestValidationError: validation_exception_handler},
+        default_response_class=ORJSONResponse,
+        exception_handlers={
+            RequestValidationError: validation_exception_handler,
+            IdempotentReplay: idempotent_replay_handler,
+        },
         responses={
             422: {"description": "Validation Error", "model": ValidationErrorResponse}
         },
     )
+    app.middleware("http")(store_idempotent_response)
+
     # routers
     app.include_router(auth_router, prefix="/auth")
     app.include_router(user_router, prefix="/api/user")
     app.include_router(finance_router, prefix="/api/finance")
     app.include_router(machine_router, prefix="/api/machine")
+    app.include_router(events_router, prefix="/api/events")
 
     # admin
-    admin = Admin(
-        app, engine, title="MiningVit Admin Panel", base_url="/" + settings.ADMIN_URL
-    )
-    admin.add_view(views.UserAdmin)
-    admin.add_view(views.MasterReferralAdmin)
-    admin.add_view(views.FinanceAdmin)
-    admin.add_view(views.MachineAdmin)
-    admin.add_view(views.PurchasedMachineAdmin)
-    admin.add_view(views.DepositAdmin)
-    admin.add_view(views.WithdrawalAdmin)
-    admin.add_view(views.IncomeAdmin)
-    admin.add_view(views.AdvertAdmin)
+    app.mount("/" + settings.ADMIN_URL, LazyAdminApp(), name="admin")
 
     @app.get("/")
     async def test():
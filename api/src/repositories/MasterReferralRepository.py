@@ -1,4 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
 
 from .base import GenericSqlRepository
 from database.models import MasterReferral
@@ -7,3 +9,33 @@ from database.models import MasterReferral
 class MasterReferralRepository(GenericSqlRepository[MasterReferral]):
     def __init__(self, session: AsyncSession) -> None:
         super().__init__(session, MasterReferral)
+
+    async def get_upline_ids(self, user_id: int, depth: int) -> list[int]:
+        """Returns ids of :user_id masters, closest first, up to :depth levels
+
+        Args:
+            user_id (int): referral whose masters are returned
+            depth (int): number of levels to walk up
+
+        Returns:
+            list[int]: master ids, shorter than :depth if chain ends earlier
+        """
+        if depth < 1:
+            return []
+        levels = [aliased(MasterReferral) for _ in range(depth)]
+        stmt = (
+            select(*[level.master_id for level in levels])
+            .select_from(levels[0])
+            .where(levels[0].referral_id == user_id)
+        )
+        for child, parent in zip(levels, levels[1:]):
+            stmt = stmt.outerjoin(parent, parent.referral_id == child.master_id)
+        row = (await self._session.execute(stmt.limit(1))).first()
+        if row is None:
+            return []
+        upline = []
+        for master_id in row:
+            if master_id is None:
+                break
+            upline.append(master_id)
+        return upline
@@ -1,6 +1,7 @@
 from typing import Sequence, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, RowMapping
+from sqlalchemy.exc import NoSuchColumnError
 
 from .base import GenericSqlRepository
 from database.models import User, MasterReferral
@@ -27,10 +28,6 @@ class UserRepository(GenericSqlRepository[User]):
         stmt = select(User).where(User.affiliate_code == affiliate_code)
         return await self._session.scalar(stmt)
 
-    async def check_existance_by(self, **kwargs) -> bool:
-        exists = await self.list(**kwargs)
-        return True if exists else False
-
     async def get_master(self, user_id: int) -> User | None:
         """Returns User model that represents master of :user
 
@@ -48,17 +45,24 @@ class UserRepository(GenericSqlRepository[User]):
         return await self._session.scalar(stmt)
 
     async def get_referrals(
-        self, user_id: int, level: int = 1, **filters
-    ) -> Sequence[User]:
+        self,
+        user_id: int,
+        level: int = 1,
+        columns: Sequence[str] | None = None,
+        **filters,
+    ) -> Sequence[User] | Sequence[RowMapping]:
         """Returns list of users(referrals) of :user and
            filtered with :**filters and
            ordered by User.created column in deescending mode
         Args:
             user (User): User (master of referrals) obj
             level (int, optional): Depth level of referrals  Defaults to 1.
+            columns (Sequence[str], optional): If set only these columns are
+                selected and returned as mappings. Defaults to None.
             filters (optional kwargs): Additional filters for referrals
         Returns:
-            Sequence[User]: Sequence of User objects (referrals of :user)
+            Sequence[User] | Sequence[RowMapping]: Sequence of User objects
+                (referrals of :user) or their :columns
         """
         if level == 0:
             return []
@@ -69,10 +73,18 @@ class UserRepository(GenericSqlRepository[User]):
                 MasterReferral.master_id.in_(subq)
             )
         # selecting referrals with ids in subq statement
+        if columns is None:
+            stmt = select(User)
+        else:
+            try:
+                stmt = select(*[getattr(User, column) for column in columns])
+            except AttributeError:
+                raise NoSuchColumnError("Non existent column in columns sequence")
         stmt = (
-            select(User)
-            .where(User.id.in_(subq))
+            stmt.where(User.id.in_(subq))
             .filter_by(**filters)
             .order_by(desc(User.created_at))
         )
+        if columns is not None:
+            return (await self._session.execute(stmt)).mappings().all()
         return list((await self._session.scalars(stmt)).unique())
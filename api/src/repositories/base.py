@@ -1,14 +1,29 @@
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Type, Sequence, Any
+from typing import (
+    TYPE_CHECKING,
+    ClassVar,
+    Generic,
+    Iterator,
+    TypeVar,
+    Type,
+    Sequence,
+    Any,
+)
 from redis.asyncio import Redis, ConnectionError
+from redis.asyncio.client import PubSub
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update, func
+from sqlalchemy import select, delete, update, insert, literal, RowMapping
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import NoSuchColumnError
 
 from database.models import Base
+from utils.db_retry import StaleVersionError
 from config import settings
 
+if TYPE_CHECKING:
+    from repositories.cache import RepositoryCache
+
 
 T = TypeVar("T", bound=Base)
 
@@ -36,10 +51,16 @@ class GenericRepository(Generic[T], ABC):
 
 
 class GenericSqlRepository(GenericRepository[T], ABC):
+    # opt-in cache of get_by_id/get_by_filters lookups without eager and for_update
+    cache: ClassVar["RepositoryCache | None"] = None
+
     def __init__(self, session: AsyncSession, model: Type[T]) -> None:
         self._session = session
         self._model = model
 
+    async def _load(self, **filters) -> T | None:
+        return await self._session.scalar(select(self._model).filter_by(**filters))
+
     async def get_by_id(
         self, id: int, eager: Sequence[str] | None = None, for_update=False
     ) -> T | None:
@@ -52,6 +73,9 @@ class GenericSqlRepository(GenericRepository[T], ABC):
         Returns:
             T: Returns T record in db
         """
+        if self.cache is not None and not eager and not for_update:
+            return await self.cache.get(self._session, self._load, id=id)
+
         stmt = select(self._model).filter_by(id=id)
 
         if eager:
@@ -80,6 +104,9 @@ class GenericSqlRepository(GenericRepository[T], ABC):
         Returns:
             T: Returns T record in db
         """
+        if self.cache is not None and not eager and not for_update:
+            return await self.cache.get(self._session, self._load, **filters)
+
         stmt = select(self._model).filter_by(**filters)
 
         if eager:
@@ -116,6 +143,25 @@ class GenericSqlRepository(GenericRepository[T], ABC):
 
         return (await self._session.scalars(stmt)).all()
 
+    async def list_rows(
+        self, columns: Sequence[str], **filters
+    ) -> Sequence[RowMapping]:
+        """Returns :columns of :T records by :filters as mappings,
+        no ORM objects are built
+
+        Args:
+            columns (Sequence[str]): names of columns to select
+            **filters: Filters to filter out records
+        Returns:
+            Sequence[RowMapping]: Returns sequence of column mappings
+        """
+        try:
+            stmt = select(*[getattr(self._model, column) for column in columns])
+        except AttributeError:
+            raise NoSuchColumnError("Non existent column in columns sequence")
+        stmt = stmt.filter_by(**filters).order_by(self._model.id)
+        return (await self._session.execute(stmt)).mappings().all()
+
     async def add(self, data: dict[str, Any]) -> T:
         """Adds a record with :data in database
 
@@ -129,26 +175,160 @@ class GenericSqlRepository(GenericRepository[T], ABC):
         self._session.add(record)
         await self._session.flush()
         await self._session.refresh(record)
+        if self.cache is not None:
+            self.cache.invalidate(self._session, record.id)
         return record
 
-    async def update(self, id: int, data: dict[str, Any]) -> T | None:
+    async def add_many(
+        self, data: Sequence[dict[str, Any]], return_ids: bool = False
+    ) -> Sequence[int]:
+        """Adds records with :data without building or refreshing ORM objects.
+        All dicts of :data must have the same keys
+
+        Without :return_ids rows are sent as one executemany, that the driver
+        rewrites into multi-row INSERTs. With :return_ids every batch of
+        BULK_INSERT_BATCH_SIZE rows is one multi-row INSERT and its ids are taken
+        as the range from its lastrowid: InnoDB gives consecutive auto increment
+        values to one INSERT with known number of rows (auto_increment_increment
+        must be 1)
+
+        Args:
+            data (Sequence[dict[str, Any]]): data of records
+            return_ids (bool): If True returns ids of added records
+
+        Returns:
+            Sequence[int]: ids in order of :data, empty without :return_ids
+        """
+        if not data:
+            return []
+        table = self._model.__table__
+        ids: list[int] = []
+        # cached models need ids to invalidate added rows like add does,
+        # so that they never get into cache before commit
+        if not return_ids and self.cache is None:
+            await self._session.execute(insert(table), list(data))
+        else:
+            for batch in _batches(data):
+                result = await self._session.execute(insert(table).values(batch))
+                ids.extend(range(result.lastrowid, result.lastrowid + len(batch)))
+            if self.cache is not None:
+                for id in ids:
+                    self.cache.invalidate(self._session, id)
+        await self._session.flush()
+        return ids if return_ids else []
+
+    async def upsert_many(
+        self, data: Sequence[dict[str, Any]], update_columns: Sequence[str] = ()
+    ) -> int:
+        """Adds records with :data in multi-row INSERT ... ON DUPLICATE KEY UPDATE
+        statements of BULK_INSERT_BATCH_SIZE rows. Records that already exist by
+        primary or unique key get :update_columns from :data, without
+        :update_columns they are kept as is
+
+        Args:
+            data (Sequence[dict[str, Any]]): data of records
+            update_columns (Sequence[str]): columns to update in existing records
+
+        Raises:
+            ValueError: raises if cached records are updated by other keys than id
+
+        Returns:
+            int: affected rows as MySQL counts them (1 added, 2 updated)
+        """
+        if not data:
+            return 0
+        if (
+            self.cache is not None
+            and update_columns
+            and any("id" not in row for row in data)
+        ):
+            raise ValueError("cached records can be upserted only by id")
+
+        table = self._model.__table__
+        affected = 0
+        for batch in _batches(data):
+            stmt = mysql.insert(table).values(batch)
+            values = {column: stmt.inserted[column] for column in update_columns}
+            if values and "version" in table.c:
+                values["version"] = table.c.version + 1
+            # assigning id to itself is a no-op that keeps existing rows
+            stmt = stmt.on_duplicate_key_update(values or {"id": table.c.id})
+            affected += (await self._session.execute(stmt)).rowcount
+        if self.cache is not None and update_columns:
+            for row in data:
+                self.cache.invalidate(self._session, row["id"])
+        await self._session.flush()
+        return affected
+
+    async def update(
+        self, id: int, data: dict[str, Any], version: int | None = None
+    ) -> T | None:
         """Updates a record in database using :id
 
         Args:
             id (int): record ID in database
             data (dict[str, Any]): data for updating the record
+            version (int | None): if given, record is updated only while it is
+                still at :version (compare-and-swap, T must have version column)
+
+        Raises:
+            StaleVersionError: raises if record was updated since :version was read
 
         Returns:
             T | None: T model in database or None if data wasn't updated
         """
         data.pop("id", None)
-        stmt = update(self._model).filter_by(id=id).values(data)
-        await self._session.execute(stmt)
+        stmt = update(self._model).filter_by(id=id)
+        if hasattr(self._model, "version"):
+            data.pop("version", None)
+            stmt = stmt.values(version=self._model.version + 1)
+        if version is not None:
+            stmt = stmt.filter_by(version=version)
+        result = await self._session.execute(
+            stmt.values(data).execution_options(synchronize_session=False)
+        )
+        if version is not None and result.rowcount == 0:
+            raise StaleVersionError(f"{self._model.__tablename__} {id}")
         await self._session.flush()
+        if self.cache is not None:
+            self.cache.invalidate(self._session, id)
         record = await self.get_by_id(id=id)
         await self._session.refresh(record)
         return record
 
+    async def update_where(
+        self, filters: dict[str, Any], values: dict[str, Any]
+    ) -> int:
+        """Updates all records matching :filters with :values in one statement.
+        Nothing is read before or refreshed after, so a check like ownership
+        is folded into the write: no matched rows means the check failed
+
+        Args:
+            filters (dict[str, Any]): column filters of updated records
+            values (dict[str, Any]): data for updating the records
+
+        Returns:
+            int: number of matched records
+        """
+        stmt = update(self._model).filter_by(**filters).values(values)
+        if hasattr(self._model, "version"):
+            stmt = stmt.values(version=self._model.version + 1)
+        if self.cache is not None:
+            ids = (
+                [filters["id"]]
+                if "id" in filters
+                else await self._session.scalars(
+                    select(self._model.id).filter_by(**filters)
+                )
+            )
+            for id in ids:
+                self.cache.invalidate(self._session, id)
+        result = await self._session.execute(
+            stmt.execution_options(synchronize_session=False)
+        )
+        await self._session.flush()
+        return result.rowcount
+
     async def delete(self, id: int) -> None:
         """Deletes a record in database using :id
 
@@ -158,18 +338,24 @@ class GenericSqlRepository(GenericRepository[T], ABC):
         stmt = delete(self._model).filter_by(id=id)
         await self._session.execute(stmt)
         await self._session.flush()
+        if self.cache is not None:
+            self.cache.invalidate(self._session, id)
 
-    async def is_exists(self, **filters) -> bool:
-        """Checks if row exists
+    async def exists(self, **filters) -> bool:
+        """Checks if a record matching :filters exists, the scan stops
+        at the first one (SELECT 1 ... LIMIT 1)
 
         Returns:
             bool: True or False
         """
-        stmt = select(func.count()).select_from(self._model).filter_by(**filters)
-        row_count = await self._session.scalar(stmt)
-        if row_count:
-            return True
-        return False
+        stmt = select(literal(1)).select_from(self._model).filter_by(**filters)
+        return await self._session.scalar(stmt.limit(1)) is not None
+
+
+def _batches(data: Sequence[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    size = settings.BULK_INSERT_BATCH_SIZE
+    for start in range(0, len(data), size):
+        yield list(data[start : start + size])
 
 
 class GenreicRedisRepository(ABC):
@@ -189,26 +375,71 @@ class GenreicRedisRepository(ABC):
             raise ConnectionError("Redis connection had not be initialized")
         await self._redis.aclose()
 
+    async def ping(self) -> bool:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.ping()  # type: ignore
+
     async def get(self, key: Any) -> Any | None:
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
         return await self._redis.get(key)
 
-    async def set(self, key: Any, value: Any, expire: int | None) -> bool:
+    async def set(
+        self, key: Any, value: Any, expire: int | None, nx: bool = False
+    ) -> bool:
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
-        return await self._redis.set(key, value, ex=expire)
+        return await self._redis.set(key, value, ex=expire, nx=nx)
 
     async def delete(self, key: Any) -> bool:
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
         return await self._redis.delete(key)
 
+    async def mget(self, *keys: Any) -> list[Any | None]:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.mget(*keys)
+
+    async def incr(self, key: Any) -> int:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.incr(key)
+
+    async def unlink(self, *keys: Any) -> int:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.unlink(*keys)
+
     async def hset(self, name: Any, key: Any, value: Any) -> int | Any:
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
         return await self._redis.hset(name, key, value)  # type: ignore
 
+    async def hgetall(self, name: Any) -> dict[Any, Any]:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.hgetall(name)  # type: ignore
+
+    async def hset_many(self, name: Any, mapping: dict[Any, Any]) -> int | Any:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.hset(name, mapping=mapping)  # type: ignore
+
+    async def hincrby_many(
+        self, name: Any, mapping: dict[Any, int], expire: int | None = None
+    ) -> None:
+        """Increments hash fields of :name by :mapping in one round trip"""
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, amount in mapping.items():
+                pipe.hincrby(name, key, amount)
+            if expire is not None:
+                pipe.expire(name, expire)
+            await pipe.execute()
+
     async def hdel(self, name: Any, *keys: Any) -> int | Any:
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
@@ -223,3 +454,40 @@ class GenreicRedisRepository(ABC):
         if self._redis is None:
             raise ConnectionError("Redis connection had not be initialized")
         return await self._redis.sadd(name, *values)  # type: ignore
+
+    async def zadd(self, name: Any, mapping: dict[Any, float]) -> int | Any:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.zadd(name, mapping)  # type: ignore
+
+    async def zrem(self, name: Any, *values: Any) -> int | Any:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.zrem(name, *values)  # type: ignore
+
+    async def zscore(self, name: Any, value: Any) -> float | None:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.zscore(name, value)  # type: ignore
+
+    async def zrangebyscore(
+        self,
+        name: Any,
+        min: float | str,
+        max: float | str,
+        start: int | None = None,
+        num: int | None = None,
+    ) -> list[Any]:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.zrangebyscore(name, min, max, start=start, num=num)  # type: ignore
+
+    async def publish(self, channel: Any, message: Any) -> int | Any:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return await self._redis.publish(channel, message)
+
+    def pubsub(self) -> PubSub:
+        if self._redis is None:
+            raise ConnectionError("Redis connection had not be initialized")
+        return self._redis.pubsub(ignore_subscribe_messages=True)
@@ -0,0 +1,220 @@
+"""Opt-in second level cache of repository get_by_id/get_by_filters lookups
+
+Rows are cached as orjson encoded column dicts in redis for REPO_CACHE_TTL_SECONDS
+and in a small per-process LRU for REPO_CACHE_LOCAL_TTL_SECONDS. Lookups by other
+columns store a pointer to the row id, the row is checked to still match them.
+
+Writes through a cached repository evict local entries at once, redis entries are
+deleted after commit of the session (see commit_invalidations), and the session
+bypasses the cache of that model until then, so uncommitted rows are never cached.
+"""
+
+import enum
+import logging
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable
+
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from config import settings
+from database.models import Base
+from repositories.redis_repository import redis_repo
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_STATS_KEY = "stats:cache"
+_PENDING_KEYS = "cache_pending_invalidations"
+_DIRTY_CACHES = "cache_dirty_models"
+
+
+def _decoder(column: Any) -> Callable[[Any], Any]:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return lambda value: value
+
+    def decode(value: Any) -> Any:
+        if value is None or isinstance(value, python_type):
+            return value
+        if python_type in (datetime, date):
+            return python_type.fromisoformat(value)
+        return python_type(value)
+
+    return decode
+
+
+def _key_value(value: Any) -> str:
+    return str(value.value if isinstance(value, enum.Enum) else value)
+
+
+class RepositoryCache:
+    """Cache of :model rows, shared by all repositories of :model"""
+
+    def __init__(self, model: type[Base]) -> None:
+        self.model = model
+        self.prefix = f"cache:{model.__tablename__}"
+        self.stats: Counter[str] = Counter()
+        self._columns = {
+            attr.key: _decoder(attr.columns[0]) for attr in inspect(model).column_attrs
+        }
+        self._local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._stats_flushed_at = time.monotonic()
+
+    def key(self, **filters: Any) -> str:
+        return (
+            self.prefix
+            + ":"
+            + "&".join(
+                f"{name}={_key_value(value)}" for name, value in sorted(filters.items())
+            )
+        )
+
+    async def get(
+        self,
+        session: AsyncSession,
+        load: Callable[..., Awaitable[Any]],
+        **filters: Any,
+    ) -> Any:
+        """Returns :model record by :filters from cache, or from :load(**filters)
+        caching its row. Cached rows are attached to :session without a query"""
+        if self.prefix in session.info.get(_DIRTY_CACHES, ()):
+            return await load(**filters)
+
+        if set(filters) == {"id"}:
+            row = await self._get_value(self.key(id=filters["id"]))
+        else:
+            id = await self._get_value(self.key(**filters))
+            row = await self._get_value(self.key(id=id)) if id is not None else None
+            if row is not None and any(
+                row.get(name) != value for name, value in filters.items()
+            ):
+                row = None
+
+        if row is None:
+            self.stats["misses"] += 1
+            await self._flush_stats()
+            record = await load(**filters)
+            if record is not None:
+                await self._store(record, filters)
+            return record
+
+        self.stats["hits"] += 1
+        await self._flush_stats()
+        record = self.model(**row)
+        make_transient_to_detached(record)
+        return await session.merge(record, load=False)
+
+    def invalidate(self, session: AsyncSession, id: Any) -> None:
+        """Evicts row :id from local cache, redis entry is deleted on commit"""
+        key = self.key(id=id)
+        self._local.pop(key, None)
+        session.info.setdefault(_PENDING_KEYS, {})[key] = self
+        session.info.setdefault(_DIRTY_CACHES, set()).add(self.prefix)
+
+    async def delete(self, id: Any) -> None:
+        """Evicts row :id at once, for writes made outside repositories"""
+        key = self.key(id=id)
+        self._local.pop(key, None)
+        try:
+            await redis_repo.delete(key)
+        except RedisError:
+            logger.warning("Could not delete cache key %s", key)
+
+    async def _get_value(self, key: str) -> Any:
+        cached = self._local.get(key)
+        if cached is not None:
+            expires_at, value = cached
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                return value
+            del self._local[key]
+
+        try:
+            raw = await redis_repo.get(key)
+        except RedisError:
+            return None
+        if raw is None:
+            return None
+        value = orjson.loads(raw)
+        if isinstance(value, dict):
+            value = {
+                name: self._columns[name](item)
+                for name, item in value.items()
+                if name in self._columns
+            }
+        self._set_local(key, value)
+        return value
+
+    async def _store(self, record: Any, filters: dict[str, Any]) -> None:
+        state = inspect(record)
+        # expired or deferred columns would need a query to load
+        if any(name not in state.dict for name in self._columns):
+            return
+        row = {name: state.dict[name] for name in self._columns}
+        values = {self.key(id=row["id"]): row}
+        if set(filters) != {"id"}:
+            values[self.key(**filters)] = row["id"]
+
+        for key, value in values.items():
+            self._set_local(key, value)
+            try:
+                await redis_repo.set(
+                    key,
+                    orjson.dumps(value, default=str).decode(),
+                    expire=settings.REPO_CACHE_TTL_SECONDS,
+                )
+            except RedisError:
+                logger.warning("Could not store cache key %s", key)
+
+    def _set_local(self, key: str, value: Any) -> None:
+        self._local[key] = (
+            time.monotonic() + settings.REPO_CACHE_LOCAL_TTL_SECONDS,
+            value,
+        )
+        self._local.move_to_end(key)
+        if len(self._local) > settings.REPO_CACHE_LOCAL_MAX_SIZE:
+            self._local.popitem(last=False)
+
+    async def _flush_stats(self) -> None:
+        """Adds hit and miss counters to CACHE_STATS_KEY redis hash
+        once in REPO_CACHE_STATS_FLUSH_SECONDS"""
+        now = time.monotonic()
+        if now - self._stats_flushed_at < settings.REPO_CACHE_STATS_FLUSH_SECONDS:
+            return
+        self._stats_flushed_at = now
+        stats, self.stats = self.stats, Counter()
+        try:
+            await redis_repo.hincrby_many(
+                CACHE_STATS_KEY,
+                {
+                    f"{self.model.__tablename__}:{name}": count
+                    for name, count in stats.items()
+                },
+            )
+        except RedisError:
+            self.stats.update(stats)
+
+
+async def commit_invalidations(session: AsyncSession) -> None:
+    """Deletes redis entries of rows written in committed :session"""
+    pending: dict[str, RepositoryCache] = session.info.pop(_PENDING_KEYS, {})
+    session.info.pop(_DIRTY_CACHES, None)
+    for key, cache in pending.items():
+        # other sessions of this process could cache old row before commit
+        cache._local.pop(key, None)
+        try:
+            await redis_repo.delete(key)
+        except RedisError:
+            logger.warning("Could not delete cache key %s", key)
+
+
+def discard_invalidations(session: AsyncSession) -> None:
+    session.info.pop(_PENDING_KEYS, None)
+    session.info.pop(_DIRTY_CACHES, None)
@@ -1,11 +1,13 @@
-from typing import Any
+from typing import Any, Iterable, Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import case, delete, func, select, update, insert, Row, RowMapping
 from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.exc import NoSuchColumnError
 
 from .base import GenericSqlRepository
-from database.models import Finance, Deposit, Withdrawal, Income
+from database.models import Base, Finance, FinanceDelta, Deposit, Withdrawal, Income
 from utils.validation_errors import AppError
+from utils.enums import TransactionStatus
 
 
 class FinanceRepository(GenericSqlRepository[Finance]):
@@ -16,6 +18,39 @@ class FinanceRepository(GenericSqlRepository[Finance]):
         stmt = select(Finance).filter_by(user_id=user_id).options(raiseload("*"))
         return await self._session.scalar(stmt)
 
+    async def get_user_finance_totals(self, user_id: int) -> Row | None:
+        """Returns finance row of user with pending deltas added to
+        balance and affiliate_income
+
+        Returns:
+            Row | None: row of (id, wallet, balance, income, affiliate_income)
+        """
+
+        def pending(column: Any) -> Any:
+            return (
+                select(func.coalesce(func.sum(column), 0))
+                .where(FinanceDelta.finance_id == Finance.id)
+                .scalar_subquery()
+            )
+
+        stmt = select(
+            Finance.id,
+            Finance.wallet,
+            (Finance.balance + pending(FinanceDelta.balance)).label("balance"),
+            Finance.income,
+            (Finance.affiliate_income + pending(FinanceDelta.affiliate_income)).label(
+                "affiliate_income"
+            ),
+        ).filter(Finance.user_id == user_id)
+        return (await self._session.execute(stmt)).one_or_none()
+
+    async def get_finance_ids(self, user_ids: Sequence[int]) -> dict[int, int]:
+        """Returns finance ids by user ids"""
+        if not user_ids:
+            return {}
+        stmt = select(Finance.user_id, Finance.id).where(Finance.user_id.in_(user_ids))
+        return dict((await self._session.execute(stmt)).tuples().all())
+
     async def get_user_finance_with(
         self, user_id: int, with_: str = "all"
     ) -> Finance | None:
@@ -28,20 +63,35 @@ class FinanceRepository(GenericSqlRepository[Finance]):
             stmt = stmt.options(selectinload(getattr(Finance, with_)))
         return await self._session.scalar(stmt)
 
-    async def get_user_deposits(self, user_id: int) -> list[Deposit]:
-        stmt = select(Deposit).join(Finance).filter(Finance.user_id == user_id)
-        deposits = list(await self._session.scalars(stmt))
-        return deposits
+    async def _get_user_transactions(
+        self, model: type[Base], user_id: int, columns: Sequence[str] | None
+    ) -> Sequence[Any]:
+        """Returns :model records of user, or only their :columns as mappings"""
+        if columns is None:
+            stmt = select(model).join(Finance).filter(Finance.user_id == user_id)
+            return list(await self._session.scalars(stmt))
+
+        try:
+            stmt = select(*[getattr(model, column) for column in columns])
+        except AttributeError:
+            raise NoSuchColumnError("Non existent column in columns sequence")
+        stmt = stmt.join(Finance).filter(Finance.user_id == user_id)
+        return (await self._session.execute(stmt.order_by(model.id))).mappings().all()
 
-    async def get_user_withdrawals(self, user_id: int) -> list[Withdrawal]:
-        stmt = select(Withdrawal).join(Finance).filter(Finance.user_id == user_id)
-        withdrawals = list(await self._session.scalars(stmt))
-        return withdrawals
+    async def get_user_deposits(
+        self, user_id: int, columns: Sequence[str] | None = None
+    ) -> Sequence[Deposit] | Sequence[RowMapping]:
+        return await self._get_user_transactions(Deposit, user_id, columns)
 
-    async def get_user_incomes(self, user_id: int) -> list[Income]:
-        stmt = select(Income).join(Finance).filter(Finance.user_id == user_id)
-        incomes = list(await self._session.scalars(stmt))
-        return incomes
+    async def get_user_withdrawals(
+        self, user_id: int, columns: Sequence[str] | None = None
+    ) -> Sequence[Withdrawal] | Sequence[RowMapping]:
+        return await self._get_user_transactions(Withdrawal, user_id, columns)
+
+    async def get_user_incomes(
+        self, user_id: int, columns: Sequence[str] | None = None
+    ) -> Sequence[Income] | Sequence[RowMapping]:
+        return await self._get_user_transactions(Income, user_id, columns)
 
     async def add_user_deposit(self, user_id: int, data: dict[str, Any]) -> None:
         user_finance = await self.get_user_finance_with(user_id, with_="deposits")
@@ -52,11 +102,161 @@ class FinanceRepository(GenericSqlRepository[Finance]):
         await self._session.flush()
 
     async def add_user_income(self, user_id: int, data: dict[str, Any]) -> None:
-        user_finance = await self.get_user_finance_with(user_id, with_="incomes")
-        if user_finance is None:
+        finance_id = await self._session.scalar(
+            select(Finance.id).filter_by(user_id=user_id)
+        )
+        if finance_id is None:
+            raise AppError.COULD_NOT_GET_FINANCE
+
+        await self._session.execute(
+            insert(Income).values(finance_id=finance_id, **data)
+        )
+        await self._session.flush()
+
+    async def add_user_incomes(
+        self, user_id: int, data: Sequence[dict[str, Any]]
+    ) -> None:
+        """Adds many income records for user in one multi-row insert
+
+        Args:
+            user_id (int): owner of finance row
+            data (Sequence[dict[str, Any]]): income records data
+        """
+        if not data:
+            return
+        finance_id = await self._session.scalar(
+            select(Finance.id).filter_by(user_id=user_id)
+        )
+        if finance_id is None:
             raise AppError.COULD_NOT_GET_FINANCE
 
-        user_finance.incomes.append(Income(**data))
+        await self._session.execute(
+            insert(Income).values(
+                [{"finance_id": finance_id, **income} for income in data]
+            )
+        )
+        await self._session.flush()
+
+    async def add_incomes(self, data: Sequence[dict[str, Any]]) -> None:
+        """Adds income records with finance_id in one multi-row insert"""
+        if not data:
+            return
+        await self._session.execute(insert(Income).values(list(data)))
+        await self._session.flush()
+
+    async def add_deltas(self, data: Sequence[dict[str, Any]]) -> None:
+        """Buffers balance changes of finance rows without updating them
+
+        Args:
+            data (Sequence[dict[str, Any]]): dicts with finance_id and balance
+                and/or affiliate_income keys
+        """
+        if not data:
+            return
+        await self._session.execute(insert(FinanceDelta).values(list(data)))
+        await self._session.flush()
+
+    async def lock_many(self, finance_ids: Iterable[int]) -> None:
+        """Locks finance rows in ascending id order. Transactions that lock
+        several finance rows take them through here first, so that two of them
+        never wait for each other's rows in opposite order"""
+        finance_ids = sorted(set(finance_ids))
+        if not finance_ids:
+            return
+        stmt = (
+            select(Finance.id)
+            .where(Finance.id.in_(finance_ids))
+            .order_by(Finance.id)
+            .with_for_update()
+        )
+        await self._session.execute(stmt)
+
+    async def merge_deltas(
+        self, finance_ids: Sequence[int] | None = None, limit: int | None = None
+    ) -> int:
+        """Adds oldest pending deltas to their finance rows and deletes them.
+        Delta rows are locked before finance rows, callers that also lock
+        finance rows must merge first to keep the same order. Run it at
+        READ COMMITTED, at REPEATABLE READ the locking read of finance_delta
+        takes gap locks that block reward inserts (see DB.merge_finance_deltas)
+
+        Args:
+            finance_ids (Sequence[int] | None): merge only deltas of these rows
+            limit (int | None): max number of merged deltas
+
+        Returns:
+            int: number of merged deltas
+        """
+        stmt = select(
+            FinanceDelta.id,
+            FinanceDelta.finance_id,
+            FinanceDelta.balance,
+            FinanceDelta.affiliate_income,
+        )
+        if finance_ids is not None:
+            stmt = stmt.where(FinanceDelta.finance_id.in_(finance_ids))
+        stmt = stmt.order_by(FinanceDelta.id).limit(limit).with_for_update()
+        deltas = (await self._session.execute(stmt)).all()
+        if not deltas:
+            return 0
+
+        balances: dict[int, int] = {}
+        affiliate_incomes: dict[int, int] = {}
+        for delta in deltas:
+            balances[delta.finance_id] = (
+                balances.get(delta.finance_id, 0) + delta.balance
+            )
+            affiliate_incomes[delta.finance_id] = (
+                affiliate_incomes.get(delta.finance_id, 0) + delta.affiliate_income
+            )
+        await self.lock_many(balances)
+        stmt = (
+            update(Finance)
+            .where(Finance.id.in_(balances))
+            .values(
+                balance=Finance.balance + case(balances, value=Finance.id),
+                affiliate_income=Finance.affiliate_income
+                + case(affiliate_incomes, value=Finance.id),
+                version=Finance.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self._session.execute(stmt)
+        await self._session.execute(
+            delete(FinanceDelta)
+            .where(FinanceDelta.id.in_([delta.id for delta in deltas]))
+            .execution_options(synchronize_session=False)
+        )
+        await self._session.flush()
+        return len(deltas)
+
+    async def merge_user_deltas(self, user_id: int) -> Finance | None:
+        """Merges pending deltas of user finance row, see merge_deltas
+
+        Returns:
+            Finance | None: finance row as it is after the merge
+        """
+        finance_id = await self._session.scalar(
+            select(Finance.id).filter_by(user_id=user_id)
+        )
+        if finance_id is None:
+            return None
+        await self.merge_deltas([finance_id])
+        return await self.get_user_finance(user_id)
+
+    async def increase_user_balance(self, user_id: int, amount: int) -> None:
+        """Atomically adds :amount to user balance without reading the row first
+
+        Args:
+            user_id (int): owner of finance row
+            amount (int): amount to add
+        """
+        stmt = (
+            update(Finance)
+            .filter_by(user_id=user_id)
+            .values(balance=Finance.balance + amount, version=Finance.version + 1)
+        )
+        await self._session.execute(stmt)
         await self._session.flush()
 
     async def add_user_withdrawal(self, user_id: int, data: dict[str, Any]) -> None:
@@ -66,3 +266,115 @@ class FinanceRepository(GenericSqlRepository[Finance]):
 
         user_finance.withdrawals.append(Withdrawal(**data))
         await self._session.flush()
+
+    async def list_pending_withdrawals(
+        self, after_id: int | None = None, limit: int = 100
+    ) -> Sequence[Row]:
+        """Returns page of pending withdrawals ordered by id
+
+        Args:
+            after_id (int | None): keyset, id of the last withdrawal of previous page
+            limit (int): page size
+
+        Returns:
+            Sequence[Row]: rows of (id, user_id, amount, wallet, created_at)
+        """
+        stmt = (
+            select(
+                Withdrawal.id,
+                Finance.user_id,
+                Withdrawal.amount,
+                Withdrawal.wallet,
+                Withdrawal.created_at,
+            )
+            .join(Finance)
+            .where(Withdrawal.status == TransactionStatus.PENDING)
+        )
+        if after_id is not None:
+            stmt = stmt.where(Withdrawal.id > after_id)
+        stmt = stmt.order_by(Withdrawal.id).limit(limit)
+        return (await self._session.execute(stmt)).all()
+
+    async def get_withdrawal_finance_ids(self, ids: Sequence[int]) -> list[int]:
+        """Returns finance ids of withdrawals with :ids"""
+        if not ids:
+            return []
+        stmt = (
+            select(Withdrawal.finance_id)
+            .where(Withdrawal.id.in_(ids))
+            .distinct()
+            .order_by(Withdrawal.finance_id)
+        )
+        return list(await self._session.scalars(stmt))
+
+    async def lock_pending_withdrawals(self, ids: Sequence[int]) -> Sequence[Row]:
+        """Locks pending withdrawals with :ids together with their finance rows
+
+        Returns:
+            Sequence[Row]: rows of (id, finance_id, user_id, balance, amount, wallet)
+        """
+        stmt = (
+            select(
+                Withdrawal.id,
+                Withdrawal.finance_id,
+                Finance.user_id,
+                Finance.balance,
+                Withdrawal.amount,
+                Withdrawal.wallet,
+            )
+            .join(Finance)
+            .where(
+                Withdrawal.id.in_(ids),
+                Withdrawal.status == TransactionStatus.PENDING,
+            )
+            .order_by(Withdrawal.id)
+            .with_for_update()
+        )
+        return (await self._session.execute(stmt)).all()
+
+    async def complete_withdrawals(self, ids: Sequence[int]) -> int:
+        """Marks pending withdrawals with :ids completed in one statement
+
+        Returns:
+            int: number of completed withdrawals
+        """
+        stmt = (
+            update(Withdrawal)
+            .where(
+                Withdrawal.id.in_(ids),
+                Withdrawal.status == TransactionStatus.PENDING,
+            )
+            .values(status=TransactionStatus.COMPLETED)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        await self._session.flush()
+        return result.rowcount
+
+    async def decrease_balances(self, amounts: dict[int, int]) -> None:
+        """Subtracts amounts from balances in one statement
+
+        Args:
+            amounts (dict[int, int]): amount to subtract by finance id
+        """
+        if not amounts:
+            return
+        stmt = (
+            update(Finance)
+            .where(Finance.id.in_(amounts))
+            .values(
+                balance=Finance.balance - case(amounts, value=Finance.id),
+                version=Finance.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self._session.execute(stmt)
+        await self._session.flush()
+
+    async def get_pending_withdrawals_total(self) -> Row:
+        """Returns (count, amount) row of pending withdrawals"""
+        stmt = select(
+            func.count(Withdrawal.id).label("count"),
+            func.coalesce(func.sum(Withdrawal.amount), 0).label("amount"),
+        ).where(Withdrawal.status == TransactionStatus.PENDING)
+        return (await self._session.execute(stmt)).one()
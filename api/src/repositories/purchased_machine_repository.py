@@ -1,9 +1,186 @@
+from typing import Any, Sequence
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import bindparam, case, func, or_, select, update, Row
 
 from .base import GenericSqlRepository
-from database.models import PurchasedMachine
+from database.models import PurchasedMachine, Machine
 
 
 class PurchasedMachineRepository(GenericSqlRepository[PurchasedMachine]):
     def __init__(self, session: AsyncSession) -> None:
         super().__init__(session, PurchasedMachine)
+
+    async def list_accruing(
+        self, user_id: int, for_update: bool = False
+    ) -> Sequence[Row]:
+        """Returns (id, settled_time, income) rows of user machines
+        that accrue commissions continuously. Machines purchased before
+        LAZY_COMMISSION_ACCRUAL was enabled and not settled since accrue from
+        activation, idle ones get settled_time from start_accrual
+
+        Args:
+            user_id (int): owner of machines
+            for_update (bool): If True locks purchased_machine rows
+
+        Returns:
+            Sequence[Row]: rows with id, settled_time and machine income
+        """
+        settled_time = func.coalesce(
+            PurchasedMachine.settled_time, PurchasedMachine.activated_time
+        )
+        stmt = (
+            select(
+                PurchasedMachine.id,
+                settled_time.label("settled_time"),
+                Machine.income,
+            )
+            .join(Machine, Machine.id == PurchasedMachine.machine_id)
+            .where(PurchasedMachine.user_id == user_id, settled_time.is_not(None))
+            .order_by(PurchasedMachine.id)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=PurchasedMachine)
+        return (await self._session.execute(stmt)).all()
+
+    async def start_accrual(self, now: datetime) -> int:
+        """Sets settled_time of machines that never accrued continuously:
+        activated ones accrue since activation, idle ones since :now, so
+        periods collected or idle before LAZY_COMMISSION_ACCRUAL are not paid
+
+        Returns:
+            int: number of updated machines
+        """
+        stmt = (
+            update(PurchasedMachine)
+            .where(PurchasedMachine.settled_time.is_(None))
+            .values(
+                settled_time=func.coalesce(PurchasedMachine.activated_time, now),
+                version=PurchasedMachine.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        await self._session.flush()
+        return result.rowcount
+
+    async def update_settled_times(self, values: Sequence[dict[str, Any]]) -> None:
+        """Updates settled_time of many machines in one executemany statement
+
+        Args:
+            values (Sequence[dict[str, Any]]): dicts with id and settled_time keys
+        """
+        if not values:
+            return
+        table = PurchasedMachine.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("_id"))
+            .values(
+                settled_time=bindparam("_settled_time"),
+                version=table.c.version + 1,
+            )
+        )
+        await self._session.execute(
+            stmt,
+            [
+                {"_id": value["id"], "_settled_time": value["settled_time"]}
+                for value in values
+            ],
+        )
+        await self._session.flush()
+
+    async def list_with_income(
+        self, user_id: int, for_update: bool = False
+    ) -> Sequence[Row]:
+        """Returns (id, activated_time, income) rows of all user machines
+
+        Args:
+            user_id (int): owner of machines
+            for_update (bool): If True locks purchased_machine rows
+
+        Returns:
+            Sequence[Row]: rows with id, activated_time and machine income
+        """
+        stmt = (
+            select(PurchasedMachine.id, PurchasedMachine.activated_time, Machine.income)
+            .join(Machine, Machine.id == PurchasedMachine.machine_id)
+            .where(PurchasedMachine.user_id == user_id)
+            .order_by(PurchasedMachine.id)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=PurchasedMachine)
+        return (await self._session.execute(stmt)).all()
+
+    async def activate_all(self, user_id: int, activated_time: datetime) -> int:
+        """Activates all not activated machines of user in one statement
+
+        Returns:
+            int: number of activated machines
+        """
+        stmt = (
+            update(PurchasedMachine)
+            .where(
+                PurchasedMachine.user_id == user_id,
+                PurchasedMachine.activated_time.is_(None),
+            )
+            .values(activated_time=activated_time, version=PurchasedMachine.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        await self._session.flush()
+        return result.rowcount
+
+    async def deactivate_ready(self, user_id: int, ready_before: datetime) -> int:
+        """Resets activated_time of user machines activated before :ready_before
+
+        Returns:
+            int: number of deactivated machines
+        """
+        stmt = (
+            update(PurchasedMachine)
+            .where(
+                PurchasedMachine.user_id == user_id,
+                PurchasedMachine.activated_time <= ready_before,
+            )
+            .values(activated_time=None, version=PurchasedMachine.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        await self._session.flush()
+        return result.rowcount
+
+    async def get_owner_ids(self, ids: Sequence[int]) -> dict[int, int]:
+        """Returns mapping purchased_machine_id -> user_id for existing :ids"""
+        stmt = select(PurchasedMachine.id, PurchasedMachine.user_id).where(
+            PurchasedMachine.id.in_(ids)
+        )
+        return {
+            purchased_machine_id: user_id
+            for purchased_machine_id, user_id in await self._session.execute(stmt)
+        }
+
+    async def count_by_coin(self) -> Sequence[Row]:
+        """Returns (coin, purchased, active) rows, machines that accrue
+        commissions continuously are counted as active"""
+        stmt = (
+            select(
+                Machine.coin,
+                func.count(PurchasedMachine.id).label("purchased"),
+                func.sum(
+                    case(
+                        (
+                            or_(
+                                PurchasedMachine.activated_time.is_not(None),
+                                PurchasedMachine.settled_time.is_not(None),
+                            ),
+                            1,
+                        ),
+                        else_=0,
+                    )
+                ).label("active"),
+            )
+            .join(Machine, Machine.id == PurchasedMachine.machine_id)
+            .group_by(Machine.coin)
+        )
+        return (await self._session.execute(stmt)).all()
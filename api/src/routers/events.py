@@ -0,0 +1,41 @@
+import asyncio
+from typing import Annotated, AsyncIterator
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from config import settings
+from dependencies.auth import get_current_active_user
+from schemas.user import UserSchema
+from services.event_service import event_broker, format_sse
+
+
+router = APIRouter(tags=["Events"])
+
+
+async def _user_event_stream(request: Request, user_id: int) -> AsyncIterator[str]:
+    async with event_broker.subscribe(user_id) as queue:
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=settings.EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(message)
+
+
+@router.get(
+    "",
+    description="Server-Sent Events stream of balance, machine and withdrawal changes",
+    response_class=StreamingResponse,
+)
+async def stream_user_events(
+    request: Request,
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
+) -> StreamingResponse:
+    return StreamingResponse(
+        _user_event_stream(request, current_active_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
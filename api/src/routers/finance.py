@@ -3,9 +3,12 @@ from fastapi import APIRouter, Depends
 
 from database.db import DB, get_db
 from schemas.user import UserSchema
-from dependencies.auth import get_current_active_user
+from dependencies.auth import get_current_active_reader, get_current_active_user
+from dependencies.db import get_read_db
+from dependencies.idempotency import idempotent
 from services.finance_service import FinanceService
 from schemas.common import ResultSchema
+from utils.responses import ModelResponse
 from schemas.finance import (
     FinanceInfoSchema,
     DepositsSchema,
@@ -19,46 +22,47 @@ from schemas.finance import (
 router = APIRouter(tags=["Finance operations"])
 
 
-@router.get("")
+@router.get("", response_model=FinanceInfoSchema)
 async def get_user_finance_info(
     current_user: Annotated[UserSchema, Depends(get_current_active_user)],
     db: Annotated[DB, Depends(get_db)],
-) -> FinanceInfoSchema:
-    return await FinanceService(db).get_user_finance_info(current_user)
+) -> ModelResponse:
+    return ModelResponse(await FinanceService(db).get_user_finance_info(current_user))
 
 
-@router.get("/deposit")
+@router.get("/deposit", response_model=DepositsSchema)
 async def get_user_deposits(
-    current_user: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
-) -> DepositsSchema:
-    return await FinanceService(db).get_user_deposits(current_user)
+    current_user: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
+) -> ModelResponse:
+    return ModelResponse(await FinanceService(db).get_user_deposits(current_user))
 
 
-@router.get("/withdrawal")
+@router.get("/withdrawal", response_model=WithdrawalsSchema)
 async def get_user_withdrawals(
-    current_user: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
-) -> WithdrawalsSchema:
-    return await FinanceService(db).get_user_withdrawals(current_user)
+    current_user: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
+) -> ModelResponse:
+    return ModelResponse(await FinanceService(db).get_user_withdrawals(current_user))
 
 
-@router.get("/income")
+@router.get("/income", response_model=IncomesSchema)
 async def get_user_incomes(
-    current_user: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
-) -> IncomesSchema:
-    return await FinanceService(db).get_user_incomes(current_user)
+    current_user: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
+) -> ModelResponse:
+    return ModelResponse(await FinanceService(db).get_user_incomes(current_user))
 
 
-@router.post("/withdraw", status_code=201)
+@router.post("/withdraw", status_code=201, dependencies=[Depends(idempotent)])
 async def withdraw_funds(
     current_user: Annotated[UserSchema, Depends(get_current_active_user)],
     db: Annotated[DB, Depends(get_db)],
     withdraw_data: WithdrawInSchema,
 ) -> ResultSchema:
-    await FinanceService(db).withdraw_funds(current_user, withdraw_data.amount)
-    await db.commit()
+    await db.run_transaction(
+        FinanceService(db).withdraw_funds, current_user, withdraw_data.amount
+    )
     return ResultSchema(result="withdrawal was accepted")
 
 
@@ -68,6 +72,7 @@ async def change_wallet(
     db: Annotated[DB, Depends(get_db)],
     wallet_data: ChangeWalletSchema,
 ) -> ResultSchema:
-    await FinanceService(db).change_wallet(current_user, wallet_data.wallet)
-    await db.commit()
+    await db.run_transaction(
+        FinanceService(db).change_wallet, current_user, wallet_data.wallet
+    )
     return ResultSchema(result="wallet was changed")
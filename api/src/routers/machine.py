@@ -2,66 +2,137 @@ from typing import Annotated, Sequence
 from fastapi import APIRouter, Depends, Query
 from database.db import DB, get_db
 
-from dependencies.auth import get_current_active_user
+from dependencies.auth import get_current_active_reader, get_current_active_user
+from dependencies.db import get_read_db
+from dependencies.idempotency import idempotent
 from schemas.user import UserSchema
-from schemas.machine import MachineSchema, UserMachineSchema
+from schemas.machine import (
+    MachineSchema,
+    UserMachineSchema,
+    PendingCommissionsSchema,
+    MachineBatchResultSchema,
+)
 from schemas.common import ResultSchema
 from services.machine_service import MachineService
 from utils.enums import MachineCoin
+from utils.responses import ModelResponse
 
 
 router = APIRouter(tags=["Machine operations"])
 
 
-@router.get("")
+@router.get("", response_model=Sequence[MachineSchema])
 async def get_all_machines(
-    _: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
-) -> Sequence[MachineSchema]:
-    return await MachineService(db).get_all_machines()
+    _: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
+) -> ModelResponse:
+    return ModelResponse(await MachineService(db).get_all_machines())
 
 
-@router.get("/owned")
+@router.get("/owned", response_model=Sequence[UserMachineSchema])
 async def get_owned_machines(
-    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
-) -> Sequence[UserMachineSchema]:
-    return await MachineService(db).get_user_machines(current_active_user)
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
+) -> ModelResponse:
+    return ModelResponse(
+        await MachineService(db).get_user_machines(current_active_user)
+    )
 
 
-@router.post("/owned", description="Purchase COIN specific machine")
+@router.post(
+    "/owned",
+    description="Purchase COIN specific machine",
+    dependencies=[Depends(idempotent)],
+)
 async def create_purchased_machine(
     current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
     db: Annotated[DB, Depends(get_db)],
     machine_coin: Annotated[MachineCoin, Query()],
 ) -> ResultSchema:
-    await MachineService(db).purchase_machine(current_active_user, machine_coin)
-    await db.commit()
+    await db.run_transaction(
+        MachineService(db).purchase_machine, current_active_user, machine_coin
+    )
     return ResultSchema(result="machine was purchased")
 
 
+@router.get(
+    "/owned/commissions",
+    description="Commissions accrued since last settlement (lazy accrual mode)",
+)
+async def get_pending_commissions(
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
+    db: Annotated[DB, Depends(get_db)],
+) -> PendingCommissionsSchema:
+    return await MachineService(db).get_pending_commissions(current_active_user)
+
+
+@router.post(
+    "/owned/commissions",
+    description="Collect commissions of all owned machines (lazy accrual mode)",
+    dependencies=[Depends(idempotent)],
+)
+async def settle_commissions(
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
+    db: Annotated[DB, Depends(get_db)],
+) -> PendingCommissionsSchema:
+    settled = await db.run_transaction(
+        MachineService(db).settle_commissions, current_active_user
+    )
+    return settled
+
+
+@router.patch("/owned", description="Activate all owned machines")
+async def activate_all_purchased_machines(
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
+    db: Annotated[DB, Depends(get_db)],
+) -> Sequence[MachineBatchResultSchema]:
+    results = await db.run_transaction(
+        MachineService(db).activate_all_user_machines, current_active_user
+    )
+    return results
+
+
+@router.get(
+    "/owned/receive_commissions",
+    description="Receive commissions of all ready owned machines",
+    dependencies=[Depends(idempotent)],
+)
+async def receive_all_machines_commissions(
+    current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
+    db: Annotated[DB, Depends(get_db)],
+) -> Sequence[MachineBatchResultSchema]:
+    results = await db.run_transaction(
+        MachineService(db).receive_all_commissions, current_active_user
+    )
+    return results
+
+
 @router.patch("/owned/{purchased_machine_id}")
 async def activate_purchased_machine(
     current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
     db: Annotated[DB, Depends(get_db)],
     purchased_machine_id: int,
 ) -> ResultSchema:
-    await MachineService(db).activate_user_machine(
+    await db.run_transaction(
+        MachineService(db).activate_user_machine,
         current_active_user,
         purchased_machine_id,
     )
-    await db.commit()
     return ResultSchema(result="machine was activated")
 
 
-@router.get("/owned/{purchased_machine_id}/receive_commissions")
+@router.get(
+    "/owned/{purchased_machine_id}/receive_commissions",
+    dependencies=[Depends(idempotent)],
+)
 async def receive_machine_commissions(
     current_active_user: Annotated[UserSchema, Depends(get_current_active_user)],
     db: Annotated[DB, Depends(get_db)],
     purchased_machine_id: int,
 ) -> ResultSchema:
-    await MachineService(db).receive_commissions(
-        current_active_user, purchased_machine_id
+    await db.run_transaction(
+        MachineService(db).receive_commissions,
+        current_active_user,
+        purchased_machine_id,
     )
-    await db.commit()
     return ResultSchema(result="commissions received")
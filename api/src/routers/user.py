@@ -4,18 +4,24 @@ from fastapi import APIRouter, Depends, Query
 from database.db import DB, get_db
 from schemas.user import UserSchema, UserInfoSchema, ChangePasswordSchema, Referral
 from schemas.common import ResultSchema
-from dependencies.auth import get_current_active_user, get_current_user
+from dependencies.auth import (
+    get_current_active_reader,
+    get_current_active_user,
+    get_current_user,
+)
+from dependencies.db import get_read_db
 from services.user_service import UserService
+from utils.responses import ModelResponse
 
 
 router = APIRouter(tags=["User operations"])
 
 
-@router.get("")
+@router.get("", response_model=UserInfoSchema)
 async def get_user_info(
     current_user: Annotated[UserSchema, Depends(get_current_user)],
-) -> UserInfoSchema:
-    return UserInfoSchema.model_validate(current_user)
+) -> ModelResponse:
+    return ModelResponse(UserInfoSchema.model_validate(current_user))
 
 
 @router.post("/change_password")
@@ -35,8 +41,8 @@ async def change_password(
 
 @router.get("/referrals", response_model=list[Referral])
 async def get_referrals(
-    current_user: Annotated[UserSchema, Depends(get_current_active_user)],
-    db: Annotated[DB, Depends(get_db)],
+    current_user: Annotated[UserSchema, Depends(get_current_active_reader)],
+    db: Annotated[DB, Depends(get_read_db)],
     level: Annotated[int, Query(ge=1, le=5)] = 1,
-) -> list[Referral]:
-    return await UserService(db).get_referrals(current_user, level=level)
+) -> ModelResponse:
+    return ModelResponse(await UserService(db).get_referrals(current_user, level=level))
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ConfigDict
+from functools import cache
+from typing import TypeVar
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 
 
 class Base(BaseModel):
@@ -9,3 +11,12 @@ class Base(BaseModel):
         extra="ignore",
         validate_assignment=True,
     )
+
+
+M = TypeVar("M", bound=BaseModel)
+
+
+@cache
+def list_adapter(schema: type[M]) -> TypeAdapter[list[M]]:
+    """Cached adapter that validates list of :schema in one pydantic-core call"""
+    return TypeAdapter(list[schema])
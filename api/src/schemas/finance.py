@@ -48,3 +48,10 @@ class WithdrawInSchema(Base):
 
 class ChangeWalletSchema(Base):
     wallet: str = Field(min_length=16, max_length=516)
+
+
+class PayoutSchema(Base):
+    withdrawal_id: int
+    user_id: int
+    wallet: str
+    amount: int
@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from .base import Base
+from utils.enums import MachineBatchResult
 
 
 class MachineSchema(Base):
@@ -14,4 +15,21 @@ class MachineSchema(Base):
 class UserMachineSchema(Base):
     id: int
     activated_time: datetime | None
+    settled_time: datetime | None = None
     machine: MachineSchema
+
+
+class MachineCommissionSchema(Base):
+    purchased_machine_id: int
+    amount: int
+
+
+class PendingCommissionsSchema(Base):
+    total: int
+    machines: list[MachineCommissionSchema]
+
+
+class MachineBatchResultSchema(Base):
+    purchased_machine_id: int
+    result: MachineBatchResult
+    amount: int = 0
@@ -1,5 +1,4 @@
-from typing import Any
-from fastapi_mail import FastMail, ConnectionConfig, MessageSchema, MessageType
+from typing import TYPE_CHECKING, Any
 from pathlib import Path
 from schemas.user import UserSchema
 
@@ -8,21 +7,35 @@ from schemas.email import EmailVerificationSchema, EmailResetPasswordSchema
 from utils.validation_errors import AppError
 from services.redis_service import RedisService
 
+if TYPE_CHECKING:
+    from fastapi_mail import FastMail
+
 
 class EmailService:
-    _sender = FastMail(
-        ConnectionConfig(
-            MAIL_USERNAME=settings.MAIL_USERNAME,
-            MAIL_PASSWORD=settings.MAIL_PASSWORD,
-            MAIL_FROM=settings.MAIL_FROM,
-            MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
-            MAIL_PORT=settings.MAIL_PORT,
-            MAIL_SERVER=settings.MAIL_SERVER,
-            MAIL_STARTTLS=settings.MAIL_STARTTLS,
-            MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-            TEMPLATE_FOLDER=Path(__file__).parent.parent / "templates" / "email",
-        )
-    )
+    _sender: "FastMail | None" = None
+
+    @classmethod
+    def _get_sender(cls) -> "FastMail":
+        # fastapi-mail is imported and configured on the first sent email
+        if cls._sender is None:
+            from fastapi_mail import FastMail, ConnectionConfig
+
+            cls._sender = FastMail(
+                ConnectionConfig(
+                    MAIL_USERNAME=settings.MAIL_USERNAME,
+                    MAIL_PASSWORD=settings.MAIL_PASSWORD,
+                    MAIL_FROM=settings.MAIL_FROM,
+                    MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
+                    MAIL_PORT=settings.MAIL_PORT,
+                    MAIL_SERVER=settings.MAIL_SERVER,
+                    MAIL_STARTTLS=settings.MAIL_STARTTLS,
+                    MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
+                    TEMPLATE_FOLDER=Path(__file__).parent.parent
+                    / "templates"
+                    / "email",
+                )
+            )
+        return cls._sender
 
     @classmethod
     async def send_html_email(
@@ -32,13 +45,15 @@ class EmailService:
         template_body: dict[str, Any],
         template_name,
     ) -> None:
+        from fastapi_mail import MessageSchema, MessageType
+
         message = MessageSchema(
             subject=subject,
             recipients=recipients,
             template_body=template_body,
             subtype=MessageType.html,
         )
-        await cls._sender.send_message(message, template_name=template_name)
+        await cls._get_sender().send_message(message, template_name=template_name)
 
     @classmethod
     async def send_raw_email(cls) -> None:
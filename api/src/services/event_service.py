@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+
+from config import settings
+from services.redis_service import RedisService
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroker:
+    """Multiplexes event streams of all connected users of a worker
+    over one redis pubsub connection"""
+
+    def __init__(self) -> None:
+        self._pubsub: PubSub | None = None
+        self._reader: asyncio.Task | None = None
+        self._queues: dict[int, set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        self._pubsub = RedisService.user_events_pubsub()
+        self._reader = asyncio.create_task(self._read())
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        self._queues.clear()
+
+    @staticmethod
+    def _channel(user_id: int) -> str:
+        return f"{RedisService.USER_EVENTS_CHANNEL_PREFIX}{user_id}"
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Yields queue that receives events published for user with :user_id"""
+        if self._pubsub is None:
+            raise ConnectionError("Event broker had not be started")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        queues = self._queues.setdefault(user_id, set())
+        if not queues:
+            await self._pubsub.subscribe(self._channel(user_id))
+        queues.add(queue)
+        try:
+            yield queue
+        finally:
+            queues.discard(queue)
+            if not queues:
+                self._queues.pop(user_id, None)
+                await self._pubsub.unsubscribe(self._channel(user_id))
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                message = await self._get_message()
+            except (RedisError, ConnectionError):
+                logger.exception("Reading user events failed, resubscribing")
+                await asyncio.sleep(1)
+                while not await self._resubscribe():
+                    await asyncio.sleep(1)
+                continue
+            if message is None:
+                continue
+            user_id = int(
+                message["channel"].removeprefix(RedisService.USER_EVENTS_CHANNEL_PREFIX)
+            )
+            for queue in self._queues.get(user_id, ()):
+                if not queue.full():  # slow clients lose events instead of blocking
+                    queue.put_nowait(json.loads(message["data"]))
+
+    async def _get_message(self) -> dict[str, Any] | None:
+        assert self._pubsub is not None
+        if not self._pubsub.subscribed:
+            await asyncio.sleep(1)
+            return None
+        return await self._pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=1.0
+        )
+
+    async def _resubscribe(self) -> bool:
+        """Replaces broken pubsub connection with new one subscribed to
+        channels of all connected users
+
+        Returns:
+            bool: False if subscribing failed
+        """
+        pubsub, self._pubsub = self._pubsub, RedisService.user_events_pubsub()
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except (RedisError, ConnectionError):
+                pass
+        channels = [self._channel(user_id) for user_id in self._queues]
+        if not channels:
+            return True
+        try:
+            await self._pubsub.subscribe(*channels)
+        except (RedisError, ConnectionError):
+            logger.warning("Resubscribing to %s user channels failed", len(channels))
+            return False
+        return True
+
+
+event_broker = EventBroker()
+
+
+def format_sse(message: dict[str, Any]) -> str:
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
@@ -1,15 +1,23 @@
+from typing import Sequence
 from schemas.user import UserSchema
 from database.db import DB
 
+from schemas.base import list_adapter
 from schemas.finance import (
+    DepositSchema,
     DepositsSchema,
     FinanceInfoSchema,
+    WithdrawalSchema,
     WithdrawalsSchema,
+    IncomeSchema,
     IncomesSchema,
+    PayoutSchema,
 )
 from utils.validation_errors import AppError
-from utils.enums import TransactionStatus
+from utils.enums import DailyStat, TransactionStatus, UserEvent
 from services.redis_service import RedisService
+from services.machine_service import MachineService
+from config import settings
 
 
 class FinanceService:
@@ -19,22 +27,34 @@ class FinanceService:
         self.db = db
 
     async def get_user_finance_info(self, user: UserSchema) -> FinanceInfoSchema:
-        db_finance = await self.db.finance.get_user_finance(user.id)
+        """Returns user finance, balance and affiliate income include
+        rewards that are not merged into finance row yet"""
+        db_finance = await self.db.finance.get_user_finance_totals(user.id)
         if db_finance is None:
             raise AppError.COULD_NOT_GET_FINANCE
         return FinanceInfoSchema.model_validate(db_finance)
 
-    async def get_user_deposits(self, user: UserSchema):
-        db_deposits = await self.db.finance.get_user_deposits(user.id)
-        return DepositsSchema.model_validate({"deposits": db_deposits})
+    async def get_user_deposits(self, user: UserSchema) -> DepositsSchema:
+        rows = await self.db.finance.get_user_deposits(
+            user.id, columns=DepositSchema.model_fields
+        )
+        return DepositsSchema(
+            deposits=list_adapter(DepositSchema).validate_python(rows)
+        )
 
-    async def get_user_withdrawals(self, user: UserSchema):
-        db_withdrawals = await self.db.finance.get_user_withdrawals(user.id)
-        return WithdrawalsSchema.model_validate({"withdrawals": db_withdrawals})
+    async def get_user_withdrawals(self, user: UserSchema) -> WithdrawalsSchema:
+        rows = await self.db.finance.get_user_withdrawals(
+            user.id, columns=WithdrawalSchema.model_fields
+        )
+        return WithdrawalsSchema(
+            withdrawals=list_adapter(WithdrawalSchema).validate_python(rows)
+        )
 
-    async def get_user_incomes(self, user: UserSchema):
-        db_incomes = await self.db.finance.get_user_incomes(user.id)
-        return IncomesSchema.model_validate({"incomes": db_incomes})
+    async def get_user_incomes(self, user: UserSchema) -> IncomesSchema:
+        rows = await self.db.finance.get_user_incomes(
+            user.id, columns=IncomeSchema.model_fields
+        )
+        return IncomesSchema(incomes=list_adapter(IncomeSchema).validate_python(rows))
 
     async def withdraw_funds(self, user: UserSchema, amount: int) -> None:
         """Represents withdraw logic. Creates withdrawal record in database
@@ -48,6 +68,9 @@ class FinanceService:
             AppError.NO_WALLET: raises if user has unfilled wallet address
             AppError.WITHDRAWAL_LOCK_EXISTS: raises if withdrawal lock exists in redis db
         """
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            await MachineService(self.db).settle_commissions(user)
+
         user_finance = await self.get_user_finance_info(user)
         if user_finance.balance < amount:
             raise AppError.LOW_BALANCE
@@ -68,6 +91,74 @@ class FinanceService:
             },
         )
         await RedisService.save_withdrawal_lock(user.username)
+        self.db.on_commit(
+            RedisService.publish_user_event,
+            user.id,
+            UserEvent.WITHDRAWAL,
+            {"status": TransactionStatus.PENDING.value, "amount": amount},
+        )
+        self.db.on_commit(
+            RedisService.increment_daily_stats, {DailyStat.WITHDRAWALS_REQUESTED: 1}
+        )
+
+    async def approve_withdrawals(self, ids: Sequence[int]) -> list[PayoutSchema]:
+        """Completes pending withdrawals with :ids and deducts their amounts from
+        balances in the same transaction. Withdrawals that are not pending anymore
+        or exceed the remaining balance are skipped
+
+        Args:
+            ids (Sequence[int]): ids of withdrawals to approve
+
+        Returns:
+            list[PayoutSchema]: payouts of approved withdrawals
+        """
+        # balances are checked against finance rows, so pending deltas go there
+        # first, then all rows are locked in id order before withdrawals
+        finance_ids = await self.db.finance.get_withdrawal_finance_ids(ids)
+        await self.db.merge_finance_deltas(finance_ids)
+        await self.db.finance.lock_many(finance_ids)
+        rows = await self.db.finance.lock_pending_withdrawals(ids)
+        balances: dict[int, int] = {}
+        deductions: dict[int, int] = {}
+        payouts: list[PayoutSchema] = []
+        for row in rows:
+            balance = balances.setdefault(row.finance_id, row.balance)
+            if row.amount > balance:
+                continue
+            balances[row.finance_id] = balance - row.amount
+            deductions[row.finance_id] = deductions.get(row.finance_id, 0) + row.amount
+            payouts.append(
+                PayoutSchema(
+                    withdrawal_id=row.id,
+                    user_id=row.user_id,
+                    wallet=row.wallet,
+                    amount=row.amount,
+                )
+            )
+        if not payouts:
+            return payouts
+
+        await self.db.finance.complete_withdrawals(
+            [payout.withdrawal_id for payout in payouts]
+        )
+        await self.db.finance.decrease_balances(deductions)
+        for payout in payouts:
+            self.db.on_commit(
+                RedisService.publish_user_event,
+                payout.user_id,
+                UserEvent.WITHDRAWAL,
+                {"status": TransactionStatus.COMPLETED.value, "amount": payout.amount},
+            )
+        self.db.on_commit(
+            RedisService.increment_daily_stats,
+            {
+                DailyStat.WITHDRAWALS_APPROVED: len(payouts),
+                DailyStat.WITHDRAWALS_APPROVED_AMOUNT: sum(
+                    payout.amount for payout in payouts
+                ),
+            },
+        )
+        return payouts
 
     async def change_wallet(self, user: UserSchema, wallet: str) -> None:
         """Changes wallet address in fanance table for :user
@@ -75,10 +166,12 @@ class FinanceService:
         Args:
             user (UserSchema): obj of UserSchema that represents user
             wallet (str): string that represents new wallet address
+
+        Raises:
+            AppError.COULD_NOT_GET_FINANCE: raises if user has no finance row
         """
-        user_finance = await self.get_user_finance_info(user)
-        user_finance.wallet = wallet
-        await self.db.finance.update(
-            id=user_finance.id,
-            data=user_finance.model_dump(),
+        updated = await self.db.finance.update_where(
+            {"user_id": user.id}, {"wallet": wallet}
         )
+        if not updated:
+            raise AppError.COULD_NOT_GET_FINANCE
@@ -2,14 +2,33 @@ from typing import Sequence
 from datetime import datetime, timedelta
 
 from database.db import DB
-from schemas.machine import MachineSchema, UserMachineSchema
+from schemas.base import list_adapter
+from schemas.machine import (
+    MachineSchema,
+    UserMachineSchema,
+    MachineCommissionSchema,
+    PendingCommissionsSchema,
+    MachineBatchResultSchema,
+)
 from schemas.user import UserSchema
 from schemas.finance import FinanceInfoSchema
 from utils.validation_errors import AppError
 from utils.enums import MachineCoin
 from config import settings
-from utils.enums import IncomeType, TransactionStatus
+from utils.enums import (
+    DailyStat,
+    IncomeType,
+    TransactionStatus,
+    MachineBatchResult,
+    UserEvent,
+)
 from services.user_service import UserService
+from services.redis_service import RedisService
+from utils.commissions import (
+    COMMISSION_PERIOD,
+    count_commission_periods,
+    advance_settled_time,
+)
 
 
 class MachineService:
@@ -17,30 +36,35 @@ class MachineService:
         self.db = db
 
     async def get_user_machines(self, user: UserSchema) -> Sequence[UserMachineSchema]:
-        db_purchased_machines = await self.db.machines.purchased.list(
-            eager=["machine"], user_id=user.id
+        machines = {machine.id: machine for machine in await self.get_all_machines()}
+        rows = await self.db.machines.purchased.list_rows(
+            ("id", "activated_time", "settled_time", "machine_id"), user_id=user.id
+        )
+        return list_adapter(UserMachineSchema).validate_python(
+            [{**row, "machine": machines[row["machine_id"]]} for row in rows]
         )
-        return [
-            UserMachineSchema.model_validate(machine)
-            for machine in db_purchased_machines
-        ]
 
     async def get_all_machines(self) -> Sequence[MachineSchema]:
-        db_machines = await self.db.machines.list()
-        return [MachineSchema.model_validate(db_machine) for db_machine in db_machines]
+        rows = await self.db.replica.machines.list_rows(MachineSchema.model_fields)
+        return list_adapter(MachineSchema).validate_python(rows)
 
     async def activate_user_machine(
         self, user: UserSchema, purchased_machine_id: int
     ) -> None:
-        is_owner = await self.db.machines.purchased.is_exists(
-            user_id=user.id, id=purchased_machine_id
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            raise AppError.COMMISSIONS_ACCRUE_CONTINUOUSLY
+
+        activated_time = datetime.now()
+        # ownership is checked by the update itself
+        updated = await self.db.machines.purchased.update_where(
+            {"user_id": user.id, "id": purchased_machine_id},
+            {"activated_time": activated_time},
         )
-        if not is_owner:
+        if not updated:
             raise AppError.MACHINE_NOT_OWNED
-
-        await self.db.machines.purchased.update(
-            id=purchased_machine_id,
-            data={"activated_time": datetime.now()},
+        self.db.on_commit(
+            RedisService.save_machines_ready_time,
+            {purchased_machine_id: activated_time + COMMISSION_PERIOD},
         )
 
     async def get_machine_by_coin(self, machine_coin: MachineCoin) -> MachineSchema:
@@ -62,37 +86,75 @@ class MachineService:
             AppError.MACHINE_ALREADY_PURCHASED: raises if machine with :machine_coin already purchased
             AppError.COULD_NOT_GET_FINANCE: raises if couldn't get user finance object
             AppError.INSUFFICIENT_BALANCE: raises if user's balance is too low
+            StaleVersionError: raises if finance row changed concurrently
+                with OPTIMISTIC_LOCKING, retried by DB.run_transaction
         """
+        # pending rewards are merged before this transaction locks the finance
+        # row, settle_commissions below locks it too
+        merged_finance = await self.db.merge_user_deltas(user.id)
+        if merged_finance is None:
+            raise AppError.COULD_NOT_GET_FINANCE
         desired_machine = await self.get_machine_by_coin(machine_coin)
+        settled_total = 0
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            settled_total = (await self.settle_commissions(user)).total
 
-        already_purchased = await self.db.machines.purchased.is_exists(
+        already_purchased = await self.db.machines.purchased.exists(
             user_id=user.id,
             machine_id=desired_machine.id,
         )
         if already_purchased:
             raise AppError.MACHINE_ALREADY_PURCHASED
 
-        db_user_finance = await self.db.finance.get_by_filters(
-            user_id=user.id, for_update=True
-        )
-        if db_user_finance is None:
-            raise AppError.COULD_NOT_GET_FINANCE
+        if settings.OPTIMISTIC_LOCKING and not settled_total:
+            # snapshot of this transaction can predate the merge, so the row
+            # committed by it is used and the versioned update below catches
+            # any later change
+            db_user_finance = merged_finance
+        else:
+            # settled commissions already hold the row lock
+            db_user_finance = await self.db.finance.get_by_filters(
+                user_id=user.id, for_update=True
+            )
+            if db_user_finance is None:
+                raise AppError.COULD_NOT_GET_FINANCE
         user_finance = FinanceInfoSchema.model_validate(db_user_finance)
+        # with optimistic locking the balance is written only if the row was not
+        # changed since it was read, otherwise the transaction is run again
+        finance_version = (
+            db_user_finance.version if settings.OPTIMISTIC_LOCKING else None
+        )
 
         if user_finance.balance < desired_machine.price:
             raise AppError.INSUFFICIENT_BALANCE
 
-        await self.db.machines.purchased.add(
-            {"user_id": user.id, "machine_id": desired_machine.id}
-        )
+        purchased_machine_data = {"user_id": user.id, "machine_id": desired_machine.id}
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            purchased_machine_data["settled_time"] = datetime.now()
+        purchased_machine = await self.db.machines.purchased.add(purchased_machine_data)
+        if purchased_machine.settled_time is not None:
+            self.db.on_commit(
+                RedisService.save_machines_ready_time,
+                {
+                    purchased_machine.id: purchased_machine.settled_time
+                    + COMMISSION_PERIOD
+                },
+            )
         user_finance.balance -= desired_machine.price
-        await self.db.finance.update(user_finance.id, user_finance.model_dump())
+        await self.db.finance.update(
+            user_finance.id, user_finance.model_dump(), version=finance_version
+        )
+        self._publish_balance_change(user.id, -desired_machine.price)
+        self.db.on_commit(
+            RedisService.increment_daily_stats, {DailyStat.MACHINES_PURCHASED: 1}
+        )
         await self.add_referral_rewards_to_masters(user, desired_machine.price)
 
     async def add_referral_rewards_to_masters(
         self, user: UserSchema, machine_price: int
     ) -> None:
-        """Updates balances of user masters and creates income record for rewards
+        """Buffers rewards of user masters as finance deltas, so masters' finance
+        rows are not locked by purchases, and creates income records for rewards
 
         Args:
             user (UserSchema): User for whose masters it's needed to add rewards
@@ -101,32 +163,45 @@ class MachineService:
         Raises:
             AppError.COULD_GET_MASTER_FINANCE: Raises if couldn't get master finance record
         """
-        master = await UserService(self.db).get_master(user)
-        for reward_percent in settings.REFERRAL_SYSTEM:
-            if not master:  # while user has master
-                return
-
-            db_master_finance = await self.db.finance.get_user_finance(master.id)
-            if db_master_finance is None:
-                raise AppError.COULD_GET_MASTER_FINANCE
-            master_finance = FinanceInfoSchema.model_validate(db_master_finance)
-            affiliate_income = int(machine_price * reward_percent)
-
-            # updating master balance and creation income record
-            master_finance.balance += affiliate_income
-            master_finance.affiliate_income += affiliate_income
-            await self.db.finance.update(master_finance.id, master_finance.model_dump())
-            await self.db.finance.add_user_income(
-                master.id,
-                data={
+        upline = await UserService(self.db).get_upline(user.id)
+        rewards = [
+            (master_id, int(machine_price * reward_percent))
+            for master_id, reward_percent in zip(upline, settings.REFERRAL_SYSTEM)
+        ]
+        if not rewards:
+            return
+        finance_ids = await self.db.finance.get_finance_ids(upline)
+        if any(master_id not in finance_ids for master_id, _ in rewards):
+            raise AppError.COULD_GET_MASTER_FINANCE
+
+        # deltas first: income inserts take shared locks on finance rows
+        await self.db.finance.add_deltas(
+            [
+                {
+                    "finance_id": finance_ids[master_id],
+                    "balance": affiliate_income,
+                    "affiliate_income": affiliate_income,
+                }
+                for master_id, affiliate_income in rewards
+            ]
+        )
+        await self.db.finance.add_incomes(
+            [
+                {
+                    "finance_id": finance_ids[master_id],
                     "type": IncomeType.AFFILIATE,
                     "status": TransactionStatus.COMPLETED,
                     "amount": affiliate_income,
-                },
-            )
-
-            # getting master of higher level
-            master = await UserService(self.db).get_master(user)
+                }
+                for master_id, affiliate_income in rewards
+            ]
+        )
+        for master_id, affiliate_income in rewards:
+            self._publish_balance_change(master_id, affiliate_income)
+        self.db.on_commit(
+            RedisService.increment_daily_stats,
+            {DailyStat.AFFILIATE_PAID: sum(amount for _, amount in rewards)},
+        )
 
     async def receive_commissions(
         self, user: UserSchema, purchased_machine_id: int
@@ -143,12 +218,23 @@ class MachineService:
             AppError.MACHINE_NOT_OWNED: raises if purchased_machine_id is incorrect
             AppError.MACHINE_NOT_ACTIVATED: raises if machine wasn't activated
             AppError.INVALID_REQUEST_TIME: raises if request received too early
+            AppError.COMMISSIONS_ACCRUE_CONTINUOUSLY: raises if lazy accrual is enabled
+            StaleVersionError: raises if machine changed concurrently
+                with OPTIMISTIC_LOCKING, retried by DB.run_transaction
         """
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            raise AppError.COMMISSIONS_ACCRUE_CONTINUOUSLY
+
+        # cheap rejection of early requests before taking a row lock
+        ready_time = await RedisService.get_machine_ready_time(purchased_machine_id)
+        if ready_time is not None and datetime.now() < ready_time:
+            raise AppError.INVALID_REQUEST_TIME
+
         db_purchased_machine = await self.db.machines.purchased.get_by_filters(
             user_id=user.id,
             id=purchased_machine_id,
             eager=["machine"],
-            for_update=True,
+            for_update=not settings.OPTIMISTIC_LOCKING,
         )
         if db_purchased_machine is None:
             raise AppError.MACHINE_NOT_OWNED
@@ -162,9 +248,17 @@ class MachineService:
         ):
             raise AppError.INVALID_REQUEST_TIME
 
-        user_finance = FinanceInfoSchema.model_validate(
-            await self.db.finance.get_by_filters(user_id=user.id)
+        # machine is reset first, so a concurrent collection of the same
+        # commissions fails version check before anything else is written
+        purchased_machine.activated_time = None
+        await self.db.machines.purchased.update(
+            purchased_machine.id,
+            purchased_machine.model_dump(exclude={"machine"}),
+            version=(
+                db_purchased_machine.version if settings.OPTIMISTIC_LOCKING else None
+            ),
         )
+
         await self.db.finance.add_user_income(
             user.id,
             data={
@@ -173,9 +267,219 @@ class MachineService:
                 "amount": purchased_machine.machine.income,
             },
         )
-        user_finance.balance += purchased_machine.machine.income
-        await self.db.finance.update(user_finance.id, user_finance.model_dump())
-        purchased_machine.activated_time = None
-        await self.db.machines.purchased.update(
-            purchased_machine.id, purchased_machine.model_dump(exclude={"machine"})
+        await self.db.finance.increase_user_balance(
+            user.id, purchased_machine.machine.income
+        )
+        self._publish_commissions(user.id, purchased_machine.machine.income)
+        self.db.on_commit(
+            RedisService.delete_machines_ready_time, [purchased_machine.id]
+        )
+
+    async def _calculate_commissions(
+        self, user: UserSchema, now: datetime, for_update: bool = False
+    ) -> tuple[PendingCommissionsSchema, list[dict]]:
+        rows = await self.db.machines.purchased.list_accruing(
+            user.id, for_update=for_update
+        )
+        machines: list[MachineCommissionSchema] = []
+        settled_times: list[dict] = []
+        for purchased_machine_id, settled_time, income in rows:
+            periods = count_commission_periods(settled_time, now)
+            machines.append(
+                MachineCommissionSchema(
+                    purchased_machine_id=purchased_machine_id,
+                    amount=periods * income,
+                )
+            )
+            if periods:
+                settled_times.append(
+                    {
+                        "id": purchased_machine_id,
+                        "settled_time": advance_settled_time(settled_time, periods),
+                    }
+                )
+        pending = PendingCommissionsSchema(
+            total=sum(machine.amount for machine in machines),
+            machines=machines,
+        )
+        return pending, settled_times
+
+    async def get_pending_commissions(
+        self, user: UserSchema
+    ) -> PendingCommissionsSchema:
+        """Derives commissions accrued since last settlement without writing anything
+
+        Args:
+            user (UserSchema): owner of machines
+
+        Returns:
+            PendingCommissionsSchema: total and per machine pending commissions
+        """
+        pending, _ = await self._calculate_commissions(user, datetime.now())
+        return pending
+
+    async def settle_commissions(self, user: UserSchema) -> PendingCommissionsSchema:
+        """Moves commissions accrued by all user machines to user balance.
+        Machines are updated in one batched statement, unfinished periods keep accruing
+
+        Args:
+            user (UserSchema): owner of machines
+
+        Returns:
+            PendingCommissionsSchema: settled commissions
+        """
+        pending, settled_times = await self._calculate_commissions(
+            user, datetime.now(), for_update=True
+        )
+        if not pending.total:
+            return pending
+
+        await self.db.machines.purchased.update_settled_times(settled_times)
+        self.db.on_commit(
+            RedisService.save_machines_ready_time,
+            {
+                machine["id"]: machine["settled_time"] + COMMISSION_PERIOD
+                for machine in settled_times
+            },
+        )
+        await self.db.finance.increase_user_balance(user.id, pending.total)
+        await self.db.finance.add_user_income(
+            user.id,
+            data={
+                "type": IncomeType.COMMISSION,
+                "status": TransactionStatus.COMPLETED,
+                "amount": pending.total,
+            },
+        )
+        self._publish_commissions(user.id, pending.total)
+        return pending
+
+    async def activate_all_user_machines(
+        self, user: UserSchema
+    ) -> list[MachineBatchResultSchema]:
+        """Activates every not activated machine of :user in one statement
+
+        Args:
+            user (UserSchema): owner of machines
+
+        Raises:
+            AppError.COMMISSIONS_ACCRUE_CONTINUOUSLY: raises if lazy accrual is enabled
+
+        Returns:
+            list[MachineBatchResultSchema]: per machine results
+        """
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            raise AppError.COMMISSIONS_ACCRUE_CONTINUOUSLY
+
+        rows = await self.db.machines.purchased.list_with_income(
+            user.id, for_update=True
+        )
+        now = datetime.now()
+        await self.db.machines.purchased.activate_all(user.id, now)
+        results = [
+            MachineBatchResultSchema(
+                purchased_machine_id=purchased_machine_id,
+                result=(
+                    MachineBatchResult.ACTIVATED
+                    if activated_time is None
+                    else MachineBatchResult.ALREADY_ACTIVATED
+                ),
+            )
+            for purchased_machine_id, activated_time, _ in rows
+        ]
+        self.db.on_commit(
+            RedisService.save_machines_ready_time,
+            {
+                result.purchased_machine_id: now + COMMISSION_PERIOD
+                for result in results
+                if result.result == MachineBatchResult.ACTIVATED
+            },
+        )
+        return results
+
+    async def receive_all_commissions(
+        self, user: UserSchema
+    ) -> list[MachineBatchResultSchema]:
+        """Collects commissions of every ready machine of :user in one transaction.
+        Machines are reset with one UPDATE, balance is increased once and
+        income records are created with one multi-row INSERT
+
+        Args:
+            user (UserSchema): owner of machines
+
+        Returns:
+            list[MachineBatchResultSchema]: per machine results
+        """
+        if settings.LAZY_COMMISSION_ACCRUAL:
+            settled = await self.settle_commissions(user)
+            return [
+                MachineBatchResultSchema(
+                    purchased_machine_id=machine.purchased_machine_id,
+                    result=(
+                        MachineBatchResult.COLLECTED
+                        if machine.amount
+                        else MachineBatchResult.TOO_EARLY
+                    ),
+                    amount=machine.amount,
+                )
+                for machine in settled.machines
+            ]
+
+        ready_before = datetime.now() - COMMISSION_PERIOD
+        rows = await self.db.machines.purchased.list_with_income(
+            user.id, for_update=True
+        )
+        results: list[MachineBatchResultSchema] = []
+        for purchased_machine_id, activated_time, income in rows:
+            if activated_time is None:
+                result = MachineBatchResult.NOT_ACTIVATED
+            elif activated_time > ready_before:
+                result = MachineBatchResult.TOO_EARLY
+            else:
+                result = MachineBatchResult.COLLECTED
+            results.append(
+                MachineBatchResultSchema(
+                    purchased_machine_id=purchased_machine_id,
+                    result=result,
+                    amount=income if result == MachineBatchResult.COLLECTED else 0,
+                )
+            )
+
+        collected = [r for r in results if r.result == MachineBatchResult.COLLECTED]
+        if not collected:
+            return results
+
+        collected_amount = sum(result.amount for result in collected)
+        await self.db.machines.purchased.deactivate_ready(user.id, ready_before)
+        await self.db.finance.increase_user_balance(user.id, collected_amount)
+        await self.db.finance.add_user_incomes(
+            user.id,
+            data=[
+                {
+                    "type": IncomeType.COMMISSION,
+                    "status": TransactionStatus.COMPLETED,
+                    "amount": result.amount,
+                }
+                for result in collected
+            ],
+        )
+        self.db.on_commit(
+            RedisService.delete_machines_ready_time,
+            [result.purchased_machine_id for result in collected],
+        )
+        self._publish_commissions(user.id, collected_amount)
+        return results
+
+    def _publish_balance_change(self, user_id: int, change: int) -> None:
+        self.db.on_commit(
+            RedisService.publish_user_event,
+            user_id,
+            UserEvent.BALANCE,
+            {"change": change},
+        )
+
+    def _publish_commissions(self, user_id: int, amount: int) -> None:
+        self._publish_balance_change(user_id, amount)
+        self.db.on_commit(
+            RedisService.increment_daily_stats, {DailyStat.COMMISSIONS_PAID: amount}
         )
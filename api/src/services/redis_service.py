@@ -1,8 +1,13 @@
-from typing import Any
-from datetime import timedelta
+from typing import Any, Iterable
+import json
+from redis.asyncio.client import PubSub
+from datetime import date, datetime, timedelta
 
 from repositories.redis_repository import redis_repo
+from repositories.cache import CACHE_STATS_KEY
+from utils.db_retry import TRANSACTION_STATS_KEY
 from config import settings
+from utils.enums import DailyStat, UserEvent
 
 
 class RedisService:
@@ -21,6 +26,21 @@ class RedisService:
     _WITHDRAWAL_LOCK_EXPIRE_HOURS: int = int(
         timedelta(hours=settings.WITHDRAWAL_LOCK_EXPIRE_HOURS).total_seconds()
     )
+    _IDEMPOTENCY_KEY_EXPIRE_MINUTES: int = int(
+        timedelta(minutes=settings.IDEMPOTENCY_KEY_EXPIRE_MINUTES).total_seconds()
+    )
+    _MACHINE_READY_KEY: str = "machine_ready"
+    _MACHINE_READY_NOTIFIED_KEY: str = "machine_ready_notified"
+    USER_EVENTS_CHANNEL_PREFIX: str = "user_events:"
+    _STATS_EXPIRE_DAYS: int = int(
+        timedelta(days=settings.STATS_DAYS_KEPT).total_seconds()
+    )
+    _STATS_GAUGES_KEY: str = "stats:gauges"
+    _READ_YOUR_WRITES_EXPIRE: int = settings.READ_YOUR_WRITES_SECONDS
+    _UPLINE_EXPIRE_DAYS: int = int(
+        timedelta(days=settings.UPLINE_EXPIRE_DAYS).total_seconds()
+    )
+    _UPLINE_GENERATION_KEY: str = "upline:generation"
     _repository = redis_repo
 
     @classmethod
@@ -31,6 +51,10 @@ class RedisService:
     async def close(cls) -> None:
         await cls._repository.close()
 
+    @classmethod
+    async def ping(cls) -> bool:
+        return await cls._repository.ping()
+
     @classmethod
     async def _get(cls, key: Any) -> Any | None:
         return await cls._repository.get(key)
@@ -109,3 +133,238 @@ class RedisService:
     async def get_withdrawal_lock(cls, username: str) -> int | None:
         key = f"withdrawal_lock:{username}"
         return await cls._get(key)
+
+    @classmethod
+    async def save_machines_ready_time(
+        cls, ready_times: dict[int, datetime]
+    ) -> int | Any:
+        """Indexes purchased machines by the time their commissions can be collected
+
+        Args:
+            ready_times (dict[int, datetime]): purchased_machine_id -> ready time
+        """
+        if not ready_times:
+            return 0
+        mapping = {
+            purchased_machine_id: ready_time.timestamp()
+            for purchased_machine_id, ready_time in ready_times.items()
+        }
+        return await cls._repository.zadd(cls._MACHINE_READY_KEY, mapping)
+
+    @classmethod
+    async def get_machine_ready_time(cls, purchased_machine_id: int) -> datetime | None:
+        score = await cls._repository.zscore(
+            cls._MACHINE_READY_KEY, purchased_machine_id
+        )
+        if score is None:
+            return None
+        return datetime.fromtimestamp(score)
+
+    @classmethod
+    async def delete_machines_ready_time(
+        cls, purchased_machine_ids: Iterable[int]
+    ) -> int | Any:
+        purchased_machine_ids = list(purchased_machine_ids)
+        if not purchased_machine_ids:
+            return 0
+        return await cls._repository.zrem(
+            cls._MACHINE_READY_KEY, *purchased_machine_ids
+        )
+
+    @classmethod
+    async def get_ready_machines(cls, ready_before: datetime, limit: int) -> list[int]:
+        """Returns ids of purchased machines ready before :ready_before
+
+        Args:
+            ready_before (datetime): upper bound for ready time
+            limit (int): max number of ids
+
+        Returns:
+            list[int]: purchased machine ids ordered by ready time
+        """
+        ids = await cls._repository.zrangebyscore(
+            cls._MACHINE_READY_KEY,
+            "-inf",
+            ready_before.timestamp(),
+            start=0,
+            num=limit,
+        )
+        return [int(purchased_machine_id) for purchased_machine_id in ids]
+
+    @classmethod
+    async def get_ready_machines_between(
+        cls, ready_after: datetime, ready_before: datetime
+    ) -> list[int]:
+        ids = await cls._repository.zrangebyscore(
+            cls._MACHINE_READY_KEY,
+            f"({ready_after.timestamp()}",
+            ready_before.timestamp(),
+        )
+        return [int(purchased_machine_id) for purchased_machine_id in ids]
+
+    @classmethod
+    async def get_machine_ready_notified_time(cls) -> datetime | None:
+        value = await cls._get(cls._MACHINE_READY_NOTIFIED_KEY)
+        if value is None:
+            return None
+        return datetime.fromtimestamp(float(value))
+
+    @classmethod
+    async def save_machine_ready_notified_time(cls, notified_time: datetime) -> bool:
+        return await cls._set(
+            cls._MACHINE_READY_NOTIFIED_KEY, notified_time.timestamp(), expire=None
+        )
+
+    @classmethod
+    async def publish_user_event(
+        cls, user_id: int, event: UserEvent, data: dict[str, Any] | None = None
+    ) -> int | Any:
+        """Publishes :event for all event streams of user with :user_id"""
+        message = json.dumps({"event": event.value, "data": data or {}})
+        return await cls._repository.publish(
+            f"{cls.USER_EVENTS_CHANNEL_PREFIX}{user_id}", message
+        )
+
+    @classmethod
+    def user_events_pubsub(cls) -> PubSub:
+        return cls._repository.pubsub()
+
+    @classmethod
+    async def claim_idempotency_key(cls, key: str, fingerprint: str) -> bool:
+        """Marks request with idempotency :key as in progress
+
+        Args:
+            key (str): idempotency key of request
+            fingerprint (str): hash of request query and body
+
+        Returns:
+            bool: True if key was claimed, False if it was already used
+        """
+        return bool(
+            await cls._repository.set(
+                f"idempotency:{key}",
+                json.dumps({"fingerprint": fingerprint}),
+                expire=cls._IDEMPOTENCY_KEY_EXPIRE_MINUTES,
+                nx=True,
+            )
+        )
+
+    @classmethod
+    async def get_idempotency_record(cls, key: str) -> dict[str, Any] | None:
+        """Returns fingerprint of request that claimed idempotency :key, with
+        status_code and body once its response is stored, or None if key is free"""
+        value = await cls._get(f"idempotency:{key}")
+        if value is None:
+            return None
+        return json.loads(value)
+
+    @classmethod
+    async def save_idempotent_response(
+        cls, key: str, fingerprint: str, status_code: int, body: str
+    ) -> bool:
+        return await cls._set(
+            f"idempotency:{key}",
+            json.dumps(
+                {"fingerprint": fingerprint, "status_code": status_code, "body": body}
+            ),
+            expire=cls._IDEMPOTENCY_KEY_EXPIRE_MINUTES,
+        )
+
+    @classmethod
+    async def release_idempotency_key(cls, key: str) -> bool:
+        return await cls._delete(f"idempotency:{key}")
+
+    @classmethod
+    async def increment_daily_stats(cls, values: dict[DailyStat, int]) -> None:
+        """Adds :values to today's dashboard counters"""
+        await cls._repository.hincrby_many(
+            f"stats:daily:{date.today()}",
+            {stat.value: amount for stat, amount in values.items()},
+            expire=cls._STATS_EXPIRE_DAYS,
+        )
+
+    @classmethod
+    async def get_daily_stats(cls, days: int) -> dict[date, dict[str, int]]:
+        """Returns dashboard counters of last :days days, today first"""
+        today = date.today()
+        stats = {}
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            values = await cls._repository.hgetall(f"stats:daily:{day}")
+            stats[day] = {key: int(value) for key, value in values.items()}
+        return stats
+
+    @classmethod
+    async def save_stats_gauges(cls, values: dict[str, int | str]) -> int | Any:
+        return await cls._repository.hset_many(cls._STATS_GAUGES_KEY, values)
+
+    @classmethod
+    async def get_stats_gauges(cls) -> dict[str, str]:
+        return await cls._repository.hgetall(cls._STATS_GAUGES_KEY)
+
+    @classmethod
+    async def save_recent_write(cls, user_id: int) -> bool:
+        """Marks that :user_id committed writes, their reads go to primary
+        for READ_YOUR_WRITES_SECONDS"""
+        return await cls._set(
+            f"recent_write:{user_id}", 1, expire=cls._READ_YOUR_WRITES_EXPIRE
+        )
+
+    @classmethod
+    async def recent_write_exists(cls, user_id: int) -> bool:
+        return bool(await cls._get(f"recent_write:{user_id}"))
+
+    @classmethod
+    async def get_cache_stats(cls) -> dict[str, dict[str, int]]:
+        """Returns repository cache hits and misses per table"""
+        stats: dict[str, dict[str, int]] = {}
+        for field, count in (await cls._repository.hgetall(CACHE_STATS_KEY)).items():
+            table, name = field.split(":", 1)
+            stats.setdefault(table, {"hits": 0, "misses": 0})[name] = int(count)
+        return stats
+
+    @classmethod
+    async def get_transaction_stats(cls) -> dict[str, int]:
+        """Returns counters of deadlocks, lock wait timeouts, version conflicts,
+        retried and failed (out of retries) transactions"""
+        stats = await cls._repository.hgetall(TRANSACTION_STATS_KEY)
+        return {name: int(count) for name, count in stats.items()}
+
+    @classmethod
+    async def save_upline(
+        cls, user_id: int, upline: list[int], generation: int
+    ) -> bool:
+        """Caches :upline of :user_id read from db after :generation was read"""
+        return await cls._set(
+            f"upline:{user_id}",
+            json.dumps({"generation": generation, "upline": upline}),
+            expire=cls._UPLINE_EXPIRE_DAYS,
+        )
+
+    @classmethod
+    async def get_upline(cls, user_id: int) -> tuple[list[int] | None, int]:
+        """Returns ids of :user_id masters, closest first, None if not cached
+        or cached before the last referral chain change, and current generation
+        of chains to save uplines read from db with"""
+        value, generation = await cls._repository.mget(
+            f"upline:{user_id}", cls._UPLINE_GENERATION_KEY
+        )
+        generation = int(generation or 0)
+        if value is None:
+            return None, generation
+        cached = json.loads(value)
+        if cached["generation"] != generation:
+            return None, generation
+        return cached["upline"], generation
+
+    @classmethod
+    async def delete_uplines(cls, user_ids: Iterable[int]) -> None:
+        """Drops cached uplines of :user_ids after their chains were changed.
+        Generation is incremented first, so uplines read from db before the
+        change and saved after this call are not used"""
+        await cls._repository.incr(cls._UPLINE_GENERATION_KEY)
+        keys = [f"upline:{user_id}" for user_id in user_ids]
+        for start in range(0, len(keys), settings.UPLINE_DELETE_BATCH_SIZE):
+            await cls._repository.unlink(
+                *keys[start : start + settings.UPLINE_DELETE_BATCH_SIZE]
+            )
@@ -7,6 +7,7 @@ from pydantic import ValidationError
 from ipaddress import IPv4Address
 
 from database.db import DB
+from schemas.base import list_adapter
 from schemas.user import (
     UserSchema,
     RegisterUserInSchema,
@@ -21,6 +22,8 @@ from utils.security import SecurityHasher, JWTAuthController
 from utils.validation_errors import AppError
 from utils.specific import gen_rand_alphanum_str
 from services.redis_service import RedisService
+from utils.enums import DailyStat
+from config import settings
 
 
 class UserService:
@@ -82,7 +85,7 @@ class UserService:
         tries = 10
         while tries > 0:
             code = gen_rand_alphanum_str(10)
-            if not await self.db.users.check_existance_by(affiliate_code=code):
+            if not await self.db.users.exists(affiliate_code=code):
                 return code
             tries -= 1
         raise AppError.GENERATING_AFFILIATE_CODE_FAILS
@@ -104,9 +107,9 @@ class UserService:
             UserRegisterOut: Outcome register pydantic schema
         """
         errors: list[TypedDict] = []
-        if await self.db.users.check_existance_by(email=register_data.email):
+        if await self.db.users.exists(email=register_data.email):
             errors.append(AppError.EMAIL_EXISTS)
-        if await self.db.users.check_existance_by(username=register_data.username):
+        if await self.db.users.exists(username=register_data.username):
             errors.append(AppError.USERNAME_EXISTS)
 
         master = await self.db.users.get_by_affiliate_code(register_data.affiliate_code)
@@ -129,8 +132,17 @@ class UserService:
         # Adding master_referral association (current user is a referral for master user)
         master_referral_record = MasterReferralSchema(master_id=master.id, referral_id=registered_user.id)  # type: ignore
         await self.db.master_referrals.add(master_referral_record.model_dump())
+        master_upline, generation = await self._get_upline(master.id)  # type: ignore
+        upline = [master.id, *master_upline]  # type: ignore
+        self.db.on_commit(
+            RedisService.save_upline,
+            registered_user.id,
+            upline[: len(settings.REFERRAL_SYSTEM)],
+            generation,
+        )
         # Adding finance row for current user
         await self.db.finance.add({"user_id": registered_user.id})
+        self.db.on_commit(RedisService.increment_daily_stats, {DailyStat.NEW_USERS: 1})
         return registered_user
 
     @staticmethod
@@ -145,8 +157,11 @@ class UserService:
         )
         if verification_code != saved_verification_code:
             raise AppError.INVALID_VERIFICATION_CODE
+        # only the flag is written, the rest of :user may be stale already
+        await self.db.users.update_where(
+            {"id": user.id, "is_active": False}, {"is_active": True}
+        )
         user.is_active = True
-        await self.db.users.update(user.id, user.model_dump())
 
     @staticmethod
     async def create_reset_password_token(user: UserSchema) -> str:
@@ -196,6 +211,37 @@ class UserService:
             return None
         return UserSchema.model_validate(db_master)
 
+    async def get_upline(self, user_id: int) -> list[int]:
+        """Returns ids of user masters, closest first, up to len(REFERRAL_SYSTEM).
+        Chain changes only by admin edits, so it is cached in redis"""
+        upline, _ = await self._get_upline(user_id)
+        return upline
+
+    async def _get_upline(self, user_id: int) -> tuple[list[int], int]:
+        upline, generation = await RedisService.get_upline(user_id)
+        if upline is None:
+            # read in a new transaction, the snapshot of this unit of work can
+            # predate a chain change committed after generation was read
+            async with DB() as db:
+                upline = await db.master_referrals.get_upline_ids(
+                    user_id, depth=len(settings.REFERRAL_SYSTEM)
+                )
+            await RedisService.save_upline(user_id, upline, generation)
+        return upline, generation
+
+    async def invalidate_upline(self, user_id: int) -> None:
+        """Drops cached uplines of :user_id and its referrals,
+        whose chains pass through :user_id"""
+        user_ids = [user_id]
+        for level in range(1, len(settings.REFERRAL_SYSTEM)):
+            referrals = await self.db.users.get_referrals(
+                user_id, level, columns=["id"]
+            )
+            user_ids.extend(referral["id"] for referral in referrals)
+        await RedisService.delete_uplines(user_ids)
+
     async def get_referrals(self, user: UserSchema, level: int) -> list[Referral]:
-        db_users = await self.db.users.get_referrals(user.id, level)
-        return [Referral.model_validate(db_user) for db_user in db_users]
+        rows = await self.db.users.get_referrals(
+            user.id, level, columns=Referral.model_fields
+        )
+        return list_adapter(Referral).validate_python(rows)
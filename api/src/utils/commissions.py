@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from config import settings
+
+
+COMMISSION_PERIOD = timedelta(hours=settings.COMMISSION_HOURS_DELTA)
+
+
+def count_commission_periods(settled_time: datetime, now: datetime) -> int:
+    """Counts full commission periods passed since :settled_time
+
+    Args:
+        settled_time (datetime): time commissions were settled last time
+        now (datetime): current time
+
+    Returns:
+        int: number of full periods, 0 if :now is earlier than :settled_time
+    """
+    if now <= settled_time:
+        return 0
+    return (now - settled_time) // COMMISSION_PERIOD
+
+
+def advance_settled_time(settled_time: datetime, periods: int) -> datetime:
+    """Moves :settled_time forward by :periods full commission periods,
+    so the unfinished period keeps accruing after settlement
+
+    Args:
+        settled_time (datetime): time commissions were settled last time
+        periods (int): number of settled periods
+
+    Returns:
+        datetime: new settled time
+    """
+    return settled_time + COMMISSION_PERIOD * periods
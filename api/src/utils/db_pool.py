@@ -0,0 +1,16 @@
+def per_worker_pool(
+    max_connections: int,
+    reserved_connections: int,
+    workers: int,
+    pool_size: int,
+    max_overflow: int,
+) -> tuple[int, int]:
+    """Shrinks :pool_size and :max_overflow of one worker, so that all workers
+    together never open more than :max_connections - :reserved_connections
+
+    Returns:
+        tuple[int, int]: pool_size and max_overflow for one worker
+    """
+    budget = max((max_connections - reserved_connections) // max(workers, 1), 1)
+    pool_size = min(pool_size, budget)
+    return pool_size, max(min(max_overflow, budget - pool_size), 0)
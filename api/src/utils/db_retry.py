@@ -0,0 +1,44 @@
+import random
+from typing import Callable
+
+
+# redis hash of retried and failed transaction counters by reason
+TRANSACTION_STATS_KEY = "stats:transactions"
+
+# MySQL errors after which InnoDB has rolled back the statement or the whole
+# transaction and running the transaction again can succeed
+RETRYABLE_MYSQL_ERRORS = {
+    1213: "deadlocks",  # ER_LOCK_DEADLOCK
+    1205: "lock_wait_timeouts",  # ER_LOCK_WAIT_TIMEOUT
+}
+
+
+class StaleVersionError(Exception):
+    """Compare-and-swap update found the row at another version than was read"""
+
+
+def mysql_error_code(error: BaseException) -> int | None:
+    """MySQL error code of DBAPI :error, wrapped by SQLAlchemy or not"""
+    error = getattr(error, "orig", None) or error
+    args = getattr(error, "args", ())
+    if args and isinstance(args[0], int):
+        return args[0]
+    return None
+
+
+def retry_reason(error: BaseException) -> str | None:
+    """Metric name of retryable :error, None if transaction must not be retried"""
+    if isinstance(error, StaleVersionError):
+        return "version_conflicts"
+    return RETRYABLE_MYSQL_ERRORS.get(mysql_error_code(error))
+
+
+def backoff_delay(
+    attempt: int,
+    base_seconds: float,
+    max_seconds: float,
+    rand: Callable[[], float] = random.random,
+) -> float:
+    """Full jitter exponential backoff: random delay in
+    [0, min(:max_seconds, :base_seconds * 2 ** :attempt)), :attempt starts at 0"""
+    return rand() * min(max_seconds, base_seconds * 2**attempt)
@@ -31,3 +31,32 @@ class MachineCoin(str, PrintableEnum):
     BTCD = "BTCD"
     PPC = "PPC"
     BCX = "BCX"
+
+
+@enum.unique
+class MachineBatchResult(str, PrintableEnum):
+    ACTIVATED = "activated"
+    ALREADY_ACTIVATED = "already activated"
+    COLLECTED = "collected"
+    NOT_ACTIVATED = "not activated"
+    TOO_EARLY = "too early"
+
+
+@enum.unique
+class UserEvent(str, PrintableEnum):
+    BALANCE = "balance"
+    MACHINE_READY = "machine_ready"
+    WITHDRAWAL = "withdrawal"
+
+
+@enum.unique
+class DailyStat(str, PrintableEnum):
+    NEW_USERS = "new_users"
+    MACHINES_PURCHASED = "machines_purchased"
+    COMMISSIONS_PAID = "commissions_paid"
+    AFFILIATE_PAID = "affiliate_paid"
+    DEPOSITS = "deposits"
+    DEPOSITS_AMOUNT = "deposits_amount"
+    WITHDRAWALS_REQUESTED = "withdrawals_requested"
+    WITHDRAWALS_APPROVED = "withdrawals_approved"
+    WITHDRAWALS_APPROVED_AMOUNT = "withdrawals_approved_amount"
@@ -1,9 +1,10 @@
 from fastapi.exceptions import RequestValidationError
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.encoders import jsonable_encoder
 
 from schemas.errors import ValidationErrorResponse, Error
+from dependencies.idempotency import IdempotentReplay
 
 
 async def validation_exception_handler(
@@ -23,3 +24,18 @@ async def validation_exception_handler(
         content=jsonable_encoder({"detail": error_res.detail}),
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
     )
+
+
+async def idempotent_replay_handler(
+    request: Request, exc: IdempotentReplay
+) -> Response:
+    """
+    Replay the stored response of the first request with the same idempotency key.
+    """
+
+    return Response(
+        content=exc.body,
+        status_code=exc.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
@@ -0,0 +1,448 @@
+"""Deterministic synthetic data for scale testing
+
+Generates users in referral trees, their finance rows, purchased machines and
+years of deposit, withdrawal and income history. The history is consistent:
+purchases are paid by deposits, commissions accrue every --commission-days,
+masters get affiliate incomes by REFERRAL_SYSTEM and finance totals are sums
+of the generated rows. Same options (--seed and --until included) on the same
+tables give the same rows, ids continue after existing rows.
+
+Rows are written with foreign key checks off, in multi-row INSERTs through
+repository add_many, or with --infile as TSV files loaded by
+LOAD DATA LOCAL INFILE (server must run with local_infile=ON).
+Machines are seeded first if missing.
+
+Run from api/src:
+    python -m utils.generate_data --users 50000 --branching 4 --depth 8 --seed 1
+"""
+
+import argparse
+import asyncio
+import enum
+import logging
+import random
+import tempfile
+import time as timer
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple, Sequence, TextIO
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from config import settings
+from database.db import engine
+from database.models import (
+    Base,
+    Deposit,
+    Finance,
+    Income,
+    Machine,
+    MasterReferral,
+    PurchasedMachine,
+    User,
+    Withdrawal,
+)
+from repositories.base import GenericSqlRepository
+from utils.enums import IncomeType, TransactionStatus
+from utils.initiate_data import initiate_machines
+from utils.security import SecurityHasher
+
+
+logger = logging.getLogger(__name__)
+
+DEPOSIT_PLATFORMS = ("bitcoin", "perfect money", "payeer", "advcash")
+# withdrawals requested in the last days before --until are still pending
+PENDING_WITHDRAWAL_DAYS = 3
+
+# models with generated ids, ids of each continue after its existing rows
+ID_MODELS: tuple[type[Base], ...] = (
+    User,
+    Finance,
+    PurchasedMachine,
+    Income,
+    Deposit,
+    Withdrawal,
+)
+
+
+class MachineRow(NamedTuple):
+    id: int
+    price: int
+    income: int
+
+
+@dataclass(frozen=True)
+class GeneratorOptions:
+    users: int = 10000
+    # referrals of one master are random in [1, branching]
+    branching: int = 4
+    # trees are at most depth levels deep, then a new tree is started
+    depth: int = 8
+    # machines of one user are random in [0, machines_per_user]
+    machines_per_user: int = 2
+    years: int = 2
+    commission_days: int = 7
+    deposits_per_year: int = 6
+    withdrawals_per_year: int = 4
+    seed: int = 0
+    until: date = field(default_factory=date.today)
+
+
+def generate_rows(
+    options: GeneratorOptions,
+    machines: Sequence[MachineRow],
+    start_ids: dict[type[Base], int],
+    password_hash: str,
+) -> Iterator[tuple[type[Base], dict[str, Any]]]:
+    """Yields (model, row) pairs, only random.Random(:options.seed) is used,
+    so rows depend on arguments only
+
+    Args:
+        options (GeneratorOptions): amounts and shape of generated data
+        machines (Sequence[MachineRow]): machines that users purchase
+        start_ids (dict[type[Base], int]): first id of every model of ID_MODELS
+        password_hash (str): password hash of all users
+
+    Yields:
+        tuple[type[Base], dict[str, Any]]: model and column values of a row
+    """
+    rng = random.Random(options.seed)
+    until = datetime.combine(options.until, time.min)
+    start = until - timedelta(days=365 * options.years)
+    span = (until - start).total_seconds()
+    commission_period = timedelta(days=options.commission_days)
+    next_ids = dict(start_ids)
+
+    def next_id(model: type[Base]) -> int:
+        next_ids[model] += 1
+        return next_ids[model] - 1
+
+    def moment_after(moment: datetime) -> datetime:
+        return moment + (until - moment) * rng.random()
+
+    def deposit(index: int, amount: int, created_at: datetime) -> dict[str, Any]:
+        balances[index] += amount
+        return {
+            "id": next_id(Deposit),
+            "finance_id": start_ids[Finance] + index,
+            "status": TransactionStatus.COMPLETED,
+            "amount": amount,
+            "platform": rng.choice(DEPOSIT_PLATFORMS),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    def income(
+        index: int, income_type: IncomeType, amount: int, created_at: datetime
+    ) -> dict[str, Any]:
+        balances[index] += amount
+        if income_type == IncomeType.AFFILIATE:
+            affiliate_incomes[index] += amount
+        else:
+            incomes[index] += amount
+        return {
+            "id": next_id(Income),
+            "finance_id": start_ids[Finance] + index,
+            "type": income_type,
+            "status": TransactionStatus.COMPLETED,
+            "amount": amount,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    masters: list[int | None] = []
+    levels: list[int] = []
+    # users with free referral slots, the oldest one gets the next referral
+    frontier: deque[list[int]] = deque()
+    balances: list[int] = []
+    incomes: list[int] = []
+    affiliate_incomes: list[int] = []
+    wallets: list[str] = []
+
+    for index in range(options.users):
+        while frontier and frontier[0][1] == 0:
+            frontier.popleft()
+        master = None
+        if frontier:
+            master = frontier[0][0]
+            frontier[0][1] -= 1
+        level = levels[master] + 1 if master is not None else 0
+        masters.append(master)
+        levels.append(level)
+        if level < options.depth:
+            frontier.append([index, rng.randint(1, options.branching)])
+        balances.append(0)
+        incomes.append(0)
+        affiliate_incomes.append(0)
+
+        user_id = start_ids[User] + index
+        finance_id = start_ids[Finance] + index
+        # users register in id order, spread over the whole history
+        created_at = start + timedelta(
+            seconds=span * (index + rng.random()) / options.users
+        )
+        yield User, {
+            "id": user_id,
+            "username": f"gen{user_id}",
+            "email": f"gen{user_id}@example.com",
+            "email_allowed": True,
+            "password_hash": password_hash,
+            "affiliate_code": f"G{user_id:09d}",
+            "is_admin": False,
+            "is_active": True,
+            "last_online": created_at,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        if master is not None:
+            yield MasterReferral, {
+                "master_id": start_ids[User] + master,
+                "referral_id": user_id,
+            }
+
+        purchases = rng.sample(
+            machines, min(rng.randint(0, options.machines_per_user), len(machines))
+        )
+        for machine in purchases:
+            purchased_at = moment_after(created_at)
+            # purchase is paid by a deposit of its price just before it
+            yield Deposit, deposit(
+                index, machine.price, purchased_at - timedelta(minutes=1)
+            )
+            balances[index] -= machine.price
+            yield PurchasedMachine, {
+                "id": next_id(PurchasedMachine),
+                "user_id": user_id,
+                "machine_id": machine.id,
+                "created_at": purchased_at,
+                "updated_at": purchased_at,
+            }
+            collected_at = purchased_at + commission_period
+            while collected_at < until:
+                yield Income, income(
+                    index, IncomeType.COMMISSION, machine.income, collected_at
+                )
+                collected_at += commission_period
+
+            upline_master = master
+            for reward_percent in settings.REFERRAL_SYSTEM:
+                if upline_master is None:
+                    break
+                reward = int(machine.price * reward_percent)
+                if reward:
+                    yield Income, income(
+                        upline_master, IncomeType.AFFILIATE, reward, purchased_at
+                    )
+                upline_master = masters[upline_master]
+
+        active_years = (until - created_at).days / 365
+        for _ in range(round(options.deposits_per_year * active_years * rng.random())):
+            yield Deposit, deposit(
+                index, rng.randint(1, 500) * 1000, moment_after(created_at)
+            )
+
+        wallet = f"T{rng.getrandbits(128):032x}"
+        withdrawals = round(options.withdrawals_per_year * active_years * rng.random())
+        for _ in range(withdrawals):
+            amount = int(balances[index] * rng.uniform(0.05, 0.3))
+            if not amount:
+                break
+            requested_at = moment_after(created_at)
+            status = (
+                TransactionStatus.PENDING
+                if until - requested_at < timedelta(days=PENDING_WITHDRAWAL_DAYS)
+                else TransactionStatus.COMPLETED
+            )
+            # balance is decreased when withdrawal is approved
+            if status == TransactionStatus.COMPLETED:
+                balances[index] -= amount
+            yield Withdrawal, {
+                "id": next_id(Withdrawal),
+                "finance_id": finance_id,
+                "status": status,
+                "amount": amount,
+                "wallet": wallet,
+                "created_at": requested_at,
+                "updated_at": requested_at,
+            }
+        wallets.append(wallet)
+
+    # masters get affiliate incomes from later users, so totals are final here
+    for index in range(options.users):
+        yield Finance, {
+            "id": start_ids[Finance] + index,
+            "user_id": start_ids[User] + index,
+            "wallet": wallets[index],
+            "balance": balances[index],
+            "income": incomes[index],
+            "affiliate_income": affiliate_incomes[index],
+        }
+
+
+def _infile_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, enum.Enum):
+        # enum columns store member names
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    return str(value)
+
+
+class _InsertWriter:
+    """Buffers rows per model and writes every :batch_size of them with
+    add_many in a transaction of its own"""
+
+    def __init__(self, session: AsyncSession, batch_size: int) -> None:
+        self._session = session
+        self._batch_size = batch_size
+        self._rows: defaultdict[type[Base], list[dict[str, Any]]] = defaultdict(list)
+
+    async def add(self, model: type[Base], row: dict[str, Any]) -> None:
+        rows = self._rows[model]
+        rows.append(row)
+        if len(rows) >= self._batch_size:
+            await self._flush(model)
+
+    async def _flush(self, model: type[Base]) -> None:
+        rows = self._rows.pop(model)
+        await GenericSqlRepository(self._session, model).add_many(rows)
+        await self._session.commit()
+
+    async def close(self) -> None:
+        for model in list(self._rows):
+            await self._flush(model)
+        await self._session.close()
+
+
+class _InfileWriter:
+    """Writes rows to a TSV file per model, files are loaded with
+    LOAD DATA LOCAL INFILE on close"""
+
+    def __init__(self, connection: AsyncConnection, directory: Path) -> None:
+        self._connection = connection
+        self._directory = directory
+        self._files: dict[type[Base], tuple[TextIO, list[str]]] = {}
+
+    async def add(self, model: type[Base], row: dict[str, Any]) -> None:
+        if model not in self._files:
+            path = self._directory / f"{model.__tablename__}.tsv"
+            self._files[model] = (path.open("w", encoding="utf-8"), list(row))
+        file, _ = self._files[model]
+        file.write("\t".join(map(_infile_value, row.values())) + "\n")
+
+    async def close(self) -> None:
+        for model, (file, columns) in self._files.items():
+            file.close()
+            stmt = text(
+                f"LOAD DATA LOCAL INFILE :path INTO TABLE `{model.__tablename__}` "
+                "CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' "
+                f"({', '.join(f'`{column}`' for column in columns)})"
+            )
+            await self._connection.execute(stmt, {"path": file.name})
+            await self._connection.commit()
+
+
+async def generate(
+    options: GeneratorOptions,
+    password: str,
+    batch_size: int = settings.BULK_INSERT_BATCH_SIZE,
+    infile: bool = False,
+) -> Counter[str]:
+    """Generates rows by :options into database of DB_URL
+
+    Returns:
+        Counter[str]: number of generated rows by table
+    """
+    await initiate_machines()
+    load_engine = (
+        create_async_engine(
+            settings.DB_URL, poolclass=NullPool, connect_args={"local_infile": True}
+        )
+        if infile
+        else engine
+    )
+    counts: Counter[str] = Counter()
+    async with load_engine.connect() as connection:
+        # rows reference each other by generated ids, not in insert order
+        await connection.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+        machines = [
+            MachineRow(*row)
+            for row in await connection.execute(
+                select(Machine.id, Machine.price, Machine.income).order_by(Machine.id)
+            )
+        ]
+        start_ids = {
+            model: await connection.scalar(select(func.coalesce(func.max(model.id), 0)))
+            + 1
+            for model in ID_MODELS
+        }
+        await connection.commit()
+
+        password_hash = SecurityHasher.get_password_hash(password)
+        with tempfile.TemporaryDirectory() as directory:
+            writer = (
+                _InfileWriter(connection, Path(directory))
+                if infile
+                else _InsertWriter(AsyncSession(bind=connection), batch_size)
+            )
+            rows = generate_rows(options, machines, start_ids, password_hash)
+            for model, row in rows:
+                await writer.add(model, row)
+                counts[model.__tablename__] += 1
+            await writer.close()
+    if load_engine is not engine:
+        await load_engine.dispose()
+    return counts
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Generates deterministic synthetic data into MySQL of DB_URL"
+    )
+    for option in fields(GeneratorOptions):
+        if option.name != "until":
+            parser.add_argument(
+                f"--{option.name.replace('_', '-')}", type=int, default=option.default
+            )
+    parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="day the history ends, rows depend on it as on --seed",
+    )
+    parser.add_argument("--password", default="password")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.BULK_INSERT_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--infile", action="store_true", help="load with LOAD DATA LOCAL INFILE"
+    )
+    args = parser.parse_args()
+    options = GeneratorOptions(
+        **{
+            option.name: getattr(args, option.name)
+            for option in fields(GeneratorOptions)
+        }
+    )
+
+    started = timer.monotonic()
+    counts = await generate(options, args.password, args.batch_size, args.infile)
+    logger.info(
+        "Generated %s rows in %.0f seconds: %s",
+        sum(counts.values()),
+        timer.monotonic() - started,
+        dict(counts),
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,24 +1,51 @@
-from repositories.machine_repository import MachineRepository
+"""Seeds machines from settings and the first admin user, and starts
+continuous accrual of older machines with LAZY_COMMISSION_ACCRUAL
+
+Seeding is idempotent and safe to run from several processes at once:
+it is serialized with a MySQL advisory lock, machines are inserted with
+INSERT ... ON DUPLICATE KEY and admin is created only while user table is empty.
+
+Run from api/src:
+    python -m utils.initiate_data
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import select, text
+
 from repositories.UserRepository import UserRepository
 from repositories.finance_repository import FinanceRepository
+from repositories.machine_repository import MachineRepository
+from repositories.purchased_machine_repository import PurchasedMachineRepository
 from schemas.user import UserSchema
 from utils.security import SecurityHasher
 from config import settings
-from database.db import async_session_maker
+from database.db import async_session_maker, engine
+from database.models import User
+
+
+logger = logging.getLogger(__name__)
+
+SEED_LOCK_NAME = "miningvit_seed"
 
 
 async def initiate_machines() -> None:
+    """Inserts machines missing from MACHINES_INFO, existing rows are kept as is"""
     async with async_session_maker() as session:
-        repo = MachineRepository(session)
-
-        machines = await repo.list()
-        if machines:
-            return
+        await MachineRepository(session).upsert_many(settings.MACHINES_INFO)
+        await session.commit()
 
-        for machine_data in settings.MACHINES_INFO:
-            await repo.add(machine_data)
 
+async def initiate_lazy_accrual() -> None:
+    """Gives settled_time to machines bought before LAZY_COMMISSION_ACCRUAL"""
+    async with async_session_maker() as session:
+        started = await PurchasedMachineRepository(session).start_accrual(
+            datetime.now()
+        )
         await session.commit()
+    if started:
+        logger.info("Started continuous accrual of %s machines", started)
 
 
 async def initiate_admin() -> None:
@@ -26,8 +53,8 @@ async def initiate_admin() -> None:
         user_repo = UserRepository(session)
         finance_repo = FinanceRepository(session)
 
-        users = await user_repo.list()
-        if users:
+        any_user = await session.scalar(select(User.id).limit(1))
+        if any_user is not None:
             return
 
         password_hash = SecurityHasher.get_password_hash(settings.ADMIN_PASSWORD)
@@ -43,3 +70,35 @@ async def initiate_admin() -> None:
         admin = UserSchema.model_validate(await user_repo.add(admin_data))
         await finance_repo.add({"user_id": admin.id, "balance": 10000000})
         await session.commit()
+
+
+async def seed() -> bool:
+    """Runs seeding under advisory lock
+
+    Returns:
+        bool: False if lock was not acquired in SEED_LOCK_TIMEOUT_SECONDS
+    """
+    # lock belongs to the connection, so it is held on a dedicated one
+    async with engine.connect() as lock_connection:
+        acquired = await lock_connection.scalar(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": SEED_LOCK_NAME, "timeout": settings.SEED_LOCK_TIMEOUT_SECONDS},
+        )
+        if not acquired:
+            logger.warning("Seeding skipped, lock is held by another process")
+            return False
+        try:
+            await initiate_machines()
+            if settings.LAZY_COMMISSION_ACCRUAL:
+                await initiate_lazy_accrual()
+            await initiate_admin()
+        finally:
+            await lock_connection.execute(
+                text("SELECT RELEASE_LOCK(:name)"), {"name": SEED_LOCK_NAME}
+            )
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(seed())
@@ -0,0 +1,17 @@
+from typing import Any
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+
+class ModelResponse(Response):
+    """JSON response serialized by pydantic-core straight from schema instances.
+
+    FastAPI returns Response objects as is, so the content skips response model
+    validation and jsonable_encoder. Content must already be built of schemas
+    declared in route response_model, extra fields are not filtered out.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -1,12 +1,24 @@
-from passlib.context import CryptContext
+from typing import TYPE_CHECKING
 from config import settings
 import jwt
 from datetime import datetime, timedelta, timezone
 import hashlib
 
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
 
 class SecurityHasher:
-    _pwd_context = CryptContext(schemes=["bcrypt"])
+    _pwd_context: "CryptContext | None" = None
+
+    @classmethod
+    def _get_pwd_context(cls) -> "CryptContext":
+        # passlib and bcrypt are imported on first use
+        if cls._pwd_context is None:
+            from passlib.context import CryptContext
+
+            cls._pwd_context = CryptContext(schemes=["bcrypt"])
+        return cls._pwd_context
 
     @staticmethod
     def get_timed_hash(value) -> str:
@@ -15,11 +27,11 @@ class SecurityHasher:
 
     @classmethod
     def verify_password(cls, plain_password: str, hashed_password: str) -> bool:
-        return cls._pwd_context.verify(plain_password, hashed_password)
+        return cls._get_pwd_context().verify(plain_password, hashed_password)
 
     @classmethod
     def get_password_hash(cls, password: str) -> str:
-        return cls._pwd_context.hash(password)
+        return cls._get_pwd_context().hash(password)
 
 
 class JWTAuthController:
@@ -202,3 +202,27 @@ class AppError:
             code=1021,
         ),
     )
+    COMMISSIONS_ACCRUE_CONTINUOUSLY = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=HTTPErrorDetails(
+            location="purchased machine.settled_time",
+            message="commissions accrue continuously, collect them with /owned/commissions",
+            code=1022,
+        ),
+    )
+    IDEMPOTENCY_KEY_IN_PROGRESS = HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=HTTPErrorDetails(
+            location="idempotency-key",
+            message="request with this idempotency key is still in progress",
+            code=1023,
+        ),
+    )
+    IDEMPOTENCY_KEY_REUSED = HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=HTTPErrorDetails(
+            location="idempotency-key",
+            message="idempotency key was already used with another request",
+            code=1024,
+        ),
+    )
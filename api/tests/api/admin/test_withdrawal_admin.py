@@ -0,0 +1,47 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from src.admin.views import WithdrawalAdmin
+from src.database.models import Finance, Withdrawal
+from src.repositories.UserRepository import UserRepository
+from src.repositories.finance_repository import FinanceRepository
+from src.utils.enums import TransactionStatus
+from src.database.db import async_session_maker
+
+
+class TestWithdrawalAdmin:
+    async def test_completing_withdrawal_in_form_deducts_balance(
+        self, session: AsyncSession
+    ):
+        user = await UserRepository(session).add(
+            {
+                "username": "withdrawal_admin",
+                "email": "withdrawal_admin@test.com",
+                "password_hash": "test_password_hash",
+                "affiliate_code": "withdrawal_admin",
+            }
+        )
+        finance = await FinanceRepository(session).add(
+            {"user_id": user.id, "balance": 100, "wallet": "wallet"}
+        )
+        withdrawal = Withdrawal(
+            finance_id=finance.id,
+            amount=30,
+            wallet="wallet",
+            status=TransactionStatus.PENDING,
+        )
+        session.add(withdrawal)
+        await session.commit()
+
+        view = WithdrawalAdmin()
+        view.session_maker = async_session_maker
+        request = Request({"type": "http", "method": "POST", "headers": []})
+        await view.update_model(
+            request, str(withdrawal.id), {"status": TransactionStatus.COMPLETED.name}
+        )
+
+        async with async_session_maker() as check_session:
+            db_finance = await check_session.get(Finance, finance.id)
+            db_withdrawal = await check_session.get(Withdrawal, withdrawal.id)
+        assert db_finance.balance == 70
+        assert db_withdrawal.status == TransactionStatus.COMPLETED
@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from sqlalchemy.pool import NullPool
 from src.database.db import engine
 from fastapi.testclient import TestClient
-from src.main import app
+from src.main import create_app
 
 from src.database.models import Base
 from src.config import settings
@@ -16,6 +16,8 @@ from src.utils.enums import IncomeType
 from src.utils.security import SecurityHasher
 
 
+app = create_app()
+
 engine_test = create_async_engine(settings.DB_URL, poolclass=NullPool)
 async_session_maker = async_sessionmaker(
     bind=engine_test,
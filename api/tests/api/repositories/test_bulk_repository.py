@@ -0,0 +1,62 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repositories import base
+from src.repositories.UserRepository import UserRepository
+from src.repositories.finance_repository import FinanceRepository
+from src.database.models import Finance
+
+
+async def get_user_id(session: AsyncSession) -> int:
+    user = await UserRepository(session).get_by_name("admin1")
+    assert user is not None
+    return user.id
+
+
+class TestBulkRepository:
+    async def test_add_many_returns_ids_across_batches(
+        self, session: AsyncSession, monkeypatch
+    ):
+        monkeypatch.setattr(base.settings, "BULK_INSERT_BATCH_SIZE", 2)
+        user_id = await get_user_id(session)
+        data = [{"user_id": user_id, "balance": 1000 + i} for i in range(5)]
+
+        ids = await FinanceRepository(session).add_many(data, return_ids=True)
+
+        rows = await session.execute(
+            select(Finance.id, Finance.balance).where(Finance.id.in_(ids))
+        )
+        assert dict(rows.tuples().all()) == {
+            id: row["balance"] for id, row in zip(ids, data)
+        }
+
+    async def test_add_many_without_ids(self, session: AsyncSession):
+        user_id = await get_user_id(session)
+        data = [{"user_id": user_id, "balance": 2000} for _ in range(3)]
+
+        assert await FinanceRepository(session).add_many(data) == []
+
+        count = await session.scalar(
+            select(func.count()).select_from(Finance).where(Finance.balance == 2000)
+        )
+        assert count == 3
+
+    async def test_upsert_many_keeps_or_updates_existing_rows(
+        self, session: AsyncSession
+    ):
+        repository = FinanceRepository(session)
+        user_id = await get_user_id(session)
+        [id] = await repository.add_many(
+            [{"user_id": user_id, "balance": 3000}], return_ids=True
+        )
+
+        await repository.upsert_many([{"id": id, "user_id": user_id, "balance": 1}])
+        finance = await repository.get_by_id(id)
+        assert (finance.balance, finance.version) == (3000, 0)
+
+        await repository.upsert_many(
+            [{"id": id, "user_id": user_id, "balance": 1}], update_columns=["balance"]
+        )
+        session.expire_all()
+        finance = await repository.get_by_id(id)
+        assert (finance.balance, finance.version) == (1, 1)
@@ -0,0 +1,54 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.repositories.UserRepository import UserRepository
+from src.repositories.finance_repository import FinanceRepository
+from src.database.models import Finance
+
+
+async def create_finance(session: AsyncSession, name: str) -> Finance:
+    user = await UserRepository(session).add(
+        {
+            "username": name,
+            "email": f"{name}@test.com",
+            "password_hash": "test_password_hash",
+            "affiliate_code": name,
+        }
+    )
+    return await FinanceRepository(session).add({"user_id": user.id})
+
+
+class TestFinanceRepository:
+    async def test_finance_totals_include_pending_deltas(self, session: AsyncSession):
+        repository = FinanceRepository(session)
+        finance = await create_finance(session, "deltas1")
+        other_finance = await create_finance(session, "deltas2")
+        await repository.update(finance.id, {"balance": 100, "affiliate_income": 10})
+        await repository.add_deltas(
+            [
+                {"finance_id": finance.id, "balance": 7, "affiliate_income": 7},
+                {"finance_id": other_finance.id, "balance": 3, "affiliate_income": 3},
+                {"finance_id": finance.id, "balance": 5, "affiliate_income": 5},
+            ]
+        )
+
+        totals = await repository.get_user_finance_totals(finance.user_id)
+        assert totals is not None
+        assert (totals.balance, totals.affiliate_income) == (112, 22)
+
+    async def test_merge_keeps_finance_totals(self, session: AsyncSession):
+        repository = FinanceRepository(session)
+        finance = await create_finance(session, "deltas3")
+        await repository.add_deltas(
+            [
+                {"finance_id": finance.id, "balance": 7, "affiliate_income": 7},
+                {"finance_id": finance.id, "balance": 5, "affiliate_income": 0},
+            ]
+        )
+        before = await repository.get_user_finance_totals(finance.user_id)
+
+        assert await repository.merge_deltas([finance.id]) == 2
+        assert await repository.merge_deltas([finance.id]) == 0
+
+        after = await repository.get_user_finance_totals(finance.user_id)
+        assert after == before
+        assert (after.balance, after.affiliate_income) == (12, 7)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Machine, PurchasedMachine
+from src.repositories.UserRepository import UserRepository
+from src.repositories.purchased_machine_repository import PurchasedMachineRepository
+from src.utils.enums import MachineCoin
+
+
+async def create_purchased_machines(
+    session: AsyncSession, activated_times: list[datetime | None]
+) -> tuple[int, list[int]]:
+    user = await UserRepository(session).add(
+        {
+            "username": "legacy_machines",
+            "email": "legacy_machines@test.com",
+            "password_hash": "test_password_hash",
+            "affiliate_code": "legacy_machines",
+        }
+    )
+    machine = Machine(title="legacy", coin=MachineCoin.LTC, income=100, price=1000)
+    session.add(machine)
+    await session.flush()
+    purchased = [
+        PurchasedMachine(
+            user_id=user.id, machine_id=machine.id, activated_time=activated_time
+        )
+        for activated_time in activated_times
+    ]
+    session.add_all(purchased)
+    await session.flush()
+    return user.id, [purchased_machine.id for purchased_machine in purchased]
+
+
+class TestPurchasedMachineRepository:
+    async def test_legacy_machines_accrue_only_since_activation(
+        self, session: AsyncSession
+    ):
+        activated_time = datetime(2026, 1, 1)
+        user_id, (idle_id, activated_id) = await create_purchased_machines(
+            session, [None, activated_time]
+        )
+        repository = PurchasedMachineRepository(session)
+
+        rows = await repository.list_accruing(user_id)
+
+        # idle machine with settled_time and activated_time NULL does not accrue
+        assert [(row.id, row.settled_time) for row in rows] == [
+            (activated_id, activated_time)
+        ]
+
+        now = datetime.now().replace(microsecond=0)
+        assert await repository.start_accrual(now) >= 2
+        rows = await repository.list_accruing(user_id)
+        assert [(row.id, row.settled_time) for row in rows] == [
+            (idle_id, now),
+            (activated_id, activated_time),
+        ]
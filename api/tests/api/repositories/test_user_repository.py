@@ -204,15 +204,28 @@ class TestUserRepository:
         assert user
         assert user.affiliate_code == "666"
 
-    async def test_check_existance_by(self, session):
+    async def test_exists(self, session):
         user_repository = UserRepository(session)
-        is_exists = await user_repository.check_existance_by(affiliate_code="666")
+        is_exists = await user_repository.exists(affiliate_code="666")
         assert is_exists
-        is_exists2 = await user_repository.check_existance_by(
-            affiliate_code="fake_code"
-        )
+        is_exists2 = await user_repository.exists(affiliate_code="fake_code")
         assert not is_exists2
 
+    async def test_update_where(self, session):
+        user_repository = UserRepository(session)
+        user = await user_repository.get_by_affiliate_code("666")
+        updated = await user_repository.update_where(
+            {"id": user.id, "affiliate_code": "fake_code"}, {"note": "not updated"}
+        )
+        assert updated == 0
+        updated = await user_repository.update_where(
+            {"id": user.id, "affiliate_code": "666"}, {"note": "updated"}
+        )
+        assert updated == 1
+        await session.commit()
+        await session.refresh(user)
+        assert user.note == "updated"
+
     async def test_list(self, session):
         user_repository = UserRepository(session)
         users = await user_repository.list()
@@ -0,0 +1,85 @@
+from typing import Any
+
+from sqlalchemy import func, select
+
+from src.database.db import async_session_maker
+from src.database.models import Finance, FinanceDelta, Machine, PurchasedMachine
+from src.repositories.UserRepository import UserRepository
+from src.schemas.user import UserSchema
+from src.services import machine_service
+from src.services.machine_service import MachineService
+
+
+class FakeRedis:
+    """Answers every command as if redis was empty"""
+
+    async def mget(self, *keys: str) -> list[None]:
+        return [None] * len(keys)
+
+    def __getattr__(self, name: str) -> Any:
+        async def command(*args: Any, **kwargs: Any) -> None:
+            return None
+
+        return command
+
+
+class TestPurchaseMachine:
+    async def test_optimistic_purchase_is_paid_with_pending_deltas(self, monkeypatch):
+        monkeypatch.setattr(machine_service.settings, "OPTIMISTIC_LOCKING", True)
+        monkeypatch.setattr(machine_service.settings, "LAZY_COMMISSION_ACCRUAL", False)
+        monkeypatch.setattr(machine_service.RedisService, "_repository", FakeRedis())
+        monkeypatch.setattr("repositories.cache.redis_repo", FakeRedis())
+
+        async with async_session_maker() as session:
+            user = await UserRepository(session).add(
+                {
+                    "username": "optimistic_buyer",
+                    "email": "optimistic_buyer@test.com",
+                    "password_hash": "test_password_hash",
+                    "affiliate_code": "optimistic_buyer",
+                }
+            )
+            finance = Finance(user_id=user.id, balance=0)
+            machine = Machine(
+                title="optimistic",
+                coin=machine_service.MachineCoin.BTC,
+                income=100,
+                price=1000,
+            )
+            session.add_all([finance, machine])
+            await session.commit()
+        user = UserSchema.model_validate(user)
+
+        async with machine_service.DB() as db:
+            # like get_current_user, the request reads before the purchase,
+            # so its snapshot predates the rewards below
+            assert (await db.finance.get_user_finance(user.id)).balance == 0
+            async with async_session_maker() as session:
+                session.add_all(
+                    [
+                        FinanceDelta(finance_id=finance.id, balance=600),
+                        FinanceDelta(finance_id=finance.id, balance=400),
+                    ]
+                )
+                await session.commit()
+
+            await db.run_transaction(
+                MachineService(db).purchase_machine,
+                user,
+                machine_service.MachineCoin.BTC,
+            )
+
+        async with async_session_maker() as session:
+            assert (
+                await session.scalar(select(Finance.balance).filter_by(id=finance.id))
+                == 0
+            )
+            assert not await session.scalar(
+                select(func.count()).where(FinanceDelta.finance_id == finance.id)
+            )
+            assert (
+                await session.scalar(
+                    select(func.count()).where(PurchasedMachine.user_id == user.id)
+                )
+                == 1
+            )
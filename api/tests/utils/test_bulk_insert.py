@@ -0,0 +1,81 @@
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.repositories import base
+from src.repositories.purchased_machine_repository import PurchasedMachineRepository
+
+
+class Result:
+    def __init__(self, lastrowid: int = 0, rowcount: int = 0) -> None:
+        self.lastrowid = lastrowid
+        self.rowcount = rowcount
+
+
+class FakeSession:
+    """Records executed statements, multi-row INSERTs get :lastrowids in turn"""
+
+    def __init__(self, lastrowids: list[int] | None = None) -> None:
+        self.lastrowids = list(lastrowids or [])
+        self.executed: list[tuple[Any, Any]] = []
+
+    async def execute(self, stmt: Any, params: Any = None) -> Result:
+        self.executed.append((stmt, params))
+        return Result(self.lastrowids.pop(0) if self.lastrowids else 0, 1)
+
+    async def flush(self) -> None:
+        pass
+
+
+ROWS = [{"user_id": 1, "machine_id": machine_id} for machine_id in range(5)]
+
+
+@pytest.fixture(autouse=True)
+def batch_size(monkeypatch):
+    monkeypatch.setattr(base.settings, "BULK_INSERT_BATCH_SIZE", 2)
+
+
+def compile(stmt: Any) -> str:
+    return str(stmt.compile(dialect=mysql.dialect()))
+
+
+async def test_add_many_takes_ids_from_lastrowid_of_every_batch():
+    session = FakeSession(lastrowids=[10, 20, 30])
+
+    ids = await PurchasedMachineRepository(session).add_many(ROWS, return_ids=True)
+
+    assert ids == [10, 11, 20, 21, 30]
+    assert [params for _, params in session.executed] == [None, None, None]
+
+
+async def test_add_many_without_ids_is_one_executemany():
+    session = FakeSession()
+
+    ids = await PurchasedMachineRepository(session).add_many(ROWS)
+
+    assert ids == []
+    assert len(session.executed) == 1
+    assert session.executed[0][1] == ROWS
+
+
+async def test_upsert_many_without_update_columns_keeps_existing_rows():
+    session = FakeSession()
+
+    await PurchasedMachineRepository(session).upsert_many(ROWS)
+
+    assert len(session.executed) == 3
+    sql = compile(session.executed[0][0])
+    assert sql.endswith("ON DUPLICATE KEY UPDATE id = purchased_machine.id")
+
+
+async def test_upsert_many_bumps_version_of_updated_rows():
+    session = FakeSession()
+
+    await PurchasedMachineRepository(session).upsert_many(
+        ROWS, update_columns=["machine_id"]
+    )
+
+    sql = compile(session.executed[0][0])
+    assert "machine_id = VALUES(machine_id)" in sql
+    assert "version = (purchased_machine.version + %s)" in sql
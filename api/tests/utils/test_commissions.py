@@ -0,0 +1,35 @@
+import pytest
+from datetime import datetime, timedelta
+
+from src.utils.commissions import (
+    COMMISSION_PERIOD,
+    count_commission_periods,
+    advance_settled_time,
+)
+
+
+SETTLED_TIME = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "now, periods",
+    [
+        (SETTLED_TIME - timedelta(seconds=1), 0),
+        (SETTLED_TIME, 0),
+        (SETTLED_TIME + COMMISSION_PERIOD - timedelta(seconds=1), 0),
+        (SETTLED_TIME + COMMISSION_PERIOD, 1),
+        (SETTLED_TIME + COMMISSION_PERIOD * 3 + timedelta(hours=1), 3),
+    ],
+)
+def test_count_commission_periods(now, periods):
+    assert count_commission_periods(SETTLED_TIME, now) == periods
+
+
+def test_advance_settled_time_keeps_unfinished_period():
+    now = SETTLED_TIME + COMMISSION_PERIOD * 2 + timedelta(minutes=30)
+    periods = count_commission_periods(SETTLED_TIME, now)
+    settled_time = advance_settled_time(SETTLED_TIME, periods)
+
+    assert settled_time == SETTLED_TIME + COMMISSION_PERIOD * 2
+    assert now - settled_time == timedelta(minutes=30)
+    assert count_commission_periods(settled_time, now) == 0
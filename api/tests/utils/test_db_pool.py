@@ -0,0 +1,23 @@
+import pytest
+
+from src.utils.db_pool import per_worker_pool
+
+
+@pytest.mark.parametrize(
+    "workers, pool_size, max_overflow, expected",
+    [
+        (1, 10, 10, (10, 10)),
+        (4, 10, 10, (10, 10)),
+        (8, 10, 10, (10, 6)),
+        (16, 10, 10, (8, 0)),
+        (200, 10, 10, (1, 0)),
+    ],
+)
+def test_per_worker_pool(workers, pool_size, max_overflow, expected):
+    assert per_worker_pool(151, 20, workers, pool_size, max_overflow) == expected
+
+
+@pytest.mark.parametrize("workers", [1, 3, 5, 9, 17])
+def test_per_worker_pool_stays_under_connection_limit(workers):
+    pool_size, max_overflow = per_worker_pool(151, 20, workers, 10, 20)
+    assert workers * (pool_size + max_overflow) <= 151 - 20
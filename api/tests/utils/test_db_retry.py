@@ -0,0 +1,58 @@
+import pytest
+
+from src.utils.db_retry import (
+    StaleVersionError,
+    backoff_delay,
+    mysql_error_code,
+    retry_reason,
+)
+
+
+class OperationalError(Exception):
+    pass
+
+
+class DBAPIError(Exception):
+    def __init__(self, orig: Exception) -> None:
+        self.orig = orig
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (OperationalError(1213, "Deadlock found"), 1213),
+        (DBAPIError(OperationalError(1205, "Lock wait timeout")), 1205),
+        (DBAPIError(OperationalError("no code")), None),
+        (ValueError(), None),
+    ],
+)
+def test_mysql_error_code(error, expected):
+    assert mysql_error_code(error) == expected
+
+
+@pytest.mark.parametrize(
+    "code, expected",
+    [(1213, "deadlocks"), (1205, "lock_wait_timeouts"), (1062, None)],
+)
+def test_retry_reason(code, expected):
+    assert retry_reason(DBAPIError(OperationalError(code, ""))) == expected
+
+
+def test_retry_reason_of_version_conflict():
+    assert retry_reason(StaleVersionError("finance 1")) == "version_conflicts"
+
+
+@pytest.mark.parametrize(
+    "attempt, expected",
+    [(0, 0.05), (1, 0.1), (3, 0.4), (10, 1.0)],
+)
+def test_backoff_delay_is_capped_exponential(attempt, expected):
+    assert backoff_delay(attempt, 0.05, 1.0, rand=lambda: 1.0) == pytest.approx(
+        expected
+    )
+
+
+def test_backoff_delay_is_jittered():
+    delays = {backoff_delay(2, 0.05, 1.0) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(0 <= delay < 0.2 for delay in delays)
@@ -0,0 +1,44 @@
+import fcntl
+from pathlib import Path
+
+import pytest
+
+from src.admin import export
+from src.admin.export import EXPORT_SOURCES, export_state, write_export
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch) -> Path:
+    monkeypatch.setattr(export.settings, "EXPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+async def test_export_is_running_while_it_is_written(export_dir, monkeypatch):
+    states = []
+
+    async def iter_csv(*args):
+        states.append(export_state("users.csv"))
+        yield b"id\n"
+
+    monkeypatch.setattr(export, "iter_csv", iter_csv)
+
+    await write_export(export_dir / "users.csv", EXPORT_SOURCES["users"], None)
+
+    assert states == ["running"]
+    assert export_state("users.csv") is None
+    assert [path.name for path in export_dir.iterdir()] == ["users.csv"]
+
+
+def test_part_file_locked_by_another_writer_is_running(export_dir):
+    with (export_dir / "users.csv.part").open("wb") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+
+        assert export_state("users.csv") == "running"
+
+
+def test_part_file_left_by_dead_worker_is_failed_and_removed(export_dir):
+    (export_dir / "users.csv.part").write_bytes(b"id\n1\n")
+
+    assert export_state("users.csv") == "failed"
+    assert not (export_dir / "users.csv.part").exists()
+    assert export_state("users.csv") is None
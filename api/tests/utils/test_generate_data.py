@@ -0,0 +1,87 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+import pytest
+
+from src.utils.enums import IncomeType, TransactionStatus
+from src.utils.generate_data import (
+    ID_MODELS,
+    GeneratorOptions,
+    MachineRow,
+    generate_rows,
+)
+
+
+MACHINES = [MachineRow(1, 400000, 25000), MachineRow(2, 300000, 15000)]
+START_IDS = {model: 100 for model in ID_MODELS}
+
+
+def generate(**options) -> dict[str, list[dict]]:
+    options = {"users": 300, "until": date(2026, 1, 1), **options}
+    rows = defaultdict(list)
+    for model, row in generate_rows(
+        GeneratorOptions(**options), MACHINES, START_IDS, "hash"
+    ):
+        rows[model.__tablename__].append(row)
+    return rows
+
+
+def test_generate_rows_is_deterministic_by_seed():
+    assert generate(seed=1) == generate(seed=1)
+    assert generate(seed=1) != generate(seed=2)
+
+
+def test_generate_rows_ids_continue_after_start_ids():
+    rows = generate()
+    assert [user["id"] for user in rows["user"]] == list(range(100, 400))
+    assert [finance["user_id"] for finance in rows["finance"]] == list(range(100, 400))
+    assert rows["income"][0]["id"] == 100
+
+
+@pytest.mark.parametrize("branching, depth", [(1, 3), (3, 2), (4, 8)])
+def test_generate_rows_referral_trees(branching, depth):
+    rows = generate(branching=branching, depth=depth)
+    masters = {row["referral_id"]: row["master_id"] for row in rows["master_referral"]}
+    referrals = Counter(masters.values())
+    assert max(referrals.values()) <= branching
+
+    def level(user_id: int) -> int:
+        return 0 if user_id not in masters else level(masters[user_id]) + 1
+
+    assert max(level(user["id"]) for user in rows["user"]) <= depth
+    assert all(master < referral for referral, master in masters.items())
+
+
+def test_generate_rows_starts_new_tree_when_depth_is_reached():
+    rows = generate(branching=1, depth=3)
+    roots = [user["id"] for user in rows["user"]][::4]
+    referrals = {row["referral_id"] for row in rows["master_referral"]}
+    assert not referrals & set(roots)
+    assert len(referrals) == 300 - len(roots)
+
+
+def test_generate_rows_finance_totals_match_history():
+    rows = generate(seed=3)
+    prices = {machine.id: machine.price for machine in MACHINES}
+    balances = Counter()
+    incomes = Counter()
+    affiliate_incomes = Counter()
+    finance_ids = {row["user_id"]: row["id"] for row in rows["finance"]}
+    for deposit in rows["deposit"]:
+        balances[deposit["finance_id"]] += deposit["amount"]
+    for machine in rows["purchased_machine"]:
+        balances[finance_ids[machine["user_id"]]] -= prices[machine["machine_id"]]
+    for income in rows["income"]:
+        balances[income["finance_id"]] += income["amount"]
+        if income["type"] == IncomeType.AFFILIATE:
+            affiliate_incomes[income["finance_id"]] += income["amount"]
+        else:
+            incomes[income["finance_id"]] += income["amount"]
+    for withdrawal in rows["withdrawal"]:
+        if withdrawal["status"] == TransactionStatus.COMPLETED:
+            balances[withdrawal["finance_id"]] -= withdrawal["amount"]
+
+    for finance in rows["finance"]:
+        assert finance["balance"] == balances[finance["id"]] >= 0
+        assert finance["income"] == incomes[finance["id"]]
+        assert finance["affiliate_income"] == affiliate_incomes[finance["id"]]
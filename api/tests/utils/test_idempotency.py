@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from fastapi import HTTPException, Request
+
+from src.dependencies import idempotency
+from src.dependencies.idempotency import IdempotentReplay, idempotent
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, Any] = {}
+
+    async def get(self, key: str) -> Any | None:
+        return self.values.get(key)
+
+    async def set(
+        self, key: str, value: Any, expire: int | None, nx: bool = False
+    ) -> bool:
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(idempotency.RedisService, "_repository", redis)
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_WAIT_SECONDS", 1)
+    return redis
+
+
+def withdraw_request(body: bytes, query: str = "") -> Request:
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/finance/withdraw",
+        "query_string": query.encode(),
+        "headers": [],
+    }
+    return Request(scope, receive)
+
+
+USER = SimpleNamespace(id=1)
+
+
+async def first_request(body: bytes, query: str = "") -> None:
+    request = withdraw_request(body, query)
+    await idempotent(request, USER, "key")
+    await idempotency.RedisService.save_idempotent_response(
+        request.state.idempotency_key,
+        request.state.idempotency_fingerprint,
+        201,
+        "{}",
+    )
+
+
+async def test_repeated_request_replays_stored_response():
+    await first_request(b'{"amount": 100}')
+
+    with pytest.raises(IdempotentReplay) as replay:
+        await idempotent(withdraw_request(b'{"amount": 100}'), USER, "key")
+
+    assert replay.value.status_code == 201
+
+
+async def test_key_reused_with_another_body_is_rejected():
+    await first_request(b'{"amount": 100}')
+
+    with pytest.raises(HTTPException) as error:
+        await idempotent(withdraw_request(b'{"amount": 900}'), USER, "key")
+
+    assert error.value is idempotency.AppError.IDEMPOTENCY_KEY_REUSED
+    assert error.value.status_code == 422
+
+
+async def test_key_reused_with_another_query_is_rejected_while_in_progress():
+    await idempotent(withdraw_request(b"", "coin=BTC"), USER, "key")
+
+    with pytest.raises(HTTPException) as error:
+        await idempotent(withdraw_request(b"", "coin=LTC"), USER, "key")
+
+    assert error.value is idempotency.AppError.IDEMPOTENCY_KEY_REUSED
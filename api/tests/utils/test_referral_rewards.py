@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+from typing import Any
+
+from src.services import machine_service
+from src.services.machine_service import MachineService
+
+
+class FakeFinanceRepository:
+    def __init__(self) -> None:
+        self.deltas: list[dict[str, Any]] = []
+        self.incomes: list[dict[str, Any]] = []
+
+    async def get_finance_ids(self, user_ids: list[int]) -> dict[int, int]:
+        return {user_id: user_id * 10 for user_id in user_ids}
+
+    async def add_deltas(self, data: list[dict[str, Any]]) -> None:
+        self.deltas.extend(data)
+
+    async def add_incomes(self, data: list[dict[str, Any]]) -> None:
+        self.incomes.extend(data)
+
+
+class FakeDB:
+    def __init__(self) -> None:
+        self.finance = FakeFinanceRepository()
+
+    def on_commit(self, callback: Any, *args: Any) -> None:
+        pass
+
+
+async def test_each_level_is_paid_to_master_at_its_depth(monkeypatch):
+    # buyer 1, direct master 2, then 3, 4 and 5 up the chain
+    async def get_upline(self, user_id: int) -> list[int]:
+        return [2, 3, 4, 5]
+
+    monkeypatch.setattr(machine_service.UserService, "get_upline", get_upline)
+    db = FakeDB()
+
+    await MachineService(db).add_referral_rewards_to_masters(
+        SimpleNamespace(id=1), machine_price=1000
+    )
+
+    paid = [(delta["finance_id"], delta["balance"]) for delta in db.finance.deltas]
+    assert paid == [(20, 150), (30, 100), (40, 50), (50, 30)]
+    assert [delta["affiliate_income"] for delta in db.finance.deltas] == [
+        150,
+        100,
+        50,
+        30,
+    ]
+    assert [
+        (income["finance_id"], income["amount"]) for income in db.finance.incomes
+    ] == paid
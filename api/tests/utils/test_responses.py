@@ -0,0 +1,46 @@
+import json
+from datetime import datetime
+from ipaddress import IPv4Address
+from fastapi.encoders import jsonable_encoder
+
+from src.schemas.finance import IncomesSchema
+from src.schemas.user import UserInfoSchema
+from src.utils.enums import IncomeType, TransactionStatus
+from src.utils.responses import ModelResponse
+
+
+def test_model_response_matches_jsonable_encoder():
+    user_info = UserInfoSchema(
+        username="tester",
+        email="tester@example.com",
+        email_allowed=True,
+        telegram=None,
+        affiliate_code="code",
+        is_active=True,
+        ip_address=IPv4Address("127.0.0.1"),
+        created_at=datetime(2024, 1, 2, 3, 4, 5),
+        updated_at=datetime(2024, 1, 2, 3, 4, 5, 678),
+    )
+
+    response = ModelResponse(user_info)
+
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == jsonable_encoder(user_info)
+
+
+def test_model_response_renders_nested_and_sequences():
+    incomes = IncomesSchema(
+        incomes=[
+            {
+                "status": TransactionStatus.COMPLETED,
+                "type": IncomeType.AFFILIATE,
+                "amount": amount,
+            }
+            for amount in range(3)
+        ]
+    )
+
+    assert json.loads(ModelResponse(incomes).body) == jsonable_encoder(incomes)
+    assert json.loads(ModelResponse(incomes.incomes).body) == jsonable_encoder(
+        incomes.incomes
+    )
@@ -0,0 +1,118 @@
+import json
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.config import settings
+
+
+API_DIR = Path(__file__).parent.parent.parent
+LAZY_MODULES = ("sqladmin", "fastapi_mail", "passlib")
+# generous bounds, they catch an eager heavy import or a blocking startup
+# step, not a regression of a few milliseconds
+MAX_IMPORT_SECONDS = 10
+MAX_LIFESPAN_SECONDS = 15
+
+# runs in a fresh interpreter, modules imported by other tests would hide
+# eager imports and their cost
+STARTUP_SCRIPT = """
+import json
+import sys
+import time
+
+started = time.perf_counter()
+from src.main import create_app
+
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+result = {
+    "import": imported - started,
+    "create_app": created - imported,
+    "startup": [name for name in %r if name in sys.modules],
+}
+if "--lifespan" in sys.argv:
+    from fastapi.testclient import TestClient
+
+    client = TestClient(app)
+    lifespan_started = time.perf_counter()
+    client.__enter__()
+    lifespan_ready = time.perf_counter()
+    client.__exit__(None, None, None)
+    result["lifespan_startup"] = lifespan_ready - lifespan_started
+    result["lifespan_shutdown"] = time.perf_counter() - lifespan_ready
+if "--use" in sys.argv:
+    from src.admin.app import LazyAdminApp
+    from src.utils.security import SecurityHasher
+
+    LazyAdminApp().app
+    SecurityHasher.get_password_hash("password")
+    result["used"] = [name for name in %r if name in sys.modules]
+print(json.dumps(result))
+""" % (
+    LAZY_MODULES,
+    LAZY_MODULES,
+)
+
+
+def run_startup(*args: str) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, *args],
+        cwd=API_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def is_reachable(host: str, port: int | str) -> bool:
+    try:
+        with socket.create_connection((host, int(port)), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def report(record_property, result: dict) -> None:
+    for stage, seconds in result.items():
+        if isinstance(seconds, float):
+            record_property(f"{stage}_seconds", round(seconds, 3))
+            print(f"{stage}: {seconds:.3f}s")
+
+
+def test_startup_does_not_import_admin_mail_and_passlib():
+    assert run_startup()["startup"] == []
+
+
+def test_admin_and_passlib_are_imported_on_first_use():
+    result = run_startup("--use")
+
+    assert result["startup"] == []
+    assert result["used"] == ["sqladmin", "passlib"]
+
+
+def test_import_and_create_app_time(record_property):
+    result = run_startup()
+    report(record_property, result)
+
+    assert result["import"] + result["create_app"] < MAX_IMPORT_SECONDS
+
+
+def test_lifespan_time(record_property):
+    if not (
+        is_reachable(settings.MYSQL_HOST, settings.MYSQL_TCP_PORT)
+        and is_reachable(settings.REDIS_HOST, settings.REDIS_PORT)
+    ):
+        pytest.skip("lifespan needs MySQL and Redis")
+
+    result = run_startup("--lifespan")
+    report(record_property, result)
+
+    assert result["import"] + result["create_app"] < MAX_IMPORT_SECONDS
+    assert result["lifespan_startup"] < MAX_LIFESPAN_SECONDS
+    assert result["lifespan_shutdown"] < MAX_LIFESPAN_SECONDS
+    assert result["startup"] == []
@@ -0,0 +1,69 @@
+from typing import Any
+
+import pytest
+
+from src.services import redis_service
+from src.services.redis_service import RedisService
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, Any] = {}
+        self.unlinked: list[tuple] = []
+
+    async def get(self, key: str) -> Any | None:
+        return self.values.get(key)
+
+    async def set(self, key: str, value: Any, expire: int | None) -> bool:
+        self.values[key] = value
+        return True
+
+    async def mget(self, *keys: str) -> list[Any | None]:
+        return [self.values.get(key) for key in keys]
+
+    async def incr(self, key: str) -> int:
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def unlink(self, *keys: str) -> int:
+        self.unlinked.append(keys)
+        return sum(self.values.pop(key, None) is not None for key in keys)
+
+
+@pytest.fixture
+def redis(monkeypatch) -> FakeRedis:
+    redis = FakeRedis()
+    monkeypatch.setattr(RedisService, "_repository", redis)
+    return redis
+
+
+async def test_cached_upline_is_returned(redis):
+    _, generation = await RedisService.get_upline(1)
+    await RedisService.save_upline(1, [2, 3], generation)
+
+    assert await RedisService.get_upline(1) == ([2, 3], generation)
+
+
+async def test_upline_read_before_chain_change_is_not_used(redis):
+    # purchase reads generation and the old chain, admin edit commits and
+    # invalidates, then purchase saves the old chain
+    _, generation = await RedisService.get_upline(1)
+    await RedisService.delete_uplines([1])
+    await RedisService.save_upline(1, [2, 3], generation)
+
+    upline, current_generation = await RedisService.get_upline(1)
+    assert upline is None
+    assert current_generation == generation + 1
+
+
+async def test_delete_uplines_unlinks_keys_in_batches(redis, monkeypatch):
+    monkeypatch.setattr(redis_service.settings, "UPLINE_DELETE_BATCH_SIZE", 2)
+    for user_id in range(5):
+        await RedisService.save_upline(user_id, [10], 0)
+
+    await RedisService.delete_uplines(range(5))
+
+    assert [len(keys) for keys in redis.unlinked] == [2, 2, 1]
+    assert not any(
+        key.startswith("upline:") and key[7:].isdigit() for key in redis.values
+    )
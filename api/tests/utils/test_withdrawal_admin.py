@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from src.admin import views
+from src.admin.views import WithdrawalAdmin
+
+# enum of the module under test, src.utils.enums is imported apart from it
+TransactionStatus = views.TransactionStatus
+
+
+def form_request() -> SimpleNamespace:
+    return SimpleNamespace(state=SimpleNamespace())
+
+
+async def test_completing_pending_withdrawal_in_form_is_approved_after_commit():
+    request = form_request()
+    # sqladmin enum select fields hold member names
+    data = {"status": TransactionStatus.COMPLETED.name}
+    model = SimpleNamespace(status=TransactionStatus.PENDING)
+
+    await WithdrawalAdmin().on_model_change(data, model, False, request)
+
+    assert request.state.withdrawal_approved
+    assert data["status"] == TransactionStatus.PENDING.name
+
+
+async def test_other_status_changes_are_saved_as_is():
+    request = form_request()
+    data = {"status": TransactionStatus.PENDING.name}
+    model = SimpleNamespace(status=TransactionStatus.NEW)
+
+    await WithdrawalAdmin().on_model_change(data, model, False, request)
+
+    assert not request.state.withdrawal_approved
+    assert data["status"] == TransactionStatus.PENDING.name